@@ -44,6 +44,8 @@ a = Analysis(
         'src.gui.worker',
         'src.llm',
         'src.llm.wrapper',
+        # Imported lazily after the window opens
+        'src.llm.backends.mlx_backend',
         'src.search',
     ],
     hookspath=['hooks'],
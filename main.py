@@ -2,14 +2,19 @@
 PixieAI - Local AI Assistant
 
 Run with: uv run main.py
+Headless API server: uv run main.py --serve
 """
 
 import multiprocessing
+import sys
 
 # Required for PyInstaller on macOS to prevent app spawning multiple instances
 multiprocessing.freeze_support()
 
-from src.app import main
-
 if __name__ == "__main__":
+    # The server never imports Qt
+    if "--serve" in sys.argv[1:]:
+        from src.server import main
+    else:
+        from src.app import main
     main()
@@ -0,0 +1,6 @@
+"""
+Benchmark Module
+
+Headless benchmarks for the chat pipeline. Each benchmark prints JSON so
+results can be compared across commits.
+"""
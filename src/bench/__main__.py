@@ -0,0 +1,9 @@
+"""
+Run the chat pipeline benchmark: python -m src.bench
+"""
+
+from src.bench.pipeline import main
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+"""
+Pipeline Benchmark
+
+Drives scripted multi-turn conversations through the chat pipeline (web
+search, model load, prefill and streamed decode) and reports per-turn and
+summary timings as JSON.
+
+Runs against the stub or CPU backend and a fake search provider, so it
+needs neither Apple Silicon nor the network:
+
+    uv run python -m src.bench --backend stub
+    uv run python -m src.bench --backend stub --concurrency 4
+    QT_QPA_PLATFORM=offscreen uv run python -m src.bench --gui
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import NUM_DRAFT_TOKENS, BATCH_MAX_SIZE
+import src.search as search
+from src.llm import LLMWrapper
+from src.llm.backends import get_backend
+from src.llm.backends.stub import DEFAULT_RESPONSE
+from src.llm.scheduler import BatchScheduler
+from src.search.cache import SearchCache
+
+
+# (question, use web search); questions repeat so the search cache is exercised
+SCRIPT: List[Tuple[str, bool]] = [
+    ("What is a Yorkshire Terrier?", False),
+    ("What is the weather like in Leeds today?", True),
+    ("How much should a Yorkie eat each day?", False),
+    ("Latest news about Crufts dog show", True),
+    ("What is the weather like in Leeds today?", True),
+    ("Can you summarize what we talked about?", False),
+]
+
+
+class FakeSearchProvider:
+    """
+    Stand-in for DDGS that returns canned results after a fixed latency.
+    """
+
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+
+    def text(self, query: str, max_results: int = 5) -> List[dict]:
+        """Return ``max_results`` deterministic results for a query."""
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            {
+                "title": f"Result {i} for {query}",
+                "href": f"https://example.com/{i}",
+                "body": f"Snippet {i} with a few sentences about {query}. " * 3,
+            }
+            for i in range(1, max_results + 1)
+        ]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def make_backend(
+    name: str = "stub",
+    tokens_per_sec: float = 40.0,
+    prefill_tokens_per_sec: float = 800.0,
+    load_seconds: float = 0.5,
+    response_tokens: int = 120,
+    draft_model_id: Optional[str] = None,
+    draft_tokens: int = NUM_DRAFT_TOKENS,
+    draft_acceptance: float = 0.0,
+):
+    """
+    Create the backend to benchmark.
+
+    The speed options only apply to the stub backend, whose defaults are
+    in the range of a 4-bit 9B model on an M1. ``draft_model_id`` turns on
+    speculative decoding for MLX; the stub simulates it when
+    ``draft_acceptance`` is set.
+    """
+    if name == "mlx" and draft_model_id:
+        return get_backend(name, draft_model_id=draft_model_id, num_draft_tokens=draft_tokens)
+    if name != "stub":
+        return get_backend(name)
+    words = DEFAULT_RESPONSE.split()
+    response = " ".join(words[i % len(words)] for i in range(response_tokens))
+    return get_backend(
+        "stub",
+        tokens_per_sec=tokens_per_sec,
+        prefill_tokens_per_sec=prefill_tokens_per_sec,
+        load_seconds=load_seconds,
+        response=response,
+        draft_tokens=draft_tokens if draft_acceptance else 0,
+        draft_acceptance=draft_acceptance,
+    )
+
+
+def _timed_search(question: str) -> Tuple[Optional[str], float]:
+    start = time.perf_counter()
+    context = search.search_and_format(question)
+    return context, time.perf_counter() - start
+
+
+def _summarize(turns: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate per-turn metrics."""
+    def stats(key):
+        values = [t[key] for t in turns if t.get(key) is not None]
+        if not values:
+            return None
+        return {
+            "mean": round(statistics.fmean(values), 3),
+            "p50": round(statistics.median(values), 3),
+            "max": round(max(values), 3),
+        }
+
+    summary = {
+        key: stats(key)
+        for key in (
+            "ttft_ms",
+            "prefill_tok_per_sec",
+            "decode_tok_per_sec",
+            "draft_acceptance",
+            "search_ms",
+            "turn_ms",
+            "gui_ms",
+            "gui_max_stall_ms",
+        )
+        if stats(key) is not None
+    }
+    # The first turn pays for loading; later turns show steady state
+    if len(turns) > 1:
+        summary["warm_ttft_ms_mean"] = round(statistics.fmean(t["ttft_ms"] for t in turns[1:]), 3)
+    summary["peak_rss_mb"] = peak_rss_mb()
+    return summary
+
+
+def run_turn(llm: LLMWrapper, pool: ThreadPoolExecutor, question: str, use_search: bool) -> Dict[str, Any]:
+    """
+    Run one turn the way InferenceService does and time each stage.
+
+    Returns:
+        Dictionary of timings and token counts for the turn.
+    """
+    turn_start = time.perf_counter()
+    llm.add_to_history("user", question)
+
+    search_future = pool.submit(_timed_search, question) if use_search else None
+
+    load_ms = None
+    if not llm.is_loaded():
+        start = time.perf_counter()
+        llm.load()
+        load_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    prefix_tokens = llm.prefill(question)
+    prefix_seconds = time.perf_counter() - start
+
+    search_ms = None
+    context = None
+    start = time.perf_counter()
+    if search_future:
+        context, search_seconds = search_future.result()
+        search_ms = search_seconds * 1000
+    search_wait_ms = (time.perf_counter() - start) * 1000
+
+    first_token = []
+
+    def on_token(_text: str) -> None:
+        if not first_token:
+            first_token.append(time.perf_counter())
+
+    gen_start = time.perf_counter()
+    response = llm.generate_stream(question, context=context, callback=on_token)
+    end = time.perf_counter()
+    llm.add_to_history("assistant", response)
+
+    first = first_token[0] if first_token else end
+    prefill_tokens = prefix_tokens + llm.last_prefill_tokens
+    # Time to the first token covers the suffix prefill plus one decode step
+    prefill_seconds = prefix_seconds + (first - gen_start)
+    decoded = llm.last_generated_tokens
+
+    return {
+        "question": question,
+        "search": use_search,
+        "load_ms": round(load_ms, 3) if load_ms is not None else None,
+        "search_ms": round(search_ms, 3) if search_ms is not None else None,
+        "search_wait_ms": round(search_wait_ms, 3),
+        "ttft_ms": round((first - turn_start) * 1000, 3),
+        "prefill_tokens": prefill_tokens,
+        "prefill_tok_per_sec": round(prefill_tokens / prefill_seconds, 1) if prefill_seconds > 0 else None,
+        "decode_tokens": decoded,
+        "decode_tok_per_sec": round((decoded - 1) / (end - first), 1) if decoded > 1 and end > first else None,
+        "context_tokens": len(llm.prompt_cache.tokens),
+        "draft_acceptance": (
+            round(llm.last_draft_accepted / llm.last_draft_proposed, 3) if llm.last_draft_proposed else None
+        ),
+        "finish_reason": llm.last_finish_reason,
+        "turn_ms": round((end - turn_start) * 1000, 3),
+    }
+
+
+def run_pipeline_benchmark(llm: LLMWrapper, turns: int = len(SCRIPT)) -> Dict[str, Any]:
+    """
+    Run a scripted conversation headlessly.
+
+    Args:
+        llm: Unloaded wrapper around the backend to benchmark.
+        turns: Number of turns; the script repeats if this exceeds its length.
+
+    Returns:
+        Per-turn metrics and a summary.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="bench-search") as pool:
+        for i in range(turns):
+            question, use_search = SCRIPT[i % len(SCRIPT)]
+            results.append(run_turn(llm, pool, question, use_search))
+    return {"turns": results, "summary": _summarize(results)}
+
+
+def run_concurrent_benchmark(
+    llms: List[LLMWrapper],
+    scheduler: BatchScheduler,
+    turns: int = len(SCRIPT),
+) -> Dict[str, Any]:
+    """
+    Run one scripted conversation per wrapper at the same time.
+
+    The wrappers share a backend through ``scheduler``, so their decode
+    steps are batched together.
+
+    Args:
+        llms: Unloaded wrappers, one per simulated session.
+        scheduler: Scheduler the wrappers were created with.
+        turns: Number of turns per session.
+
+    Returns:
+        Each session's per-turn metrics and summary, and aggregate throughput.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(llms), thread_name_prefix="bench-session") as sessions:
+        reports = list(sessions.map(lambda llm: run_pipeline_benchmark(llm, turns), llms))
+    wall = time.perf_counter() - start
+
+    stats = scheduler.stats()
+    all_turns = [turn for report in reports for turn in report["turns"]]
+    summary = _summarize(all_turns)
+    summary.update({
+        "sessions": len(llms),
+        "wall_ms": round(wall * 1000, 3),
+        "decoded_tokens": stats["decoded_tokens"],
+        # Tokens produced per second of decoding, across all sessions
+        "aggregate_decode_tok_per_sec": (
+            round(stats["decoded_tokens"] / stats["decode_seconds"], 1) if stats["decode_seconds"] else None
+        ),
+        "mean_batch_size": stats["mean_batch_size"],
+        "scheduler": stats,
+    })
+    return {"sessions": reports, "summary": summary}
+
+
+def run_gui_benchmark(llm: LLMWrapper, turns: int = len(SCRIPT), typing_pause_ms: float = 0.0) -> Dict[str, Any]:
+    """
+    Run a scripted conversation through an offscreen MainWindow.
+
+    Measures the GUI thread's time in the inference service slots and the
+    longest stall of the event loop, observed as lateness of a 1 ms timer.
+
+    Args:
+        llm: Unloaded wrapper around the backend to benchmark.
+        turns: Number of turns; the script repeats if this exceeds its length.
+        typing_pause_ms: Time between entering a question and sending it,
+            during which a search can be prefetched.
+
+    Returns:
+        Per-turn metrics and a summary.
+    """
+    from PyQt6.QtCore import QEventLoop, QTimer
+    from PyQt6.QtWidgets import QApplication
+    from src.gui import MainWindow
+    from src.sessions import SessionStore
+
+    class TimedWindow(MainWindow):
+        """MainWindow that records time spent handling service signals."""
+
+        gui_seconds = 0.0
+        first_token = None
+
+        def _on_job_status(self, job_id, status):
+            start = time.perf_counter()
+            super()._on_job_status(job_id, status)
+            self.gui_seconds += time.perf_counter() - start
+
+        def _on_job_tokens(self, job_id, text):
+            start = time.perf_counter()
+            if self.first_token is None:
+                self.first_token = start
+            super()._on_job_tokens(job_id, text)
+            self.gui_seconds += time.perf_counter() - start
+
+        def _on_job_complete(self, job_id, result):
+            start = time.perf_counter()
+            super()._on_job_complete(job_id, result)
+            self.gui_seconds += time.perf_counter() - start
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    # An in-memory store keeps benchmark turns out of the user's saved chats
+    window = TimedWindow(llm, store=SessionStore(path=None))
+    window.show()
+    app.processEvents()
+
+    heartbeat = {"last": time.perf_counter(), "worst": 0.0}
+
+    def beat():
+        now = time.perf_counter()
+        heartbeat["worst"] = max(heartbeat["worst"], now - heartbeat["last"])
+        heartbeat["last"] = now
+
+    timer = QTimer()
+    timer.setInterval(1)
+    timer.timeout.connect(beat)
+    timer.start()
+
+    results = []
+    for i in range(turns):
+        question, use_search = SCRIPT[i % len(SCRIPT)]
+        loop = QEventLoop()
+
+        def turn_done(*args):
+            # Background jobs (speculative prefill, compaction) also complete; wait for the answer
+            if not window.is_generating:
+                loop.quit()
+
+        window.service.job_complete.connect(turn_done)
+        window.service.error_occurred.connect(turn_done)
+
+        window.gui_seconds = 0.0
+        window.first_token = None
+        heartbeat["last"] = time.perf_counter()
+        heartbeat["worst"] = 0.0
+
+        window.search_checkbox.setChecked(use_search)
+        window.input_field.setText(question)
+        if typing_pause_ms:
+            pause = QEventLoop()
+            QTimer.singleShot(int(typing_pause_ms), pause.quit)
+            pause.exec()
+        start = time.perf_counter()
+        window._on_send()
+        loop.exec()
+        end = time.perf_counter()
+
+        window.service.job_complete.disconnect(turn_done)
+        window.service.error_occurred.disconnect(turn_done)
+        first = window.first_token or end
+        results.append({
+            "question": question,
+            "search": use_search,
+            "ttft_ms": round((first - start) * 1000, 3),
+            "decode_tokens": llm.last_generated_tokens,
+            "context_tokens": len(llm.prompt_cache.tokens),
+            "turn_ms": round((end - start) * 1000, 3),
+            "gui_ms": round(window.gui_seconds * 1000, 3),
+            "gui_max_stall_ms": round(heartbeat["worst"] * 1000, 3),
+        })
+
+    timer.stop()
+    prefetcher = window.service.prefetcher
+    window.close()
+    report = {"turns": results, "summary": _summarize(results)}
+    if prefetcher is not None:
+        report["search_prefetch"] = prefetcher.stats()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chat pipeline benchmark")
+    parser.add_argument("--backend", default="stub", help="Inference backend (stub, cpu or mlx)")
+    parser.add_argument("--model-id", default=None, help="Model to load (default: the backend's)")
+    parser.add_argument("--turns", type=int, default=len(SCRIPT))
+    parser.add_argument("--gui", action="store_true", help="Drive an offscreen MainWindow")
+    parser.add_argument(
+        "--typing-pause-ms", type=float, default=0.0,
+        help="GUI only: pause between entering and sending a question (lets searches prefetch)",
+    )
+    parser.add_argument("--search-latency-ms", type=float, default=300.0)
+    parser.add_argument("--live-search", action="store_true", help="Use DuckDuckGo instead of the fake provider")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="Stub decode speed")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=800.0, help="Stub prefill speed")
+    parser.add_argument("--load-seconds", type=float, default=0.5, help="Stub load time")
+    parser.add_argument("--response-tokens", type=int, default=120, help="Stub response length")
+    parser.add_argument("--draft-model", default=None, help="Draft model for speculative decoding (mlx)")
+    parser.add_argument("--draft-tokens", type=int, default=NUM_DRAFT_TOKENS, help="Draft tokens per step")
+    parser.add_argument(
+        "--draft-acceptance", type=float, default=0.0,
+        help="Simulate speculative decoding in the stub with this acceptance rate",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=None,
+        help="Run this many conversations at once through the batch scheduler",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_SIZE, help="Scheduler batch size")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+    if args.concurrency is not None and args.gui:
+        parser.error("--concurrency is headless only")
+
+    backend = make_backend(
+        args.backend,
+        tokens_per_sec=args.tokens_per_sec,
+        prefill_tokens_per_sec=args.prefill_tokens_per_sec,
+        load_seconds=args.load_seconds,
+        response_tokens=args.response_tokens,
+        draft_model_id=args.draft_model,
+        draft_tokens=args.draft_tokens,
+        draft_acceptance=args.draft_acceptance,
+    )
+    scheduler = None
+    if args.concurrency is not None:
+        scheduler = BatchScheduler(backend, max_batch_size=args.batch_size)
+    llms = [
+        LLMWrapper(model_id=args.model_id, backend=backend, scheduler=scheduler)
+        for _ in range(args.concurrency or 1)
+    ]
+    llm = llms[0]
+    for each in llms:
+        # Measure cold prefill every run rather than resuming saved KV snapshots
+        each.snapshots = None
+
+    # Isolate the run from the user's search cache and the network
+    original_provider = search.search_provider
+    cache = SearchCache(path=None)
+    search.set_search_cache(cache)
+    if not args.live_search:
+        latency = args.search_latency_ms / 1000
+        search.search_provider = lambda: FakeSearchProvider(latency)
+    try:
+        if args.gui:
+            report = run_gui_benchmark(llm, args.turns, args.typing_pause_ms)
+        elif scheduler is not None:
+            report = run_concurrent_benchmark(llms, scheduler, args.turns)
+        else:
+            report = run_pipeline_benchmark(llm, args.turns)
+    finally:
+        search.search_provider = original_provider
+        search.set_search_cache(None)
+        if scheduler is not None:
+            scheduler.stop()
+
+    report["config"] = {
+        "backend": backend.name,
+        "model_id": llm.model_id,
+        "mode": "gui" if args.gui else "headless",
+        "concurrency": args.concurrency,
+        "turns": args.turns,
+        "live_search": args.live_search,
+        "search_latency_ms": None if args.live_search else args.search_latency_ms,
+        "search_cache": cache.stats(),
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Render Benchmark
+
+Measures GUI-thread time spent streaming a response into the chat window,
+scrolling through a long transcript and opening a long saved session.
+
+Run with: QT_QPA_PLATFORM=offscreen uv run python -m src.bench.render
+"""
+
+import argparse
+import json
+import resource
+import sys
+import time
+
+from src.config import STREAM_FLUSH_INTERVAL_MS
+
+
+def make_tokens(count: int) -> list[str]:
+    """Build a deterministic stream of word tokens with occasional paragraphs."""
+    tokens = []
+    for i in range(count):
+        tokens.append("\n\n" if i % 97 == 96 else f" word{i % 50}")
+    return tokens
+
+
+def run_render_benchmark(
+    tokens: int = 1000,
+    tokens_per_sec: float = 30.0,
+    flush_interval_ms: int = STREAM_FLUSH_INTERVAL_MS,
+    per_token: bool = False,
+) -> dict:
+    """
+    Stream tokens into an offscreen MainWindow and time the GUI thread.
+    
+    Tokens are grouped the way InferenceService's TokenBatcher would group them
+    at the given decode speed, or delivered one by one with ``per_token``.
+    Each delivery is followed by processing pending events so layout and
+    painting are included in the measurement.
+    
+    Args:
+        tokens: Number of tokens to stream.
+        tokens_per_sec: Simulated decode speed.
+        flush_interval_ms: Batching interval used by the worker.
+        per_token: Deliver every token separately (no batching).
+    
+    Returns:
+        Dictionary of timings.
+    """
+    from PyQt6.QtWidgets import QApplication
+    from src.gui import MainWindow
+    from src.sessions import SessionStore
+    
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = MainWindow(store=SessionStore(path=None))
+    window.show()
+    app.processEvents()
+    
+    stream = make_tokens(tokens)
+    if per_token:
+        batch_size = 1
+    else:
+        batch_size = max(1, int(tokens_per_sec * flush_interval_ms / 1000))
+    batches = ["".join(stream[i:i + batch_size]) for i in range(0, len(stream), batch_size)]
+    
+    gui_time = 0.0
+    worst = 0.0
+    for batch in batches:
+        start = time.perf_counter()
+        window._on_tokens(batch)
+        app.processEvents()
+        elapsed = time.perf_counter() - start
+        gui_time += elapsed
+        worst = max(worst, elapsed)
+    
+    window.close()
+    
+    return {
+        "tokens": tokens,
+        "flushes": len(batches),
+        "tokens_per_flush": batch_size,
+        "gui_ms_total": round(gui_time * 1000, 3),
+        "gui_ms_per_1k_tokens": round(gui_time * 1000 * 1000 / tokens, 3),
+        "gui_ms_worst_flush": round(worst * 1000, 3),
+    }
+
+
+def run_scroll_benchmark(messages: int = 10000, steps: int = 200) -> dict:
+    """
+    Fill the transcript with many messages and scroll through it.
+    
+    Args:
+        messages: Number of messages to add.
+        steps: Number of scroll positions to visit, top to bottom.
+    
+    Returns:
+        Dictionary of timings and memory use.
+    """
+    from PyQt6.QtWidgets import QApplication
+    from src.gui import MainWindow
+    from src.sessions import SessionStore
+    
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = MainWindow(store=SessionStore(path=None))
+    window.show()
+    app.processEvents()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    start = time.perf_counter()
+    for i in range(messages):
+        text = " ".join(make_tokens(5 + i % 60)).strip()
+        window.transcript_model.append_message(text, is_user=i % 2 == 0)
+    window.transcript.doItemsLayout()
+    app.processEvents()
+    fill_time = time.perf_counter() - start
+    
+    scroll_bar = window.transcript.verticalScrollBar()
+    worst = 0.0
+    start = time.perf_counter()
+    for step in range(steps + 1):
+        frame_start = time.perf_counter()
+        scroll_bar.setValue(scroll_bar.maximum() * step // steps)
+        window.transcript.viewport().repaint()
+        app.processEvents()
+        worst = max(worst, time.perf_counter() - frame_start)
+    scroll_time = time.perf_counter() - start
+    
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    window.close()
+    
+    return {
+        "messages": messages,
+        "fill_ms": round(fill_time * 1000, 3),
+        "scroll_ms_per_frame": round(scroll_time * 1000 / (steps + 1), 3),
+        "scroll_ms_worst_frame": round(worst * 1000, 3),
+        # ru_maxrss is bytes on macOS and kilobytes on Linux
+        "peak_rss_growth_mb": round(
+            (rss_after - rss_before) / (1024 * 1024 if sys.platform == "darwin" else 1024), 2
+        ),
+    }
+
+
+def run_open_benchmark(messages: int = 5000, pages: int = 5) -> dict:
+    """
+    Save a long session, reopen it and scroll back through older pages.
+    
+    Args:
+        messages: Number of messages in the saved session.
+        pages: Number of older pages to load by scrolling up.
+    
+    Returns:
+        Dictionary of timings.
+    """
+    from PyQt6.QtWidgets import QApplication
+    from src.gui import MainWindow
+    from src.sessions import SessionStore
+    
+    store = SessionStore(path=None)
+    session_id = store.create_session()
+    for i in range(messages):
+        text = " ".join(make_tokens(5 + i % 60)).strip()
+        store.append_message(session_id, "user" if i % 2 == 0 else "assistant", text, tokens=len(text) // 4)
+    
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = MainWindow(store=store)
+    window.show()
+    app.processEvents()
+    
+    start = time.perf_counter()
+    window._open_session(session_id)
+    app.processEvents()
+    open_time = time.perf_counter() - start
+    
+    scroll_bar = window.transcript.verticalScrollBar()
+    page_times = []
+    for _ in range(pages):
+        if window.all_messages_loaded:
+            break
+        start = time.perf_counter()
+        scroll_bar.setValue(0)
+        app.processEvents()
+        page_times.append(time.perf_counter() - start)
+    
+    result = {
+        "messages": messages,
+        "open_ms": round(open_time * 1000, 3),
+        "rows_loaded": window.transcript_model.rowCount(),
+        "history_messages": len(window.llm.conversation_history),
+        "page_ms_mean": round(sum(page_times) * 1000 / max(1, len(page_times)), 3),
+        "page_ms_worst": round(max(page_times, default=0.0) * 1000, 3),
+    }
+    window.close()
+    return result
+
+
+def main(argv=None):
+    """Run the render benchmark and print JSON results."""
+    parser = argparse.ArgumentParser(description="PixieAI streaming render benchmark")
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0)
+    parser.add_argument("--flush-interval-ms", type=int, default=STREAM_FLUSH_INTERVAL_MS)
+    parser.add_argument("--per-token", action="store_true", help="Disable batching")
+    parser.add_argument(
+        "--scroll", type=int, metavar="MESSAGES", default=0,
+        help="Benchmark scrolling a transcript of this many messages instead",
+    )
+    parser.add_argument(
+        "--open", type=int, metavar="MESSAGES", default=0,
+        help="Benchmark opening a saved session of this many messages instead",
+    )
+    args = parser.parse_args(argv)
+    
+    if args.open:
+        result = run_open_benchmark(messages=args.open)
+    elif args.scroll:
+        result = run_scroll_benchmark(messages=args.scroll)
+    else:
+        result = run_render_benchmark(
+            tokens=args.tokens,
+            tokens_per_sec=args.tokens_per_sec,
+            flush_interval_ms=args.flush_interval_ms,
+            per_token=args.per_token,
+        )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
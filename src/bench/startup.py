@@ -0,0 +1,250 @@
+"""
+Startup Benchmark
+
+Launches the app the way main.py does, in a fresh interpreter run with
+``-X importtime``, and reports time to first paint, the import graph up to
+that point and what was imported in the background afterwards. Fails with
+``--max-first-paint-ms`` or when a heavy dependency (the inference engine or
+the search client) is imported before the window appears.
+
+Run with: QT_QPA_PLATFORM=offscreen PIXIE_BACKEND=stub uv run python -m src.bench.startup
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from src.config import INFERENCE_BACKEND
+
+
+# Packages that must not be imported before the window is painted
+HEAVY_MODULES = ("mlx", "mlx_lm", "transformers", "llama_cpp", "ddgs", "primp", "httpx", "lxml")
+
+# Written to stderr by the child at first paint, between import-time lines
+PAINT_MARKER = "pixie-startup: first paint"
+
+# Seconds the child waits for the window and for the background imports
+PAINT_TIMEOUT = 10.0
+READY_TIMEOUT = 120.0
+
+# Runs in the child: time main.py's imports, the window and the background
+# imports. Only the standard library is imported before src.app so the
+# import graph is the app's own.
+_CHILD_SCRIPT = r"""
+import sys, time
+start = time.perf_counter()
+import multiprocessing
+import src.app
+imported = time.perf_counter()
+
+from PyQt6.QtCore import QEvent, QObject
+from PyQt6.QtWidgets import QApplication
+from src.sessions import SessionStore
+
+heavy, paint_timeout, ready_timeout, marker = sys.argv[1].split(","), float(sys.argv[2]), float(sys.argv[3]), sys.argv[4]
+
+class PaintWatcher(QObject):
+    painted = None
+    def eventFilter(self, obj, event):
+        if self.painted is None and event.type() == QEvent.Type.Paint:
+            self.painted = time.perf_counter()
+        return False
+
+app = QApplication(sys.argv[:1])
+watcher = PaintWatcher()
+app.installEventFilter(watcher)
+window = src.app.MainWindow(store=SessionStore(path=None))
+jobs = []
+window.service.job_complete.connect(lambda job_id, result: jobs.append(job_id))
+window.service.error_occurred.connect(lambda job_id, error: jobs.append(job_id))
+window.show()
+shown = time.perf_counter()
+while watcher.painted is None and time.perf_counter() < shown + paint_timeout:
+    app.processEvents()
+painted = watcher.painted
+print(marker, file=sys.stderr, flush=True)
+heavy_before_paint = sorted({m.split(".")[0] for m in sys.modules} & set(heavy))
+
+while time.perf_counter() < shown + ready_timeout:
+    app.processEvents()
+    if jobs and not window.service.is_busy() and not window.service.queue_depth():
+        break
+    time.sleep(0.001)
+ready = time.perf_counter() if jobs else None
+window.close()
+
+import json
+ms = lambda t: None if t is None else round((t - start) * 1000, 3)
+print(json.dumps({
+    "import_ms": ms(imported),
+    "window_ms": ms(shown),
+    "first_paint_ms": ms(painted),
+    "ready_ms": ms(ready),
+    "heavy_before_paint": heavy_before_paint,
+}))
+"""
+
+
+def parse_importtime(lines: List[str]) -> List[Dict]:
+    """
+    Parse ``-X importtime`` output.
+
+    Args:
+        lines: stderr lines; anything that is not an import-time line is skipped.
+
+    Returns:
+        One dict per import, in completion order, with the module name,
+        nesting depth (0 for imports made directly by the running code),
+        self and cumulative milliseconds.
+    """
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            self_ms, cumulative_ms = int(self_us) / 1000, int(cumulative_us) / 1000
+        except ValueError:
+            continue  # The header line
+        # Each nesting level indents the name by two spaces (after one separator space)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append({
+            "module": name.strip(),
+            "depth": depth,
+            "self_ms": round(self_ms, 3),
+            "cumulative_ms": round(cumulative_ms, 3),
+        })
+    return imports
+
+
+def summarize_imports(imports: List[Dict], top: int = 10) -> Dict:
+    """Totals, the slowest top-level imports and the slowest modules by self time."""
+    top_level = sorted((i for i in imports if i["depth"] == 0), key=lambda i: -i["cumulative_ms"])
+    slowest = sorted(imports, key=lambda i: -i["self_ms"])
+    return {
+        "modules": len(imports),
+        "total_ms": round(sum(i["self_ms"] for i in imports), 3),
+        "top_level": [
+            {"module": i["module"], "cumulative_ms": i["cumulative_ms"]} for i in top_level[:top]
+        ],
+        "slowest": [
+            {"module": i["module"], "self_ms": i["self_ms"]} for i in slowest[:top]
+        ],
+    }
+
+
+def run_once(top: int = 10) -> Dict:
+    """
+    Start the app once in a fresh interpreter and measure it.
+
+    Args:
+        top: Number of imports listed in each ranking.
+
+    Returns:
+        Timings from the child (milliseconds since its first line ran) and
+        summaries of the imports before and after first paint.
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (project_root, env.get("PYTHONPATH")) if p)
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [
+            sys.executable, "-X", "importtime", "-c", _CHILD_SCRIPT,
+            ",".join(HEAVY_MODULES), str(PAINT_TIMEOUT), str(READY_TIMEOUT), PAINT_MARKER,
+        ],
+        cwd=project_root,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    process_time = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{proc.stderr[-2000:]}")
+
+    stderr = proc.stderr.splitlines()
+    split = stderr.index(PAINT_MARKER) if PAINT_MARKER in stderr else len(stderr)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = round(process_time * 1000, 3)
+    result["before_paint"] = summarize_imports(parse_importtime(stderr[:split]), top)
+    background = parse_importtime(stderr[split:])
+    result["background"] = summarize_imports(background, top)
+    result["background"]["heavy"] = sorted(
+        {i["module"].split(".")[0] for i in background} & set(HEAVY_MODULES)
+    )
+    return result
+
+
+def run_startup_benchmark(runs: int = 3, top: int = 10) -> Dict:
+    """
+    Start the app several times and report median timings.
+
+    The import graphs are those of the last run.
+
+    Args:
+        runs: Number of cold starts.
+        top: Number of imports listed in each ranking.
+
+    Returns:
+        Dictionary of timings and import summaries.
+    """
+    results = [run_once(top) for _ in range(runs)]
+
+    def median(key: str) -> Optional[float]:
+        values = [r[key] for r in results if r[key] is not None]
+        return round(statistics.median(values), 3) if values else None
+
+    last = results[-1]
+    return {
+        "backend": INFERENCE_BACKEND,
+        "runs": runs,
+        "process_ms": median("process_ms"),
+        "import_ms": median("import_ms"),
+        "window_ms": median("window_ms"),
+        "first_paint_ms": median("first_paint_ms"),
+        "ready_ms": median("ready_ms"),
+        "heavy_before_paint": sorted({m for r in results for m in r["heavy_before_paint"]}),
+        "before_paint": last["before_paint"],
+        "background": last["background"],
+    }
+
+
+def main(argv=None):
+    """Run the startup benchmark and print JSON results."""
+    parser = argparse.ArgumentParser(description="PixieAI startup benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to take the median of")
+    parser.add_argument("--top", type=int, default=10, help="Imports listed per ranking")
+    parser.add_argument(
+        "--max-first-paint-ms", type=float, default=None,
+        help="Exit with an error if the median time to first paint is higher",
+    )
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    result = run_startup_benchmark(runs=args.runs, top=args.top)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+    failures = []
+    if result["heavy_before_paint"]:
+        failures.append(f"imported before first paint: {', '.join(result['heavy_before_paint'])}")
+    first_paint = result["first_paint_ms"]
+    if first_paint is None:
+        failures.append("the window was never painted")
+    elif args.max_first_paint_ms is not None and first_paint > args.max_first_paint_ms:
+        failures.append(f"first paint took {first_paint} ms (limit {args.max_first_paint_ms} ms)")
+    if failures:
+        sys.exit("Startup check failed: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,9 @@ PixieAI Configuration
 Model and memory settings optimized for Apple Silicon with <16GB RAM.
 """
 
+import os
+import sys
+
 # =============================================================================
 # MODEL CONFIGURATION
 # =============================================================================
@@ -15,6 +18,56 @@ MODEL_ID = "mlx-community/gemma-2-9b-it-4bit"
 # - Gemma 9B (4-bit): ~6-7 GB
 # - macOS + GUI + Browser: ~9 GB
 # - Total: < 16 GB ✅
+# - Optional draft model (below): +1.5 GB weights, +~0.1 MB KV cache per token
+
+# Inference engine: "mlx" (Apple Silicon), "cpu" (llama.cpp) or "stub".
+# Override with the PIXIE_BACKEND environment variable, e.g. on Linux CI.
+INFERENCE_BACKEND = os.environ.get("PIXIE_BACKEND", "mlx")
+
+# Speculative decoding (MLX only): a small draft model sharing the main
+# model's tokenizer proposes NUM_DRAFT_TOKENS tokens per step and the main
+# model checks them all in one forward pass. Every emitted token is still
+# sampled from the main model, so output is distributed exactly as without
+# a draft; decoding just takes fewer main-model passes when drafts are
+# accepted. The draft is only loaded on machines with at least
+# DRAFT_MIN_MEMORY_GB of RAM, keeping 16 GB Macs within the budget above.
+# None disables it; override with the PIXIE_DRAFT_MODEL environment variable.
+DRAFT_MODEL_ID = os.environ.get("PIXIE_DRAFT_MODEL") or None  # e.g. "mlx-community/gemma-2-2b-it-4bit"
+NUM_DRAFT_TOKENS = 3
+DRAFT_MIN_MEMORY_GB = 24
+
+# GGUF model used by the "cpu" backend (Hugging Face repo or local file)
+CPU_MODEL_ID = "bartowski/gemma-2-9b-it-GGUF"
+CPU_MODEL_FILE = "*Q4_K_M.gguf"
+
+# Load and warm up the model in the background as soon as the window opens.
+# Costs ~6-7 GB of RAM at startup instead of on the first message.
+PRELOAD_MODEL = False
+
+# Import the inference engine and search client in the background once the
+# window is up (not the model weights), so neither delays the first paint
+# nor the first message.
+PREIMPORT_DEPENDENCIES = True
+
+# Tokens generated by the warm-up pass that compiles kernels ahead of time
+WARMUP_TOKENS = 8
+
+# Release the model's weights and KV cache after this many minutes without a
+# request (0 = keep it loaded). The next message reloads it and resumes the
+# conversation from its KV snapshot instead of prefilling it again.
+IDLE_UNLOAD_MINUTES = 30
+
+# Release it sooner when the OS reports memory pressure, but only after it
+# has been idle for MEMORY_PRESSURE_GRACE_SECONDS. On macOS that is the
+# kernel's warning level; on Linux, tasks stalling on memory for at least
+# MEMORY_PRESSURE_STALL_PERCENT of the last 10 seconds. Memory in use is not
+# a signal by itself: a large model may fill most of RAM on its own.
+MEMORY_PRESSURE_UNLOAD = True
+MEMORY_PRESSURE_STALL_PERCENT = 10.0
+MEMORY_PRESSURE_GRACE_SECONDS = 60
+
+# How often the idle policy is checked
+IDLE_CHECK_INTERVAL_SECONDS = 15
 
 # =============================================================================
 # GENERATION SETTINGS
@@ -24,6 +77,58 @@ MAX_TOKENS = 2048
 TEMPERATURE = 0.7
 TOP_P = 0.9
 
+# Generation ends as soon as any of these appears in the output. The prompt
+# uses a plain "Human:"/"Pixie:" transcript, so the model otherwise tends to
+# carry on and write the user's next turn itself.
+STOP_SEQUENCES = ["\nHuman:", "\nPixie:", "<end_of_turn>", "<eos>"]
+
+# =============================================================================
+# CONTEXT SETTINGS
+# =============================================================================
+
+# Gemma 2 context length in tokens
+CONTEXT_WINDOW = 8192
+
+# Upper bound on conversation history tokens sent with each prompt.
+# The effective budget also leaves room for the system prompt, search
+# context, the current question and MAX_TOKENS of output.
+HISTORY_TOKEN_BUDGET = 4096
+
+# Prompt tokens processed per forward pass during prefill
+PREFILL_STEP_SIZE = 512
+
+# Fold the oldest turns into a running summary once the history not yet
+# summarized passes COMPACTION_THRESHOLD_TOKENS, keeping the most recent
+# COMPACTION_KEEP_TOKENS verbatim. Summaries are written in the background
+# while the model is idle.
+COMPACTION_ENABLED = True
+COMPACTION_THRESHOLD_TOKENS = 2048
+COMPACTION_KEEP_TOKENS = 768
+COMPACTION_SUMMARY_TOKENS = 192  # Maximum tokens added to the summary per compaction
+
+# Prefill the conversation while the next message is being composed: the
+# history and "Human:" cue right after each answer, and the typed text (up
+# to its last word, which may still change) once typing pauses for
+# SPECULATIVE_PREFILL_DEBOUNCE_MS. Sending then only prefills what was typed
+# since. The work runs in chunks of SPECULATIVE_PREFILL_CHUNK_TOKENS and
+# stops after the current chunk as soon as a message is sent.
+SPECULATIVE_PREFILL_ENABLED = True
+SPECULATIVE_PREFILL_INPUT = True  # Also prefill the text typed so far
+SPECULATIVE_PREFILL_DEBOUNCE_MS = 300
+SPECULATIVE_PREFILL_CHUNK_TOKENS = 128
+
+# =============================================================================
+# BATCHING SETTINGS
+# =============================================================================
+
+# Several conversations (windows, API clients) share one loaded model through
+# the batch scheduler: their sequences are decoded together, new ones join
+# between decode steps, and long prompts are prefilled in chunks so running
+# answers keep streaming. Speculative decoding only applies to unbatched use.
+BATCH_MAX_SIZE = 8  # Sequences decoded together per step
+BATCH_MAX_PER_SESSION = 1  # Decode slots a single session may hold at once
+BATCH_PREFILL_CHUNK_TOKENS = 512  # Prompt tokens prefilled between two decode steps
+
 # =============================================================================
 # SEARCH SETTINGS
 # =============================================================================
@@ -31,6 +136,127 @@ TOP_P = 0.9
 # Limit search results to save context tokens
 MAX_SEARCH_RESULTS = 5
 
+# Cache search results so repeated questions skip the network round-trip
+SEARCH_CACHE_ENABLED = True
+SEARCH_CACHE_TTL = 60 * 60  # Seconds before a cached result is refetched
+SEARCH_CACHE_MAX_ENTRIES = 1000  # Entries kept on disk (LRU eviction)
+SEARCH_CACHE_MEMORY_ENTRIES = 64  # Entries kept in memory
+
+# Search while the question is still being typed: once the input has been
+# unchanged for SEARCH_PREFETCH_DEBOUNCE_MS with Web Search on, its text is
+# searched in the background, and sending that text uses the result. At most
+# one prefetch starts per SEARCH_PREFETCH_MIN_INTERVAL seconds so DuckDuckGo
+# does not throttle us.
+SEARCH_PREFETCH_ENABLED = True
+SEARCH_PREFETCH_DEBOUNCE_MS = 400
+SEARCH_PREFETCH_MIN_INTERVAL = 2.0
+SEARCH_PREFETCH_MIN_CHARS = 8  # Shorter input is not worth searching yet
+SEARCH_PREFETCH_MAX_ENTRIES = 8  # Finished prefetches kept for the send
+
+# Prompt tokens reserved for search context on every turn. Results are split
+# into passages, near-duplicates dropped, and the passages most relevant to
+# the question (BM25) packed into this budget.
+SEARCH_CONTEXT_TOKENS = 1024
+SEARCH_PASSAGE_WORDS = 80  # Target passage length
+SEARCH_DEDUP_THRESHOLD = 0.6  # Shingle overlap (Jaccard) above which passages are duplicates
+
+# Deep search: fetch the result pages and use their text, not just the
+# one-line snippets. Slower hosts are dropped once the deadline passes.
+DEEP_SEARCH_ENABLED = False
+FETCH_TIMEOUT = 3.0  # Seconds allowed per page
+FETCH_DEADLINE = 4.0  # Seconds allowed for all pages of a search
+FETCH_MAX_CONNECTIONS = 10  # Pooled connections across all hosts
+FETCH_MAX_CONNECTIONS_PER_HOST = 2
+FETCH_MAX_BYTES = 512 * 1024  # HTML read per page before giving up on the rest
+FETCH_MAX_CHARS = 4000  # Extracted text kept per page
+
+# =============================================================================
+# INTERFACE SETTINGS
+# =============================================================================
+
+# Streamed tokens are batched and pushed to the GUI at most once per interval
+# (~30 fps), and scroll-follow is throttled to the same rate
+STREAM_FLUSH_INTERVAL_MS = 33
+
+# Messages loaded into the transcript at a time; older pages load on scroll-up
+TRANSCRIPT_PAGE_SIZE = 100
+
+# =============================================================================
+# SERVER SETTINGS
+# =============================================================================
+
+# Headless OpenAI-compatible API (`uv run main.py --serve`). Only listens on
+# the loopback interface unless SERVER_HOST is changed.
+SERVER_HOST = os.environ.get("PIXIE_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("PIXIE_PORT", "8080"))
+SERVER_MAX_ACTIVE = BATCH_MAX_SIZE  # Requests generating at once (batched together)
+SERVER_MAX_QUEUE = 32  # Requests waiting for a slot before new ones get HTTP 429
+SERVER_STREAM_BUFFER = 64  # Chunks buffered for a slow client before generation waits
+SERVER_WRITE_TIMEOUT = 30.0  # Seconds a client may stall a stream before it is dropped
+SERVER_MAX_BODY_BYTES = 4 * 1024 * 1024  # Largest accepted request body
+
+# =============================================================================
+# STORAGE SETTINGS
+# =============================================================================
+
+# Local cache directory (search results, etc.)
+if sys.platform == "darwin":
+    CACHE_DIR = os.path.expanduser("~/Library/Caches/PixieAI")
+else:
+    CACHE_DIR = os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "pixieai"
+    )
+
+SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "search_cache.sqlite3")
+
+# Answers to exact prompts (same model, conversation, question, search
+# context and sampler settings) are replayed instead of generated again.
+# Only deterministic generations (temperature 0) are cached unless
+# RESPONSE_CACHE_SAMPLED is set, which replays the first sampled answer.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_SAMPLED = False
+RESPONSE_CACHE_PATH = os.path.join(CACHE_DIR, "response_cache.sqlite3")
+RESPONSE_CACHE_MAX_ENTRIES = 500
+
+# Local data directory (saved conversations, etc.)
+if sys.platform == "darwin":
+    DATA_DIR = os.path.expanduser("~/Library/Application Support/PixieAI")
+else:
+    DATA_DIR = os.path.join(
+        os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")), "pixieai"
+    )
+
+SESSIONS_PATH = os.path.join(DATA_DIR, "sessions.sqlite3")
+
+# Saved KV caches (system prompt and each session's latest state), so a
+# cold start or a reopened session only prefills tokens after the snapshot.
+# Gemma 2 9B keeps ~340 KB of keys/values per token, so a full 8k context is
+# ~2.8 GB on disk; the directory is capped and evicted least recently used.
+SNAPSHOT_ENABLED = True
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "kv_snapshots")
+SNAPSHOT_MAX_BYTES = 4 * 1024 ** 3
+SNAPSHOT_MIN_TOKENS = 32  # Smaller gains are cheaper to prefill than to load
+
+# Local log directory (traces, etc.)
+if sys.platform == "darwin":
+    LOG_DIR = os.path.expanduser("~/Library/Logs/PixieAI")
+else:
+    LOG_DIR = os.path.join(
+        os.environ.get("XDG_STATE_HOME", os.path.expanduser("~/.local/state")), "pixieai"
+    )
+
+# =============================================================================
+# TRACING SETTINGS
+# =============================================================================
+
+# Record timed spans for each stage of a turn (search, load, prefill, decode,
+# render). Enable with PIXIE_TRACE=1; open the file in ui.perfetto.dev or
+# chrome://tracing.
+TRACE_ENABLED = os.environ.get("PIXIE_TRACE", "0") not in ("", "0")
+TRACE_PATH = os.path.join(LOG_DIR, "trace.json")
+TRACE_MAX_BYTES = 5 * 1024 * 1024  # Rotate the trace file at this size
+TRACE_BACKUP_COUNT = 3  # Rotated trace files kept
+
 # =============================================================================
 # HARDWARE SETTINGS
 # =============================================================================
@@ -1,5 +1,6 @@
 """GUI Module"""
 from src.gui.main_window import MainWindow
-from src.gui.worker import WorkerThread
+from src.gui.transcript import TranscriptModel, TranscriptView
+from src.gui.worker import InferenceService
 
-__all__ = ["MainWindow", "WorkerThread"]
+__all__ = ["MainWindow", "TranscriptModel", "TranscriptView", "InferenceService"]
@@ -7,105 +7,36 @@ Native macOS-styled chatbot interface for PixieAI.
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLineEdit, QPushButton, QCheckBox,
-    QLabel, QFrame, QScrollArea, QSizePolicy
+    QLabel, QFrame, QComboBox
 )
 from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont, QKeySequence, QShortcut, QIcon
 import os
+from dataclasses import asdict
+from typing import Optional
 
+from src.config import (
+    PRELOAD_MODEL,
+    PREIMPORT_DEPENDENCIES,
+    STREAM_FLUSH_INTERVAL_MS,
+    TRANSCRIPT_PAGE_SIZE,
+    IDLE_CHECK_INTERVAL_SECONDS,
+    SEARCH_PREFETCH_DEBOUNCE_MS,
+    SEARCH_PREFETCH_MIN_CHARS,
+    SPECULATIVE_PREFILL_ENABLED,
+    SPECULATIVE_PREFILL_INPUT,
+    SPECULATIVE_PREFILL_DEBOUNCE_MS,
+)
 from src.llm import LLMWrapper
-from src.gui.worker import WorkerThread
+from src.llm.residency import IdlePolicy
+from src.sessions import SessionStore
+from src.gui.transcript import TranscriptView
+from src.gui.worker import InferenceService, PRIORITY_BACKGROUND, PRIORITY_SAVE
+from src.tracing import get_tracer
 from src.version import __version__
 
 
-class MessageBubble(QFrame):
-    """A single chat message bubble."""
-    
-    def __init__(self, text: str, is_user: bool = False, parent=None):
-        super().__init__(parent)
-        self.is_user = is_user
-        self.label = None
-        self._setup_ui(text)
-    
-    def _setup_ui(self, text: str):
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(12, 4, 12, 4)
-        layout.setSpacing(8)
-        
-        if self.is_user:
-            # User message: right-aligned, blue bubble
-            layout.addStretch()
-            
-            bubble = QFrame()
-            bubble.setObjectName("userBubble")
-            bubble_layout = QVBoxLayout(bubble)
-            bubble_layout.setContentsMargins(14, 10, 14, 10)
-            
-            self.label = QLabel(text)
-            self.label.setWordWrap(True)
-            self.label.setTextFormat(Qt.TextFormat.PlainText)
-            self.label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-            self.label.setCursor(Qt.CursorShape.IBeamCursor)
-            self.label.setStyleSheet("color: white; font-size: 14px;")
-            bubble_layout.addWidget(self.label)
-            
-            bubble.setStyleSheet("""
-                QFrame#userBubble {
-                    background-color: #007AFF;
-                    border-radius: 18px;
-                    border-bottom-right-radius: 4px;
-                }
-            """)
-            bubble.setMaximumWidth(400)
-            layout.addWidget(bubble)
-        else:
-            # Bot message: left-aligned with avatar, gray bubble
-            avatar = QLabel("P")
-            avatar.setFixedSize(28, 28)
-            avatar.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            avatar.setStyleSheet("""
-                background-color: #8E44AD;
-                color: white;
-                font-size: 14px;
-                font-weight: bold;
-                border-radius: 14px;
-            """)
-            layout.addWidget(avatar, alignment=Qt.AlignmentFlag.AlignTop)
-            
-            bubble = QFrame()
-            bubble.setObjectName("botBubble")
-            bubble_layout = QVBoxLayout(bubble)
-            bubble_layout.setContentsMargins(14, 10, 14, 10)
-            
-            self.label = QLabel(text)
-            self.label.setWordWrap(True)
-            self.label.setTextFormat(Qt.TextFormat.PlainText)
-            self.label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-            self.label.setCursor(Qt.CursorShape.IBeamCursor)
-            self.label.setStyleSheet("color: #1C1C1E; font-size: 14px;")
-            bubble_layout.addWidget(self.label)
-            
-            bubble.setStyleSheet("""
-                QFrame#botBubble {
-                    background-color: #F0F0F5;
-                    border-radius: 18px;
-                    border-bottom-left-radius: 4px;
-                }
-            """)
-            bubble.setMaximumWidth(400)
-            layout.addWidget(bubble)
-            layout.addStretch()
-    
-    def append_text(self, text: str):
-        """Append text to the message (for streaming)."""
-        if self.label:
-            current = self.label.text()
-            self.label.setText(current + text)
-    
-    def set_text(self, text: str):
-        """Set the message text."""
-        if self.label:
-            self.label.setText(text)
+WELCOME_MESSAGE = "Hi there! I'm Pixie, your friendly AI assistant.\n\nI'm here to help - ask me anything! Enable Web Search for the latest info.\n\nWhat can I help you with today?"
 
 
 class MainWindow(QMainWindow):
@@ -113,7 +44,14 @@ class MainWindow(QMainWindow):
     Main chatbot window with native macOS styling.
     """
     
-    def __init__(self):
+    def __init__(self, llm: Optional[LLMWrapper] = None, store: Optional[SessionStore] = None):
+        """
+        Initialize the window.
+        
+        Args:
+            llm: LLM to chat with (default: one for the configured backend).
+            store: Where conversations are saved (default: the user's session store).
+        """
         super().__init__()
         
         self.setWindowTitle("Pixie")
@@ -125,19 +63,38 @@ class MainWindow(QMainWindow):
         if os.path.exists(icon_path):
             self.setWindowIcon(QIcon(icon_path))
         
-        # Initialize LLM (lazy loading)
-        self.llm = LLMWrapper()
-        self.worker = None
-        self.current_bubble = None
+        # Initialize LLM (lazy loading unless preload is enabled; its engine
+        # is imported in the background after the window appears)
+        self.llm = llm or LLMWrapper()
+        self.store = store or self._open_store()
+        self.session_id = None   # Saved session shown, None until its first message
+        self.oldest_message_id = None  # Oldest message loaded into the transcript
+        self.all_messages_loaded = True
+        self.current_job = None  # Service job id of the message being answered
+        self.warmup_job = None   # Service job id of the startup preload
+        self.compaction_job = None  # Service job id of a queued history compaction
+        self.unload_job = None   # Service job id of a queued idle unload
+        self.prefill_job = None  # Service job id of a queued speculative prefill
+        self.idle_policy = IdlePolicy()
+        self.last_turn_stats = None  # TurnStats of the last answered message
+        self.current_row = None  # Transcript row of the streaming answer
         self.current_question = ""
         self.is_generating = False
         self.model_ready = False
-        self.pending_response = ""  # Buffer for full response
-        self.typing_indicator = None
+        self._scroll_pending = False
+        # Set until the first frame is painted, then the engine is imported
+        self._preimport_pending = PREIMPORT_DEPENDENCIES
         
         self._setup_ui()
         self._setup_shortcuts()
         self._apply_style()
+        self._setup_service()
+        self._setup_idle_timer()
+        self._setup_typing_timers()
+        self._restore_last_session()
+        
+        if PRELOAD_MODEL:
+            self._start_preload()
     
     def _setup_ui(self):
         """Set up the user interface."""
@@ -193,6 +150,13 @@ class MainWindow(QMainWindow):
         header_layout.addLayout(title_layout)
         header_layout.addStretch()
         
+        # Saved conversations, most recent first
+        self.session_picker = QComboBox()
+        self.session_picker.setObjectName("sessionPicker")
+        self.session_picker.setMaximumWidth(180)
+        self.session_picker.activated.connect(self._on_session_selected)
+        header_layout.addWidget(self.session_picker)
+        
         # New chat button to clear history
         self.new_chat_button = QPushButton("New Chat")
         self.new_chat_button.setObjectName("newChatButton")
@@ -206,20 +170,13 @@ class MainWindow(QMainWindow):
         
         layout.addWidget(header)
         
-        # Chat area - scroll area with message bubbles
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.scroll_area.setObjectName("chatScrollArea")
-        
-        self.chat_container = QWidget()
-        self.chat_layout = QVBoxLayout(self.chat_container)
-        self.chat_layout.setContentsMargins(8, 16, 8, 16)
-        self.chat_layout.setSpacing(8)
-        self.chat_layout.addStretch()  # Push messages to top
-        
-        self.scroll_area.setWidget(self.chat_container)
-        layout.addWidget(self.scroll_area, 1)
+        # Chat area - virtualized list of message bubbles
+        self.transcript = TranscriptView()
+        self.transcript.setObjectName("chatView")
+        self.transcript.setViewportMargins(8, 16, 8, 16)
+        self.transcript_model = self.transcript.transcript_model
+        self.transcript.top_reached.connect(self._load_older_messages)
+        layout.addWidget(self.transcript, 1)
         
         # Input area
         input_frame = QFrame()
@@ -237,18 +194,144 @@ class MainWindow(QMainWindow):
         self.send_button = QPushButton("➤")
         self.send_button.setObjectName("sendButton")
         self.send_button.setFixedSize(44, 44)
-        self.send_button.clicked.connect(self._on_send)
+        self.send_button.clicked.connect(self._on_send_button)
         input_layout.addWidget(self.send_button)
         
         layout.addWidget(input_frame)
-        
-        # Welcome message
-        self._add_bot_message("Hi there! I'm Pixie, your friendly AI assistant.\n\nI'm here to help - ask me anything! Enable Web Search for the latest info.\n\nWhat can I help you with today?")
+    
+    def _setup_service(self):
+        """Start the inference service and connect its signals once."""
+        self.service = InferenceService(self.llm, self)
+        self.service.status_update.connect(self._on_job_status)
+        self.service.token_generated.connect(self._on_job_tokens)
+        self.service.job_complete.connect(self._on_job_complete)
+        self.service.error_occurred.connect(self._on_job_error)
+        self.service.turn_stats.connect(self._on_turn_stats)
+        self.service.start()
+    
+    def _setup_idle_timer(self):
+        """Check periodically whether the idle model should be unloaded."""
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setInterval(int(IDLE_CHECK_INTERVAL_SECONDS * 1000))
+        self.idle_timer.timeout.connect(self._check_idle)
+        self.idle_timer.start()
+    
+    def _setup_typing_timers(self):
+        """Search for and prefill the question in the background once typing pauses."""
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(SEARCH_PREFETCH_DEBOUNCE_MS)
+        self.prefetch_timer.timeout.connect(self._prefetch_search)
+        self.prefill_timer = QTimer(self)
+        self.prefill_timer.setSingleShot(True)
+        self.prefill_timer.setInterval(SPECULATIVE_PREFILL_DEBOUNCE_MS)
+        self.prefill_timer.timeout.connect(lambda: self._schedule_prefill(self.input_field.text()))
+        self.input_field.textChanged.connect(self._on_input_changed)
+        self.search_checkbox.toggled.connect(self._on_input_changed)
+    
+    @staticmethod
+    def _open_store() -> SessionStore:
+        """Open the user's session store, falling back to memory if it is unusable."""
+        try:
+            return SessionStore()
+        except Exception:
+            # An unwritable data directory must never break chatting
+            return SessionStore(path=None)
+    
+    def _restore_last_session(self):
+        """Reopen the most recent conversation, or greet the user in a new one."""
+        sessions = self.store.list_sessions(limit=1)
+        if sessions and sessions[0]["message_count"]:
+            self._open_session(sessions[0]["id"])
+        else:
+            self._show_new_session()
+    
+    def _show_new_session(self):
+        """Show an empty, not yet saved conversation."""
+        self.session_id = None
+        self.oldest_message_id = None
+        self.all_messages_loaded = True
+        # The cache stays for the snapshot of the conversation being left
+        self.llm.clear_history(keep_cache=True)
+        self.transcript_model.clear()
+        self._add_bot_message(WELCOME_MESSAGE)
+        self._refresh_session_picker()
+    
+    def _open_session(self, session_id: int):
+        """
+        Show a saved conversation and restore the model's context.
+        
+        Only the latest page of messages is put in the transcript; older
+        pages load as the user scrolls up.
+        """
+        page = self.store.load_page(session_id)
+        summary, context = self.store.load_context(session_id)
+        self.llm.restore_history(context, summary)
+        
+        self.session_id = session_id
+        self.oldest_message_id = page[0]["id"] if page else None
+        self.all_messages_loaded = len(page) < TRANSCRIPT_PAGE_SIZE
+        self.transcript_model.clear()
+        self.transcript.prepend_messages([(msg["content"], msg["role"] == "user") for msg in page])
+        if not page:
+            self._add_bot_message(WELCOME_MESSAGE)
+        self.transcript.scrollToBottom()
+        self._refresh_session_picker()
+    
+    def _load_older_messages(self):
+        """Load the previous page of the conversation above the transcript."""
+        if self.all_messages_loaded or self.session_id is None:
+            return
+        page = self.store.load_page(self.session_id, before_id=self.oldest_message_id)
+        self.all_messages_loaded = len(page) < TRANSCRIPT_PAGE_SIZE
+        if page:
+            self.oldest_message_id = page[0]["id"]
+            self.transcript.prepend_messages([(msg["content"], msg["role"] == "user") for msg in page])
+    
+    def _refresh_session_picker(self):
+        """List saved conversations in the header, selecting the current one."""
+        self.session_picker.blockSignals(True)
+        self.session_picker.clear()
+        if self.session_id is None:
+            self.session_picker.addItem("New chat", None)
+        for session in self.store.list_sessions():
+            self.session_picker.addItem(session["title"], session["id"])
+            self.session_picker.setItemData(
+                self.session_picker.count() - 1, session["title"], Qt.ItemDataRole.ToolTipRole
+            )
+        self.session_picker.setCurrentIndex(max(0, self.session_picker.findData(self.session_id)))
+        self.session_picker.blockSignals(False)
+    
+    def _on_session_selected(self, index: int):
+        """Switch to the conversation picked in the header."""
+        session_id = self.session_picker.itemData(index)
+        if self.is_generating or session_id == self.session_id:
+            return
+        self._cancel_compaction()
+        self._cancel_prefill()
+        self._save_snapshot()
+        if session_id is None:
+            self._show_new_session()
+        else:
+            self._open_session(session_id)
+        self._schedule_prefill()
+        self.status_label.setText("Online • Ready to chat")
+        self.status_label.setStyleSheet("color: #34C759;")
+        self.input_field.setFocus()
+    
+    def _save_token_counts(self):
+        """Store token counts that became known after messages were saved."""
+        for msg in self.llm.conversation_history[-2:]:
+            if msg["id"] is not None and msg["tokens"] is not None:
+                self.store.set_message_tokens(msg["id"], msg["tokens"])
     
     def _setup_shortcuts(self):
         """Set up keyboard shortcuts."""
         shortcut = QShortcut(QKeySequence("Ctrl+Return"), self)
         shortcut.activated.connect(self._on_send)
+        
+        stop_shortcut = QShortcut(QKeySequence("Escape"), self)
+        stop_shortcut.activated.connect(self._on_stop)
     
     def _apply_style(self):
         """Apply chatbot styling."""
@@ -297,6 +380,15 @@ class MainWindow(QMainWindow):
                 background-color: #C7C7CC;
             }
             
+            #sessionPicker {
+                font-size: 13px;
+                color: #3C3C43;
+                padding: 6px 12px;
+                background-color: #E5E5EA;
+                border: none;
+                border-radius: 14px;
+            }
+            
             #searchToggle {
                 font-size: 13px;
                 color: #3C3C43;
@@ -310,7 +402,7 @@ class MainWindow(QMainWindow):
                 color: white;
             }
             
-            #chatScrollArea {
+            #chatView {
                 background-color: #FFFFFF;
                 border: none;
             }
@@ -359,59 +451,61 @@ class MainWindow(QMainWindow):
         self.setFont(font)
     
     def _scroll_to_bottom(self):
-        """Scroll chat to the bottom."""
-        QTimer.singleShot(10, lambda: self.scroll_area.verticalScrollBar().setValue(
-            self.scroll_area.verticalScrollBar().maximum()
-        ))
+        """Scroll chat to the bottom, at most once per stream flush interval."""
+        if self._scroll_pending:
+            return
+        self._scroll_pending = True
+        QTimer.singleShot(STREAM_FLUSH_INTERVAL_MS, self._do_scroll_to_bottom)
+    
+    def _do_scroll_to_bottom(self):
+        self._scroll_pending = False
+        self.transcript.scrollToBottom()
     
     def _add_user_message(self, text: str):
         """Add a user message bubble."""
-        bubble = MessageBubble(text, is_user=True)
-        # Insert before the stretch
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, bubble)
+        self.transcript_model.append_message(text, is_user=True)
         self._scroll_to_bottom()
     
-    def _add_bot_message(self, text: str):
-        """Add a bot message bubble."""
-        bubble = MessageBubble(text, is_user=False)
-        # Insert before the stretch
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, bubble)
+    def _add_bot_message(self, text: str) -> int:
+        """Add a bot message bubble and return its transcript row."""
+        row = self.transcript_model.append_message(text, is_user=False)
         self._scroll_to_bottom()
+        return row
     
     def _show_typing_indicator(self):
         """Show typing indicator below user message."""
-        self.typing_indicator = QFrame()
-        typing_layout = QHBoxLayout(self.typing_indicator)
-        typing_layout.setContentsMargins(48, 4, 12, 4)  # Indent to align with bot messages
-        
-        # Avatar
-        avatar = QLabel("P")
-        avatar.setFixedSize(28, 28)
-        avatar.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        avatar.setStyleSheet("""
-            background-color: #8E44AD;
-            color: white;
-            font-size: 14px;
-            font-weight: bold;
-            border-radius: 14px;
-        """)
-        typing_layout.addWidget(avatar, alignment=Qt.AlignmentFlag.AlignTop)
-        
-        # Typing text
-        typing_label = QLabel("Typing...")
-        typing_label.setStyleSheet("color: #8E8E93; font-size: 13px; font-style: italic;")
-        typing_layout.addWidget(typing_label)
-        typing_layout.addStretch()
-        
-        # Insert before the stretch
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, self.typing_indicator)
+        self.transcript_model.set_typing(True)
         self._scroll_to_bottom()
     
     def _hide_typing_indicator(self):
         """Hide and remove typing indicator."""
-        if self.typing_indicator:
-            self.typing_indicator.deleteLater()
-            self.typing_indicator = None
+        self.transcript_model.set_typing(False)
+    
+    def _start_preload(self):
+        """Load and warm up the model in the background."""
+        self.status_label.setText("Loading model...")
+        self.status_label.setStyleSheet("color: #FF9500;")
+        
+        self.warmup_job = self.service.submit_warmup()
+    
+    def _on_preload_status(self, status: str):
+        """Show preload progress unless a message is being answered."""
+        if not self.is_generating:
+            self.status_label.setText(status)
+    
+    def _on_preload_complete(self):
+        """Handle the model becoming ready in the background."""
+        self.model_ready = True
+        self._schedule_prefill(self.input_field.text())
+        if not self.is_generating:
+            self.status_label.setText("Online • Ready to chat")
+            self.status_label.setStyleSheet("color: #34C759;")
+    
+    def _on_preload_error(self, error: str):
+        """Report a failed preload; the next message retries loading."""
+        if not self.is_generating:
+            self.status_label.setText("Model failed to load • Will retry on send")
+            self.status_label.setStyleSheet("color: #FF3B30;")
     
     def _on_send(self):
         """Handle send button click."""
@@ -421,16 +515,27 @@ class MainWindow(QMainWindow):
         
         # Store question for history
         self.current_question = question
+        self.prefetch_timer.stop()
+        self.prefill_timer.stop()
+        self._cancel_prefill()
+        self.last_turn_stats = None
         
-        # Add user message to history
-        self.llm.add_to_history("user", question)
+        # A pending idle unload would only make this turn reload the model
+        self._cancel_unload()
         
-        # Disable input and buttons during generation
+        # Save the question, then add it to history
+        if self.session_id is None:
+            self.session_id = self.store.create_session()
+        message_id = self.store.append_message(self.session_id, "user", question)
+        self.llm.add_to_history("user", question, message_id=message_id)
+        
+        # Disable input during generation; the send button becomes Stop
         self.is_generating = True
-        self.pending_response = ""
+        self.current_row = None
         self.input_field.setEnabled(False)
-        self.send_button.setEnabled(False)
+        self._set_stop_mode(True)
         self.new_chat_button.setEnabled(False)
+        self.session_picker.setEnabled(False)
         self.input_field.clear()
         
         # Show user message
@@ -447,16 +552,178 @@ class MainWindow(QMainWindow):
             self.status_label.setText("Typing...")
             self.status_label.setStyleSheet("color: #FF9500;")
         
-        # Start worker
-        self.worker = WorkerThread(self.llm)
-        self.worker.set_task(question, self.search_checkbox.isChecked())
+        # Queue the turn on the inference service
+        self.current_job = self.service.submit_chat(question, self.search_checkbox.isChecked())
+    
+    def _on_input_changed(self, *args):
+        """Restart the search and prefill debounces while the question is being edited."""
+        if self.is_generating:
+            return
+        if SPECULATIVE_PREFILL_INPUT:
+            self.prefill_timer.start()
+        text = self.input_field.text().strip()
+        if self.search_checkbox.isChecked() and len(text) >= SEARCH_PREFETCH_MIN_CHARS:
+            self.prefetch_timer.start()
+        else:
+            self.prefetch_timer.stop()
+            self.service.cancel_prefetch()
+    
+    def _prefetch_search(self):
+        """Search for the text typed so far."""
+        if self.search_checkbox.isChecked() and not self.is_generating:
+            self.service.prefetch_search(self.input_field.text().strip())
+    
+    def _on_send_button(self):
+        """Send the message, or stop the answer being generated."""
+        if self.is_generating:
+            self._on_stop()
+        else:
+            self._on_send()
+    
+    def _on_stop(self):
+        """Stop generating the current answer, keeping what was written so far."""
+        if not self.is_generating or self.current_job is None:
+            return
+        self.service.cancel(self.current_job)
+        self.send_button.setEnabled(False)
+        self.status_label.setText("Stopping...")
+        self.status_label.setStyleSheet("color: #FF9500;")
+    
+    def _set_stop_mode(self, stop: bool):
+        """Switch the send button between Send and Stop."""
+        self.send_button.setText("■" if stop else "➤")
+        self.send_button.setToolTip("Stop generating (Esc)" if stop else "Send")
+        self.send_button.setEnabled(True)
+    
+    def _save_snapshot(self):
+        """
+        Snapshot the model's cache for the conversation being left, in the background.
+        
+        The save runs ahead of any turn or prefill of the next conversation,
+        which would trim the cache it is saving.
+        """
+        self.service.submit_task(lambda llm, cancel_token: llm.save_snapshot(), PRIORITY_SAVE)
+    
+    def _cancel_compaction(self):
+        """Abandon background summarizing of the conversation being left."""
+        if self.compaction_job is not None:
+            self.service.cancel(self.compaction_job)
+            self.compaction_job = None
+    
+    def _check_idle(self):
+        """Unload the model in the background when the idle policy says so."""
+        if self.unload_job is not None or self.is_generating or not self.llm.is_loaded():
+            return
+        reason = self.idle_policy.check(self.service.idle_seconds())
+        if reason is None:
+            return
+        
+        def unload(llm, cancel_token):
+            if cancel_token.cancelled:
+                return None
+            return reason if llm.unload(reason) else None
         
-        self.worker.status_update.connect(self._on_status_update)
-        self.worker.token_generated.connect(self._on_token_buffered)
-        self.worker.generation_complete.connect(self._on_generation_complete)
-        self.worker.error_occurred.connect(self._on_error)
+        self.unload_job = self.service.submit_task(unload, PRIORITY_BACKGROUND)
+    
+    def _cancel_unload(self):
+        """Keep the model loaded after all (a message is about to use it)."""
+        if self.unload_job is not None:
+            self.service.cancel(self.unload_job)
+            self.unload_job = None
+    
+    def _on_model_unloaded(self, reason: str):
+        """Show that the model has been released and will reload on send."""
+        self.model_ready = False
+        if not self.is_generating:
+            self.status_label.setText(f"Model unloaded ({reason}) • Reloads on send")
+            self.status_label.setStyleSheet("color: #8E8E93;")
+    
+    def _schedule_prefill(self, partial_question: str = ""):
+        """
+        Prefill the conversation (and the question typed so far) in the background.
         
-        self.worker.start()
+        Only while the model is loaded: typing alone does not reload it.
+        """
+        if not SPECULATIVE_PREFILL_ENABLED or self.is_generating or not self.llm.is_loaded():
+            return
+        self._cancel_prefill()
+        self.prefill_job = self.service.submit_prefill(partial_question)
+    
+    def _cancel_prefill(self):
+        """Abandon a speculative prefill that the next request supersedes."""
+        if self.prefill_job is not None:
+            self.service.cancel(self.prefill_job)
+            self.prefill_job = None
+    
+    def _schedule_compaction(self):
+        """Summarize old history in the background once it has grown enough."""
+        if self.compaction_job is None and self.llm.needs_compaction():
+            self.compaction_job = self.service.submit_task(
+                lambda llm, cancel_token: llm.compact(cancel_token),
+                PRIORITY_BACKGROUND,
+            )
+    
+    def _on_job_status(self, job_id: int, status: str):
+        """Route a service status message to the job it belongs to."""
+        if job_id == self.current_job:
+            self._on_status_update(status)
+        elif job_id == self.warmup_job:
+            self._on_preload_status(status)
+    
+    def _on_job_tokens(self, job_id: int, text: str):
+        """Route streamed tokens to the message being answered."""
+        if job_id == self.current_job:
+            self._on_tokens(text)
+    
+    def _on_turn_stats(self, job_id: int, stats):
+        """Keep the last turn's performance summary for the status bar."""
+        self.last_turn_stats = stats
+    
+    def _on_job_complete(self, job_id: int, result):
+        """Route a finished service job."""
+        if job_id == self.current_job:
+            self.current_job = None
+            self._on_generation_complete(result)
+        elif job_id == self.warmup_job:
+            self.warmup_job = None
+            self._on_preload_complete()
+        elif job_id == self.compaction_job:
+            self.compaction_job = None
+            if result:
+                self._save_summary()
+        elif job_id == self.unload_job:
+            self.unload_job = None
+            if result:
+                self._on_model_unloaded(result)
+        elif job_id == self.prefill_job:
+            self.prefill_job = None
+    
+    def _save_summary(self):
+        """Save the running summary so a reopened session resumes from it."""
+        compactor = self.llm.compactor
+        history = self.llm.conversation_history
+        if self.session_id is None or not compactor.summarized_count:
+            return
+        last_summarized = history[compactor.summarized_count - 1]["id"]
+        if last_summarized is not None:
+            self.store.save_summary(self.session_id, list(compactor.segments), last_summarized)
+    
+    def _on_job_error(self, job_id: int, error: str):
+        """Route a failed service job."""
+        if job_id == self.current_job:
+            self.current_job = None
+            self._on_error(error)
+        elif job_id == self.warmup_job:
+            self.warmup_job = None
+            self._on_preload_error(error)
+        elif job_id == self.compaction_job:
+            # The history simply stays uncompacted; retried after the next turn
+            self.compaction_job = None
+        elif job_id == self.unload_job:
+            self.unload_job = None
+        elif job_id == self.prefill_job:
+            # Only a head start; the turn prefills whatever is missing
+            self.prefill_job = None
     
     def _on_status_update(self, status: str):
         """Handle status updates."""
@@ -465,57 +732,111 @@ class MainWindow(QMainWindow):
         if "Model loaded" in status or "Generating" in status:
             self.model_ready = True
     
-    def _on_token_buffered(self, token: str):
-        """Buffer tokens instead of streaming them."""
-        self.pending_response += token
+    def _on_tokens(self, text: str):
+        """Stream a batch of tokens into the bot bubble."""
+        with get_tracer().span("render", chars=len(text)):
+            if self.current_row is None:
+                # First tokens replace the typing indicator with a live bubble
+                self._hide_typing_indicator()
+                self.current_row = self._add_bot_message(text.lstrip())
+            else:
+                self.transcript_model.append_text(self.current_row, text)
+            self._scroll_to_bottom()
     
     def _on_generation_complete(self, response: str):
-        """Handle generation completion - show full response at once."""
-        # Hide typing indicator and show the complete response
+        """Handle generation completion."""
         self._hide_typing_indicator()
-        self._add_bot_message(response)
-        
-        # Add assistant response to history
-        self.llm.add_to_history("assistant", response)
+        if self.current_row is None and response:
+            self._add_bot_message(response)
+        self.current_row = None
+        
+        # Save the response and add it to history (empty if stopped before any output)
+        if response:
+            meta = asdict(self.last_turn_stats) if self.last_turn_stats is not None else None
+            message_id = self.store.append_message(self.session_id, "assistant", response, meta=meta)
+            self.llm.add_to_history("assistant", response, message_id=message_id)
+        self._save_token_counts()
+        self._refresh_session_picker()
+        self._schedule_compaction()
         
         self.is_generating = False
         self.model_ready = True
-        self.status_label.setText("Online • Ready to chat")
+        self._schedule_prefill()
+        stats = self.last_turn_stats
+        if stats is not None:
+            self.status_label.setText(f"Online • {stats.summary()}")
+            details = f"\nSearch: {stats.search_seconds:.2f}s" if stats.search_seconds is not None else ""
+            if stats.draft_acceptance is not None:
+                details += (
+                    f"\nDraft: {stats.draft_accepted}/{stats.draft_proposed} tokens accepted "
+                    f"({stats.draft_acceptance:.0%})"
+                )
+            if stats.load_seconds is not None:
+                details += f"\nModel loaded in {stats.load_seconds:.1f}s"
+            if self.llm.reload_count:
+                details += f"\nReloads after unloading: {self.llm.reload_count}"
+            self.status_label.setToolTip(
+                f"Time to first token: {stats.ttft:.2f}s\n"
+                f"Decode: {stats.generated_tokens} tokens at {stats.tokens_per_sec:.1f} tok/s\n"
+                f"Prefilled: {stats.prefill_tokens} tokens\n"
+                f"Context: {stats.context_tokens} tokens{details}"
+            )
+        else:
+            self.status_label.setText("Online • Ready to chat")
         self.status_label.setStyleSheet("color: #34C759;")
         self.input_field.setEnabled(True)
-        self.send_button.setEnabled(True)
+        self._set_stop_mode(False)
         self.new_chat_button.setEnabled(True)
+        self.session_picker.setEnabled(True)
         self.input_field.setFocus()
     
     def _on_error(self, error: str):
         """Handle errors."""
         self._hide_typing_indicator()
+        self.current_row = None
         self.is_generating = False
         self._add_bot_message(f"Oops! Something went wrong:\n\n{error}\n\nPlease try again.")
         self.status_label.setText("Error occurred")
         self.status_label.setStyleSheet("color: #FF3B30;")
         self.input_field.setEnabled(True)
-        self.send_button.setEnabled(True)
+        self._set_stop_mode(False)
         self.new_chat_button.setEnabled(True)
+        self.session_picker.setEnabled(True)
+        self._refresh_session_picker()
         self.input_field.setFocus()
     
     def _on_new_chat(self):
-        """Clear history and start a new chat session."""
+        """Start a new chat session; the old one stays saved."""
         if self.is_generating:
             return
         
-        # Clear LLM conversation history
-        self.llm.clear_history()
+        # Abandon background work on the old conversation and keep its cache
+        self._cancel_compaction()
+        self._cancel_prefill()
+        self._save_snapshot()
         
-        # Remove all message bubbles except welcome
-        while self.chat_layout.count() > 1:  # Keep the stretch
-            item = self.chat_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        
-        # Add welcome message again
-        self._add_bot_message("Hi there! I'm Pixie, your friendly AI assistant.\n\nI'm here to help - ask me anything! Enable Web Search for the latest info.\n\nWhat can I help you with today?")
+        # Clear history and the transcript, and greet the user again
+        self._show_new_session()
+        self._schedule_prefill()
         
         self.status_label.setText("Online • Ready to chat")
         self.status_label.setStyleSheet("color: #34C759;")
         self.input_field.setFocus()
+    
+    def paintEvent(self, event):
+        """Start the background imports once the first frame is on screen."""
+        super().paintEvent(event)
+        if self._preimport_pending:
+            self._preimport_pending = False
+            # Deferred so the rest of the frame paints before the imports compete for the GIL
+            QTimer.singleShot(0, self.service.submit_preimport)
+    
+    def closeEvent(self, event):
+        """Stop the inference service, snapshot the cache and close the session store."""
+        self.idle_timer.stop()
+        self.prefetch_timer.stop()
+        self.prefill_timer.stop()
+        self.service.stop()
+        self.llm.save_snapshot()
+        self.store.close()
+        super().closeEvent(event)
@@ -0,0 +1,433 @@
+"""
+Transcript Module
+
+Model/view chat transcript. Messages live in a list model and are painted
+as bubbles by a delegate, so no widgets are created per message and long
+sessions keep a flat memory and layout cost.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PyQt6.QtWidgets import (
+    QListView, QStyledItemDelegate, QStyle, QStyleOptionViewItem,
+    QAbstractItemView, QApplication, QMenu
+)
+from PyQt6.QtCore import (
+    Qt, QAbstractListModel, QModelIndex, QRect, QRectF, QSize, pyqtSignal
+)
+from PyQt6.QtGui import (
+    QColor, QFont, QFontMetrics, QPainter, QPainterPath, QKeySequence
+)
+
+
+# Roles exposed by TranscriptModel
+IsUserRole = Qt.ItemDataRole.UserRole + 1
+KindRole = Qt.ItemDataRole.UserRole + 2
+
+# Row kinds
+MESSAGE = "message"
+TYPING = "typing"
+
+# Distance from the top (in pixels) at which older messages are requested
+LOAD_MORE_THRESHOLD = 200
+
+# Bubble geometry (matches the original widget-based bubbles)
+ROW_MARGIN_X = 12
+ROW_MARGIN_Y = 4
+AVATAR_SIZE = 28
+AVATAR_SPACING = 8
+BUBBLE_PADDING_X = 14
+BUBBLE_PADDING_Y = 10
+BUBBLE_MAX_WIDTH = 400
+BUBBLE_RADIUS = 18
+BUBBLE_TAIL_RADIUS = 4
+
+USER_BUBBLE_COLOR = QColor("#007AFF")
+BOT_BUBBLE_COLOR = QColor("#F0F0F5")
+AVATAR_COLOR = QColor("#8E44AD")
+USER_TEXT_COLOR = QColor("white")
+BOT_TEXT_COLOR = QColor("#1C1C1E")
+TYPING_TEXT_COLOR = QColor("#8E8E93")
+
+
+class TranscriptModel(QAbstractListModel):
+    """
+    List model holding the chat messages.
+
+    A message is kept as its finished lines plus the chunks of its last
+    line, so appending streamed tokens only touches the last line. The full
+    text is joined at most once per change, when it is first read.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[Dict] = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.text(index.row())
+        if role == IsUserRole:
+            return row["is_user"]
+        if role == KindRole:
+            return row["kind"]
+        return None
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid() or self._rows[index.row()]["kind"] == TYPING:
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def text(self, row: int) -> str:
+        """Return the full text of a row."""
+        item = self._rows[row]
+        cached = item["text"]
+        if cached is None or cached[0] != item["version"]:
+            cached = (item["version"], "\n".join(item["lines"] + [self.last_line(row)]))
+            item["text"] = cached
+        return cached[1]
+
+    def last_line(self, row: int) -> str:
+        """Return the text after a row's last newline (the part still streaming)."""
+        item = self._rows[row]
+        if len(item["parts"]) > 1:
+            item["parts"] = ["".join(item["parts"])]
+        return item["parts"][0] if item["parts"] else ""
+
+    def row_data(self, row: int) -> Dict:
+        """Return the internal record of a row (used by the delegate's size cache)."""
+        return self._rows[row]
+
+    def append_message(self, text: str, is_user: bool = False) -> int:
+        """
+        Append a message, keeping any typing row last.
+
+        Returns:
+            The row of the new message.
+        """
+        row = len(self._rows)
+        if self._rows and self._rows[-1]["kind"] == TYPING:
+            row -= 1
+        self._insert(row, self._item(MESSAGE, is_user, text))
+        return row
+
+    def prepend_messages(self, messages: Iterable[Tuple[str, bool]]) -> int:
+        """
+        Insert older messages above the existing rows in one batch.
+
+        Args:
+            messages: ``(text, is_user)`` pairs, oldest first.
+
+        Returns:
+            The number of rows inserted.
+        """
+        items = [self._item(MESSAGE, is_user, text) for text, is_user in messages]
+        if items:
+            self.beginInsertRows(QModelIndex(), 0, len(items) - 1)
+            self._rows[0:0] = items
+            self.endInsertRows()
+        return len(items)
+
+    def append_text(self, row: int, text: str) -> None:
+        """Append streamed text to a message."""
+        item = self._rows[row]
+        if "\n" in text:
+            finished, _, last = text.rpartition("\n")
+            item["lines"].extend((self.last_line(row) + finished).split("\n"))
+            item["parts"] = [last]
+        else:
+            item["parts"].append(text)
+        item["version"] += 1
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def set_typing(self, visible: bool) -> None:
+        """Show or hide the typing indicator row at the end."""
+        has_typing = bool(self._rows) and self._rows[-1]["kind"] == TYPING
+        if visible and not has_typing:
+            self._insert(len(self._rows), self._item(TYPING, False, "Typing..."))
+        elif not visible and has_typing:
+            row = len(self._rows) - 1
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self._rows.pop()
+            self.endRemoveRows()
+
+    def clear(self) -> None:
+        """Remove all rows."""
+        self.beginResetModel()
+        self._rows = []
+        self.endResetModel()
+
+    @staticmethod
+    def _item(kind: str, is_user: bool, text: str) -> Dict:
+        *lines, last = text.split("\n")
+        return {
+            "kind": kind,
+            "is_user": is_user,
+            "lines": lines,  # Finished lines
+            "parts": [last],  # Chunks of the last line
+            "version": 0,
+            "text": None,  # (version, full text)
+            "size": None,  # (width, version, row QSize, text QSize) cached by the delegate
+            "line_size": None,  # (width, lines measured, max width, total height) of the finished lines
+        }
+
+    def _insert(self, row: int, item: Dict) -> None:
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.insert(row, item)
+        self.endInsertRows()
+
+
+class BubbleDelegate(QStyledItemDelegate):
+    """
+    Paints transcript rows as chat bubbles.
+
+    Row heights are measured once per (width, text version) and cached on
+    the row, so scrolling and relayout reuse earlier measurements. A
+    message's finished lines are measured once per width and only its last
+    line is measured again as tokens stream in.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font = QFont()
+        self.font.setPixelSize(14)
+        self.typing_font = QFont()
+        self.typing_font.setPixelSize(13)
+        self.typing_font.setItalic(True)
+        self.avatar_font = QFont()
+        self.avatar_font.setPixelSize(14)
+        self.avatar_font.setBold(True)
+
+    def _text_width_limit(self, width: int, is_user: bool) -> int:
+        available = width - 2 * ROW_MARGIN_X
+        if not is_user:
+            available -= AVATAR_SIZE + AVATAR_SPACING
+        return max(1, min(BUBBLE_MAX_WIDTH, available) - 2 * BUBBLE_PADDING_X)
+
+    def _text_rect(self, text: str, width: int, is_user: bool, font: QFont) -> QRect:
+        metrics = QFontMetrics(font)
+        limit = self._text_width_limit(width, is_user)
+        return metrics.boundingRect(
+            QRect(0, 0, limit, 1_000_000),
+            Qt.TextFlag.TextWordWrap,
+            text or " ",
+        )
+
+    def _measure(self, model: "TranscriptModel", row: int, width: int) -> QSize:
+        """Size of a message's wrapped text, summed line by line."""
+        item = model.row_data(row)
+        line_size = item["line_size"]
+        if line_size is None or line_size[0] != width:
+            line_size = (width, 0, 0, 0)
+        _, measured, text_width, height = line_size
+        for line in item["lines"][measured:]:
+            rect = self._text_rect(line, width, item["is_user"], self.font)
+            text_width = max(text_width, rect.width())
+            height += rect.height()
+        item["line_size"] = (width, len(item["lines"]), text_width, height)
+
+        rect = self._text_rect(model.last_line(row), width, item["is_user"], self.font)
+        return QSize(max(text_width, rect.width()), height + rect.height())
+
+    def _text_size(self, model: "TranscriptModel", row: int, width: int) -> QSize:
+        """Size of a message's wrapped text, reusing the measurement from sizeHint()."""
+        item = model.row_data(row)
+        cached = item["size"]
+        if cached and cached[0] == width and cached[1] == item["version"]:
+            return cached[3]
+        return self._measure(model, row, width)
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        model = index.model()
+        item = model.row_data(index.row())
+        width = option.rect.width()
+        if width <= 0 and option.widget is not None:
+            width = option.widget.viewport().width()
+
+        cached = item["size"]
+        if cached and cached[0] == width and cached[1] == item["version"]:
+            return cached[2]
+
+        text_size = QSize()
+        if item["kind"] == TYPING:
+            height = AVATAR_SIZE
+        else:
+            text_size = self._measure(model, index.row(), width)
+            height = text_size.height() + 2 * BUBBLE_PADDING_Y
+            if not item["is_user"]:
+                height = max(height, AVATAR_SIZE)
+        size = QSize(width, height + 2 * ROW_MARGIN_Y)
+        item["size"] = (width, item["version"], size, text_size)
+        return size
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        model = index.model()
+        item = model.row_data(index.row())
+        rect = option.rect.adjusted(ROW_MARGIN_X, ROW_MARGIN_Y, -ROW_MARGIN_X, -ROW_MARGIN_Y)
+        is_user = item["is_user"]
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        if not is_user:
+            self._paint_avatar(painter, rect.left(), rect.top())
+            rect.setLeft(rect.left() + AVATAR_SIZE + AVATAR_SPACING)
+
+        if item["kind"] == TYPING:
+            painter.setFont(self.typing_font)
+            painter.setPen(TYPING_TEXT_COLOR)
+            painter.drawText(
+                rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, "Typing..."
+            )
+            painter.restore()
+            return
+
+        text_size = self._text_size(model, index.row(), option.rect.width())
+        bubble_width = text_size.width() + 2 * BUBBLE_PADDING_X
+        bubble_height = text_size.height() + 2 * BUBBLE_PADDING_Y
+        if is_user:
+            bubble = QRectF(rect.right() - bubble_width, rect.top(), bubble_width, bubble_height)
+        else:
+            bubble = QRectF(rect.left(), rect.top(), bubble_width, bubble_height)
+
+        color = USER_BUBBLE_COLOR if is_user else BOT_BUBBLE_COLOR
+        if option.state & QStyle.StateFlag.State_Selected:
+            color = color.darker(115)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(color)
+        painter.drawPath(self._bubble_path(bubble, is_user))
+
+        painter.setFont(self.font)
+        painter.setPen(USER_TEXT_COLOR if is_user else BOT_TEXT_COLOR)
+        painter.drawText(
+            bubble.adjusted(BUBBLE_PADDING_X, BUBBLE_PADDING_Y, -BUBBLE_PADDING_X, -BUBBLE_PADDING_Y),
+            Qt.TextFlag.TextWordWrap,
+            model.text(index.row()),
+        )
+        painter.restore()
+
+    def _paint_avatar(self, painter: QPainter, x: int, y: int):
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(AVATAR_COLOR)
+        painter.drawEllipse(x, y, AVATAR_SIZE, AVATAR_SIZE)
+        painter.setPen(USER_TEXT_COLOR)
+        painter.setFont(self.avatar_font)
+        painter.drawText(QRect(x, y, AVATAR_SIZE, AVATAR_SIZE), Qt.AlignmentFlag.AlignCenter, "P")
+
+    @staticmethod
+    def _bubble_path(bubble: QRectF, is_user: bool) -> QPainterPath:
+        """Rounded bubble with a tighter corner on the speaker's side."""
+        path = QPainterPath()
+        path.addRoundedRect(bubble, BUBBLE_RADIUS, BUBBLE_RADIUS)
+        corner_size = min(BUBBLE_RADIUS, bubble.height() / 2)
+        left = bubble.right() - corner_size if is_user else bubble.left()
+        corner = QPainterPath()
+        corner.addRoundedRect(
+            QRectF(left, bubble.bottom() - corner_size, corner_size, corner_size),
+            BUBBLE_TAIL_RADIUS,
+            BUBBLE_TAIL_RADIUS,
+        )
+        return path.united(corner)
+
+
+class TranscriptView(QListView):
+    """
+    Virtualized list view for the chat transcript.
+
+    Only visible rows are painted, rows are laid out in batches, and the
+    delegate caches row heights. Selected messages can be copied.
+    Scrolling near the top emits ``top_reached`` so older messages can be
+    loaded on demand.
+    """
+
+    top_reached = pyqtSignal()
+
+    def __init__(self, model: Optional[TranscriptModel] = None, parent=None):
+        super().__init__(parent)
+        self.transcript_model = model or TranscriptModel(self)
+        self.bubble_delegate = BubbleDelegate(self)
+        self.setModel(self.transcript_model)
+        self.setItemDelegate(self.bubble_delegate)
+
+        self.setUniformItemSizes(False)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(200)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSpacing(0)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._show_context_menu)
+
+        self.transcript_model.dataChanged.connect(self._on_data_changed)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        self._prepending = False
+
+    def _on_scrolled(self, value: int):
+        if value <= LOAD_MORE_THRESHOLD and not self._prepending:
+            self.top_reached.emit()
+
+    def prepend_messages(self, messages: List[Tuple[str, bool]]) -> None:
+        """
+        Insert older messages at the top without moving what is on screen.
+
+        Args:
+            messages: ``(text, is_user)`` pairs, oldest first.
+        """
+        scroll_bar = self.verticalScrollBar()
+        self._prepending = True
+        try:
+            offset = scroll_bar.value()
+            added = self.transcript_model.prepend_messages(messages)
+            if not added:
+                return
+            # Measure the new rows (the delegate caches these heights for layout)
+            option = QStyleOptionViewItem()
+            option.rect = QRect(0, 0, self.viewport().width(), 0)
+            option.widget = self
+            height = sum(
+                self.bubble_delegate.sizeHint(option, self.transcript_model.index(row)).height()
+                for row in range(added)
+            )
+            # Lay out now (new rows come first in the first batch) and keep
+            # the previously visible rows in place
+            self.doItemsLayout()
+            scroll_bar.setValue(offset + height)
+        finally:
+            self._prepending = False
+
+    def _on_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles=None):
+        """Re-measure rows whose text grew while streaming."""
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            self.bubble_delegate.sizeHintChanged.emit(self.transcript_model.index(row))
+
+    def copy_selection(self):
+        """Copy the selected messages to the clipboard."""
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        if rows:
+            text = "\n\n".join(self.transcript_model.text(row) for row in rows)
+            QApplication.clipboard().setText(text)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Copy):
+            self.copy_selection()
+            return
+        super().keyPressEvent(event)
+
+    def _show_context_menu(self, pos):
+        if not self.selectedIndexes():
+            index = self.indexAt(pos)
+            if not index.isValid():
+                return
+            self.setCurrentIndex(index)
+        menu = QMenu(self)
+        menu.addAction("Copy", self.copy_selection)
+        menu.exec(self.viewport().mapToGlobal(pos))
@@ -4,66 +4,406 @@ Worker Thread Module
 Handles background processing for LLM generation and web search.
 """
 
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+
 from PyQt6.QtCore import QThread, pyqtSignal as Signal
 
-from src.llm import LLMWrapper
-from src.search import search_and_format
+from src.config import STREAM_FLUSH_INTERVAL_MS, SEARCH_PREFETCH_ENABLED
+from src.llm import CancelToken, LLMWrapper
+from src.search import preload as preload_search, search_and_format
+from src.search.prefetch import SearchPrefetcher
+from src.tracing import TurnStats, get_tracer
+
+
+# Network I/O runs here so it can overlap with model loading and prefill
+_search_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pixie-search")
+
+# Job priorities (lower runs first)
+PRIORITY_WARMUP = 0
+PRIORITY_SAVE = 5  # Snapshot of a conversation being left, before anything reuses its cache
+PRIORITY_USER = 10
+PRIORITY_BACKGROUND = 20
+
+# Job kinds
+JOB_CHAT = "chat"
+JOB_WARMUP = "warmup"
+JOB_TASK = "task"
+_JOB_STOP = "stop"
+
 
+def _import_backend(llm: LLMWrapper, cancel_token: CancelToken) -> None:
+    """Create the LLM's backend, importing its inference engine."""
+    llm.backend
 
-class WorkerThread(QThread):
+
+def _timed_search(question: str) -> Tuple[Optional[str], float]:
+    """Search and format results, returning them with the seconds taken."""
+    start = time.perf_counter()
+    context = search_and_format(question)
+    return context, time.perf_counter() - start
+
+
+class TokenBatcher:
     """
-    Background worker thread for LLM inference.
+    Coalesces streamed tokens into at most one emit per flush interval.
     
-    Prevents UI freezing during model loading and text generation.
+    Crossing threads with a Qt signal per token floods the GUI event loop;
+    batching to the frame rate keeps the UI work per response bounded. The
+    first token is emitted immediately so time-to-first-token is unchanged.
+    """
+    
+    def __init__(self, emit: Callable[[str], None], interval_ms: int = STREAM_FLUSH_INTERVAL_MS):
+        self._emit = emit
+        self._interval = interval_ms / 1000
+        self._parts: List[str] = []
+        self._last_flush = 0.0
+    
+    def add(self, token: str) -> None:
+        """Buffer a token, flushing if the interval has elapsed."""
+        self._parts.append(token)
+        now = time.monotonic()
+        if now - self._last_flush >= self._interval:
+            self.flush(now)
+    
+    def flush(self, now: Optional[float] = None) -> None:
+        """Emit all buffered tokens as one chunk."""
+        if self._parts:
+            self._emit("".join(self._parts))
+            self._parts = []
+        self._last_flush = time.monotonic() if now is None else now
+
+
+@dataclass(order=True)
+class InferenceJob:
+    """A unit of work for the inference service, ordered by priority then age."""
+    
+    priority: int
+    job_id: int
+    kind: str = field(compare=False)
+    payload: dict = field(compare=False, default_factory=dict)
+    cancel_token: CancelToken = field(compare=False, default_factory=CancelToken)
+
+
+class InferenceService(QThread):
+    """
+    Long-lived background thread that owns all use of the model.
+    
+    Jobs are taken from a priority queue one at a time, so warm-up, user
+    turns and background tasks never touch the engine concurrently. Results
+    are reported through one set of signals tagged with the job id returned
+    by submit(), so the UI connects once instead of per message. Any job
+    can be cancelled; a running chat stops within one decode step and
+    reports the text generated so far. Web searches can be prefetched while
+    the question is typed; a chat uses the prefetched search for its question
+    if there is one.
     """
     
     # Signals to communicate with main thread
-    token_generated = Signal(str)      # Emitted for each token (streaming)
-    generation_complete = Signal(str)  # Emitted when generation finishes
-    status_update = Signal(str)        # Emitted for status messages
-    error_occurred = Signal(str)       # Emitted on error
+    job_started = Signal(int, str)      # Job id, kind
+    status_update = Signal(int, str)    # Job id, status message
+    token_generated = Signal(int, str)  # Job id, batched tokens (streaming)
+    job_complete = Signal(int, object)  # Job id, result (response text for chat)
+    error_occurred = Signal(int, str)   # Job id, error message
+    queue_changed = Signal(int, bool)   # Queue depth, busy
+    turn_stats = Signal(int, object)    # Job id, TurnStats for a finished chat
     
     def __init__(self, llm: LLMWrapper, parent=None):
         super().__init__(parent)
         self.llm = llm
-        self.question = ""
-        self.use_search = False
+        self._queue: "queue.PriorityQueue[InferenceJob]" = queue.PriorityQueue()
+        self._ids = itertools.count(1)
+        self._busy = False
+        self._current: Optional[InferenceJob] = None
+        self._cancelled_ids = set()
+        self._last_active = time.monotonic()
+        self.prefetcher = SearchPrefetcher(_timed_search) if SEARCH_PREFETCH_ENABLED else None
+        self._handlers = {
+            JOB_CHAT: self._run_chat,
+            JOB_WARMUP: self._run_warmup,
+            JOB_TASK: self._run_task,
+        }
+    
+    def submit(self, kind: str, priority: int = PRIORITY_BACKGROUND, **payload) -> int:
+        """
+        Queue a job.
+        
+        Args:
+            kind: One of JOB_CHAT, JOB_WARMUP or JOB_TASK.
+            priority: Lower values run first; equal priorities run in order.
+            **payload: Arguments for the job handler.
+        
+        Returns:
+            The job id used in signals.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = InferenceJob(priority, next(self._ids), kind, payload)
+        self._queue.put(job)
+        # Background work yields the engine to anything more urgent
+        current = self._current
+        if current is not None and current.kind == JOB_TASK and priority < current.priority:
+            current.cancel_token.cancel()
+        self._notify()
+        return job.job_id
     
-    def set_task(self, question: str, use_search: bool = False):
-        """Set the task parameters before starting the thread."""
-        self.question = question
-        self.use_search = use_search
+    def submit_chat(self, question: str, use_search: bool = False, priority: int = PRIORITY_USER) -> int:
+        """Queue a user turn (the question must already be in the history)."""
+        return self.submit(JOB_CHAT, priority, question=question, use_search=use_search)
+    
+    def submit_warmup(self, priority: int = PRIORITY_WARMUP) -> int:
+        """Queue loading and warming up the model."""
+        return self.submit(JOB_WARMUP, priority)
+    
+    def submit_task(
+        self,
+        fn: Callable[[LLMWrapper, CancelToken], Any],
+        priority: int = PRIORITY_BACKGROUND,
+    ) -> int:
+        """
+        Queue a background task.
+        
+        ``fn`` is called with the LLM and the job's cancel token, and its
+        return value is the result. A running task is cancelled as soon as
+        a more urgent job is submitted, so it should check the token.
+        """
+        return self.submit(JOB_TASK, priority, fn=fn)
+    
+    def submit_prefill(self, partial_question: str = "", priority: int = PRIORITY_BACKGROUND) -> int:
+        """
+        Prefill the conversation, and the question typed so far, while the engine is idle.
+        
+        Runs as a background task, so sending a message cancels it after the
+        current chunk and the turn only prefills what is still missing.
+        """
+        return self.submit_task(
+            lambda llm, cancel_token: llm.prefill_speculative(partial_question, cancel_token=cancel_token),
+            priority,
+        )
+    
+    def submit_preimport(self, priority: int = PRIORITY_BACKGROUND) -> int:
+        """
+        Import the inference engine and the search client in the background.
+        
+        The engine is imported by a background task, so it never races a
+        model load, and the search client on the search pool; both are then
+        ready before the first message without delaying the window.
+        """
+        _search_pool.submit(preload_search)
+        return self.submit_task(_import_backend, priority)
+    
+    def prefetch_search(self, query: str) -> None:
+        """Start the web search for a question that is still being typed."""
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(query)
+    
+    def cancel_prefetch(self) -> None:
+        """Drop prefetched searches that have not started."""
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+    
+    def cancel(self, job_id: Optional[int] = None) -> None:
+        """
+        Cancel a job.
+        
+        A queued job is skipped when it comes up; a running chat stops
+        generating and completes with its partial response.
+        
+        Args:
+            job_id: Job to cancel (default: the running job).
+        """
+        current = self._current
+        if current is not None and job_id in (None, current.job_id):
+            current.cancel_token.cancel()
+        elif job_id is not None:
+            self._cancelled_ids.add(job_id)
+    
+    def queue_depth(self) -> int:
+        """Number of jobs waiting to run (excluding the one in progress)."""
+        return self._queue.qsize()
+    
+    def is_busy(self) -> bool:
+        """Whether a job is currently running."""
+        return self._busy
+    
+    def idle_seconds(self) -> float:
+        """Seconds since the last job finished (0 while a job is running or queued)."""
+        if self._busy or self._queue.qsize():
+            return 0.0
+        return time.monotonic() - self._last_active
+    
+    def stop(self) -> None:
+        """Finish the current job, drop pending ones and wait for the thread to exit."""
+        if not self.isRunning():
+            return
+        self.cancel()
+        self.cancel_prefetch()
+        self._queue.put(InferenceJob(-1, 0, _JOB_STOP))
+        self.wait()
     
     def run(self):
-        """Execute the task in the background thread."""
-        try:
-            context = None
+        """Process jobs until stop() is called."""
+        # Named so the thread is recognisable in traces
+        threading.current_thread().name = "pixie-inference"
+        while True:
+            job = self._queue.get()
+            if job.kind == _JOB_STOP:
+                break
+            if job.job_id in self._cancelled_ids:
+                self._cancelled_ids.discard(job.job_id)
+                job.cancel_token.cancel()
             
-            # Perform web search if enabled
-            if self.use_search:
-                self.status_update.emit("Searching the web...")
-                context = search_and_format(self.question)
-                if context:
-                    self.status_update.emit("Typing...")
-                else:
-                    self.status_update.emit("Typing...")
-            else:
-                self.status_update.emit("Typing...")
-            
-            # Load model if not already loaded
-            if not self.llm.is_loaded():
-                self.status_update.emit("Loading model (first run may take a minute)...")
-                self.llm.load()
-                self.status_update.emit("Typing...")
-            
-            # Generate response with streaming
-            full_response = self.llm.generate_stream(
-                question=self.question,
-                context=context,
-                callback=lambda token: self.token_generated.emit(token)
-            )
-            
-            self.generation_complete.emit(full_response)
-            
-        except Exception as e:
-            self.error_occurred.emit(str(e))
+            self._busy = True
+            self._current = job
+            self._notify()
+            self.job_started.emit(job.job_id, job.kind)
+            try:
+                result = self._handlers[job.kind](job)
+                self.job_complete.emit(job.job_id, result)
+            except Exception as e:
+                self.error_occurred.emit(job.job_id, str(e))
+            finally:
+                self._busy = False
+                self._current = None
+                self._last_active = time.monotonic()
+                self._notify()
+        
+        # Discard anything still queued so a restarted service begins clean
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._cancelled_ids.clear()
+        self._notify()
+    
+    def _notify(self) -> None:
+        self.queue_changed.emit(self.queue_depth(), self._busy)
+    
+    def _run_chat(self, job: InferenceJob) -> str:
+        """
+        Answer a user turn.
+        
+        Web search runs on an I/O thread while the model is loaded and the
+        system prompt, history and question are prefilled, so a search turn
+        waits for roughly max(search, prefill) instead of their sum.
+        """
+        question = job.payload["question"]
+        cancel_token = job.cancel_token
+        turn_start = time.perf_counter()
+        search_future = None
+        if cancel_token.cancelled:
+            return ""
+        
+        # Start web search if enabled, unless it was prefetched while the question was typed
+        if job.payload.get("use_search"):
+            self.status_update.emit(job.job_id, "Searching the web...")
+            if self.prefetcher is not None:
+                search_future = self.prefetcher.take(question)
+                get_tracer().instant(
+                    "search_prefetch", prefetched=search_future is not None, **self.prefetcher.stats()
+                )
+            if search_future is None:
+                search_future = _search_pool.submit(_timed_search, question)
+        
+        # A repeated question answered from the response cache needs neither the model nor a prefill
+        cached = search_future is None and self.llm.has_cached_response(question)
+        
+        # Load model if not already loaded (or reload it after an idle unload)
+        load_seconds = None
+        if not cached and not self.llm.is_loaded():
+            self.status_update.emit(job.job_id, self._loading_status())
+            self.llm.load()
+            load_seconds = self.llm.last_load_seconds
+            if search_future and not search_future.done():
+                self.status_update.emit(job.job_id, "Searching the web...")
+        
+        # Prefill everything before the search context while results arrive
+        prefilled = 0
+        if not cached and not cancel_token.cancelled:
+            prefilled = self.llm.prefill(question)
+        
+        context, search_seconds = None, None
+        if search_future:
+            context, search_seconds = self._wait_for_search(search_future, cancel_token)
+        if cancel_token.cancelled:
+            return ""
+        self.status_update.emit(job.job_id, "Typing...")
+        
+        # Generate response with streaming, batched to the frame rate
+        batcher = TokenBatcher(lambda text: self.token_generated.emit(job.job_id, text))
+        first_token = []
+        
+        def on_token(text: str) -> None:
+            if not first_token:
+                first_token.append(time.perf_counter())
+            batcher.add(text)
+        
+        full_response = self.llm.generate_stream(
+            question=question,
+            context=context,
+            callback=on_token,
+            cancel_token=cancel_token,
+        )
+        batcher.flush()
+        
+        end = time.perf_counter()
+        first = first_token[0] if first_token else end
+        stats = TurnStats(
+            ttft=first - turn_start,
+            decode_seconds=end - first,
+            generated_tokens=self.llm.last_generated_tokens,
+            prefill_tokens=prefilled + self.llm.last_prefill_tokens,
+            context_tokens=len(self.llm.prompt_cache.tokens),
+            search_seconds=search_seconds,
+            draft_proposed=self.llm.last_draft_proposed,
+            draft_accepted=self.llm.last_draft_accepted,
+            load_seconds=load_seconds,
+            cached=self.llm.last_response_cached,
+        )
+        get_tracer().complete(
+            "turn", turn_start, end,
+            job=job.job_id,
+            search=search_future is not None,
+            finish_reason=self.llm.last_finish_reason,
+            **vars(stats),
+        )
+        self.turn_stats.emit(job.job_id, stats)
+        return full_response
+    
+    @staticmethod
+    def _wait_for_search(future: Future, cancel_token: CancelToken) -> Tuple[Optional[str], Optional[float]]:
+        """Wait for search results and their latency, giving up early if the job is cancelled."""
+        while not cancel_token.cancelled:
+            done, _ = wait([future], timeout=0.05)
+            if done:
+                return future.result()
+        future.cancel()
+        return None, None
+    
+    def _loading_status(self) -> str:
+        """Status shown while the model loads."""
+        if self.llm.unload_count:
+            return "Reloading model..."
+        return "Loading model (first run may take a minute)..."
+    
+    def _run_warmup(self, job: InferenceJob) -> None:
+        """Load weights, run a warm-up generation and prefill the system prompt."""
+        if not self.llm.is_loaded():
+            self.status_update.emit(job.job_id, "Loading model...")
+            self.llm.load()
+        
+        # A conversation already in the cache is better than a warm system prompt
+        if job.cancel_token.cancelled or self.llm.prompt_cache.tokens:
+            return
+        
+        self.status_update.emit(job.job_id, "Warming up...")
+        self.llm.warmup()
+    
+    def _run_task(self, job: InferenceJob) -> Any:
+        """Run a background task against the LLM."""
+        if job.cancel_token.cancelled:
+            return None
+        return job.payload["fn"](self.llm, job.cancel_token)
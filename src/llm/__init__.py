@@ -1,4 +1,5 @@
 """LLM Module"""
+from src.llm.stopping import CancelToken
 from src.llm.wrapper import LLMWrapper
 
-__all__ = ["LLMWrapper"]
+__all__ = ["CancelToken", "LLMWrapper"]
@@ -0,0 +1,35 @@
+"""
+Inference Backends
+
+Engines are imported lazily so that only the selected backend's
+dependencies need to be installed.
+"""
+
+from src.config import INFERENCE_BACKEND
+from src.llm.backends.base import GenerationChunk, InferenceBackend
+
+
+def get_backend(name: str = INFERENCE_BACKEND, **kwargs) -> InferenceBackend:
+    """
+    Create an inference backend by name.
+    
+    Args:
+        name: "mlx" (Apple Silicon), "cpu" (llama.cpp GGUF) or "stub".
+        **kwargs: Backend-specific options.
+    
+    Returns:
+        An unloaded backend instance.
+    """
+    if name == "mlx":
+        from src.llm.backends.mlx_backend import MLXBackend
+        return MLXBackend(**kwargs)
+    if name == "cpu":
+        from src.llm.backends.llama_cpp_backend import LlamaCppBackend
+        return LlamaCppBackend(**kwargs)
+    if name == "stub":
+        from src.llm.backends.stub import StubBackend
+        return StubBackend(**kwargs)
+    raise ValueError(f"Unknown inference backend: {name}")
+
+
+__all__ = ["GenerationChunk", "InferenceBackend", "get_backend"]
@@ -0,0 +1,155 @@
+"""
+Inference Backend Interface
+
+Defines the protocol every inference engine implements so LLMWrapper can
+drive MLX, a CPU engine or a deterministic stub interchangeably.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Protocol, Tuple, runtime_checkable
+
+
+@dataclass
+class GenerationChunk:
+    """
+    One step of streamed generation.
+
+    Every token reported here has already been written into the cache, so
+    callers can track the cache contents from the chunks they receive.
+    """
+
+    text: str
+    token: int
+    finish_reason: Optional[str] = None  # "stop", "length" or None while streaming
+    from_draft: bool = False  # Proposed by a draft model and accepted by the main model
+
+
+class BatchDecoder(Protocol):
+    """
+    Decodes several sequences together, each with its own cache.
+
+    Sequences join between steps with insert() and every step() advances
+    each active sequence by one chunk. A sequence leaves once its chunk
+    carries a ``finish_reason``, or when it is removed; its cache then holds
+    the prompt and the tokens emitted, as after stream() (a prefix of them
+    if removed early).
+    """
+
+    def insert(self, seq_id: int, tokens: List[int], cache: Any, max_tokens: int) -> None:
+        """Add a sequence; ``tokens`` (at least one) are the prompt tokens not yet in ``cache``."""
+        ...
+
+    def remove(self, seq_id: int) -> None:
+        """Stop decoding a sequence, leaving its cache consistent."""
+        ...
+
+    def step(self) -> List[Tuple[int, GenerationChunk]]:
+        """Run one decode step, returning ``(seq_id, chunk)`` for each active sequence."""
+        ...
+
+    def __len__(self) -> int:
+        """Number of sequences being decoded."""
+        ...
+
+    def close(self) -> None:
+        """Release engine resources held by the decoder."""
+        ...
+
+
+@runtime_checkable
+class InferenceBackend(Protocol):
+    """
+    Protocol for inference engines.
+
+    A backend owns the model weights and tokenizer. Caches are opaque
+    objects created by the backend and passed back in on every call, so
+    one loaded model can serve several independent conversations.
+    """
+
+    name: str
+    default_model_id: str
+    cache_file_suffix: str  # Extension of files written by save_cache()
+    draft_tokens: int  # Tokens a draft model proposes per decode step (0 when not speculating)
+    max_batch_size: int  # Sequences one BatchDecoder step can advance together
+
+    def load(self, model_id: str) -> None:
+        """Load model weights and tokenizer."""
+        ...
+
+    def load_tokenizer(self, model_id: str) -> None:
+        """Make tokenize() usable without the weights (no-op if already possible)."""
+        ...
+
+    def unload(self) -> None:
+        """Release model weights and any engine memory."""
+        ...
+
+    def is_loaded(self) -> bool:
+        """Check if the model is loaded."""
+        ...
+
+    def tokenize(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        """Convert text to token IDs."""
+        ...
+
+    def make_cache(self) -> Any:
+        """Create an empty KV cache."""
+        ...
+
+    def trim_cache(self, cache: Any, num_tokens: int) -> bool:
+        """
+        Remove the last ``num_tokens`` tokens from a cache.
+
+        Returns:
+            False if the cache cannot be trimmed and must be rebuilt.
+        """
+        ...
+
+    def cache_length(self, cache: Any) -> Optional[int]:
+        """Return the number of tokens held in a cache, if known."""
+        ...
+
+    def fingerprint(self) -> str:
+        """
+        Identify the loaded tokenizer.
+
+        Saved caches are only reused when the fingerprint matches, since the
+        same token IDs mean different text under another vocabulary.
+        """
+        ...
+
+    def save_cache(self, cache: Any, path: str) -> None:
+        """Write a cache to ``path`` (which ends with ``cache_file_suffix``)."""
+        ...
+
+    def load_cache(self, path: str) -> Any:
+        """
+        Read a cache written by save_cache().
+
+        Raises:
+            Exception: If the file is missing, corrupt or incompatible.
+        """
+        ...
+
+    def prefill(self, tokens: List[int], cache: Any) -> None:
+        """Process prompt tokens into the cache without sampling."""
+        ...
+
+    def stream(
+        self,
+        tokens: List[int],
+        cache: Any,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+    ) -> Iterator[GenerationChunk]:
+        """
+        Prefill ``tokens`` (at least one) into the cache and stream a completion.
+
+        The last chunk carries a ``finish_reason``.
+        """
+        ...
+
+    def batch_decoder(self, temperature: float, top_p: float) -> BatchDecoder:
+        """Create a decoder that advances up to ``max_batch_size`` sequences per step."""
+        ...
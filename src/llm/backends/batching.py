@@ -0,0 +1,56 @@
+"""
+Stream Batch Decoder
+
+BatchDecoder for engines that can only decode one sequence at a time.
+"""
+
+from typing import Any, Dict, Iterator, List, Tuple
+
+from src.llm.backends.base import GenerationChunk, InferenceBackend
+
+
+class StreamDecoder:
+    """
+    BatchDecoder built from ordinary backend.stream() calls.
+
+    A step advances every active stream by one chunk in turn, so sequences
+    interleave fairly but the model still runs once per sequence. Engines
+    that keep a single sequence in their context (llama.cpp) report a
+    ``max_batch_size`` of 1, so their streams are never interleaved.
+    """
+
+    def __init__(self, backend: InferenceBackend, temperature: float, top_p: float):
+        self.backend = backend
+        self.temperature = temperature
+        self.top_p = top_p
+        self._streams: Dict[int, Iterator[GenerationChunk]] = {}
+
+    def insert(self, seq_id: int, tokens: List[int], cache: Any, max_tokens: int) -> None:
+        """Start streaming a sequence; its prompt is processed on the next step."""
+        self._streams[seq_id] = self.backend.stream(
+            tokens, cache, max_tokens=max_tokens, temperature=self.temperature, top_p=self.top_p
+        )
+
+    def remove(self, seq_id: int) -> None:
+        """Close a sequence's stream so the backend settles its cache."""
+        stream = self._streams.pop(seq_id, None)
+        if stream is not None:
+            stream.close()
+
+    def step(self) -> List[Tuple[int, GenerationChunk]]:
+        """Advance each stream by one chunk."""
+        chunks = []
+        for seq_id, stream in list(self._streams.items()):
+            chunk = next(stream)
+            if chunk.finish_reason is not None:
+                self.remove(seq_id)
+            chunks.append((seq_id, chunk))
+        return chunks
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def close(self) -> None:
+        """Close every stream."""
+        for seq_id in list(self._streams):
+            self.remove(seq_id)
@@ -0,0 +1,219 @@
+"""
+llama.cpp Backend
+
+Runs GGUF models on the CPU through llama-cpp-python, so the pipeline can
+run and be profiled on machines without Apple Silicon.
+
+Install with: uv sync --extra cpu
+"""
+
+import codecs
+import ctypes
+import hashlib
+import os
+from typing import Any, Iterator, List, Optional
+
+import llama_cpp
+from llama_cpp import Llama
+
+from src.config import CPU_MODEL_ID, CPU_MODEL_FILE, CONTEXT_WINDOW
+from src.llm.backends.base import GenerationChunk
+from src.llm.backends.batching import StreamDecoder
+
+
+class LlamaCppCache:
+    """
+    Token record for a llama.cpp conversation.
+
+    llama.cpp keeps a single KV sequence inside its context, so a cache here
+    is the list of tokens that sequence should hold. The backend restores
+    the context from it whenever a different cache becomes active.
+    """
+
+    def __init__(self):
+        self.tokens: List[int] = []
+
+
+class LlamaCppBackend:
+    """Inference backend using llama.cpp on the CPU."""
+
+    name = "cpu"
+    default_model_id = CPU_MODEL_ID
+    cache_file_suffix = ".llamastate"
+    draft_tokens = 0
+    # The context holds one sequence; batched requests take turns
+    max_batch_size = 1
+
+    def __init__(self, n_ctx: int = CONTEXT_WINDOW, n_threads: Optional[int] = None):
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.llm: Optional[Llama] = None
+        self._vocab: Optional[Llama] = None  # Vocabulary-only model, for tokenizing before load()
+        self._active: Optional[LlamaCppCache] = None
+        self._stop_tokens: set = set()
+
+    def _open(self, model_id: str, **kwargs) -> Llama:
+        """Open a GGUF model from a local path or a Hugging Face repo."""
+        if os.path.exists(model_id):
+            return Llama(model_path=model_id, verbose=False, **kwargs)
+        return Llama.from_pretrained(repo_id=model_id, filename=CPU_MODEL_FILE, verbose=False, **kwargs)
+
+    def load(self, model_id: str) -> None:
+        """Load a GGUF model from a local path or a Hugging Face repo."""
+        self.llm = self._open(model_id, n_ctx=self.n_ctx, n_threads=self.n_threads)
+        if self._vocab is not None:
+            self._vocab.close()
+            self._vocab = None
+        self._active = None
+        self._stop_tokens = {self.llm.token_eos()}
+        end_of_turn = self.llm.tokenize(b"<end_of_turn>", add_bos=False, special=True)
+        if len(end_of_turn) == 1:
+            self._stop_tokens.add(end_of_turn[0])
+
+    def unload(self) -> None:
+        """Free the llama.cpp context and weights."""
+        if self.llm is not None:
+            self.llm.close()
+        self.llm = None
+        self._active = None
+
+    def is_loaded(self) -> bool:
+        """Check if the model is loaded."""
+        return self.llm is not None
+
+    def load_tokenizer(self, model_id: str) -> None:
+        """Load just the model's vocabulary, unless the model itself is loaded."""
+        if self.llm is None and self._vocab is None:
+            self._vocab = self._open(model_id, vocab_only=True)
+
+    def tokenize(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        """Convert text to token IDs."""
+        llm = self.llm if self.llm is not None else self._vocab
+        return llm.tokenize(
+            text.encode("utf-8"), add_bos=add_special_tokens, special=True
+        )
+
+    def make_cache(self) -> Any:
+        """Create an empty cache."""
+        return LlamaCppCache()
+
+    def trim_cache(self, cache: Any, num_tokens: int) -> bool:
+        """Forget the last tokens of the cache."""
+        if num_tokens > 0:
+            del cache.tokens[-num_tokens:]
+        if cache is self._active:
+            self.llm.n_tokens = len(cache.tokens)
+        return True
+
+    def cache_length(self, cache: Any) -> Optional[int]:
+        """Return the number of tokens held in the cache."""
+        return len(cache.tokens)
+
+    def fingerprint(self) -> str:
+        """
+        Identify the GGUF's tokenizer.
+
+        The vocabulary is embedded in the model file, so the file's identity
+        plus its tokenizer metadata stands in for hashing every token.
+        """
+        llm = self.llm
+        tokenizer_meta = sorted(
+            (k, v) for k, v in llm.metadata.items() if k.startswith("tokenizer.")
+        )
+        ident = repr((
+            os.path.basename(llm.model_path),
+            os.path.getsize(llm.model_path),
+            llm.n_vocab(),
+            tokenizer_meta,
+        ))
+        return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+    def save_cache(self, cache: Any, path: str) -> None:
+        """Write the context's KV state for ``cache`` as a llama.cpp session file."""
+        self._activate(cache)
+        tokens = (llama_cpp.llama_token * len(cache.tokens))(*cache.tokens)
+        if not llama_cpp.llama_state_save_file(
+            self.llm.ctx, path.encode("utf-8"), tokens, len(cache.tokens)
+        ):
+            raise OSError(f"llama.cpp could not save its state to {path}")
+
+    def load_cache(self, path: str) -> Any:
+        """Restore a session file into the context and return its cache."""
+        llm = self.llm
+        tokens = (llama_cpp.llama_token * self.n_ctx)()
+        count = ctypes.c_size_t(0)
+        # A failed load leaves the context undefined; force a full re-eval
+        self._active = None
+        llm.n_tokens = 0
+        if not llama_cpp.llama_state_load_file(
+            llm.ctx, path.encode("utf-8"), tokens, self.n_ctx, ctypes.byref(count)
+        ):
+            raise ValueError(f"llama.cpp could not load state from {path}")
+        cache = LlamaCppCache()
+        cache.tokens = list(tokens[:count.value])
+        llm.input_ids[:count.value] = cache.tokens
+        llm.n_tokens = count.value
+        self._active = cache
+        return cache
+
+    def _activate(self, cache: LlamaCppCache) -> None:
+        """Make the llama.cpp context hold exactly the tokens of ``cache``."""
+        llm = self.llm
+        if cache is not self._active:
+            held = list(llm.input_ids[:llm.n_tokens])
+            prefix = 0
+            for a, b in zip(held, cache.tokens):
+                if a != b:
+                    break
+                prefix += 1
+            llm.n_tokens = prefix
+            self._active = cache
+            if prefix < len(cache.tokens):
+                llm.eval(cache.tokens[prefix:])
+        else:
+            llm.n_tokens = len(cache.tokens)
+
+    def prefill(self, tokens: List[int], cache: Any) -> None:
+        """Evaluate prompt tokens into the context."""
+        self._activate(cache)
+        self.llm.eval(tokens)
+        cache.tokens.extend(tokens)
+
+    def stream(
+        self,
+        tokens: List[int],
+        cache: Any,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+    ) -> Iterator[GenerationChunk]:
+        """Stream a completion, decoding UTF-8 incrementally."""
+        self._activate(cache)
+        llm = self.llm
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        generator = llm.generate(list(tokens), temp=temperature, top_p=top_p, reset=False)
+        count = 0
+        try:
+            for token in generator:
+                count += 1
+                # generate() evaluates a sampled token lazily; sync the record
+                cache.tokens = list(llm.input_ids[:llm.n_tokens])
+                if token in self._stop_tokens:
+                    yield GenerationChunk(text="", token=token, finish_reason="stop")
+                    return
+                text = decoder.decode(llm.detokenize([token]))
+                if count >= max_tokens:
+                    yield GenerationChunk(
+                        text=text + decoder.decode(b"", final=True),
+                        token=token,
+                        finish_reason="length",
+                    )
+                    return
+                yield GenerationChunk(text=text, token=token)
+        finally:
+            generator.close()
+            cache.tokens = list(llm.input_ids[:llm.n_tokens])
+
+    def batch_decoder(self, temperature: float, top_p: float) -> StreamDecoder:
+        """Decode one sequence at a time (see ``max_batch_size``)."""
+        return StreamDecoder(self, temperature, top_p)
@@ -0,0 +1,335 @@
+"""
+MLX Backend
+
+Runs models with MLX-LM on Apple Silicon (Metal GPU).
+"""
+
+import gc
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import mlx.core as mx
+import mlx_lm
+from mlx_lm.models.cache import (
+    make_prompt_cache,
+    can_trim_prompt_cache,
+    trim_prompt_cache,
+    save_prompt_cache,
+    load_prompt_cache,
+)
+from mlx_lm.generate import BatchGenerator
+from mlx_lm.sample_utils import make_sampler
+
+from src.config import (
+    MODEL_ID,
+    PREFILL_STEP_SIZE,
+    DRAFT_MODEL_ID,
+    NUM_DRAFT_TOKENS,
+    DRAFT_MIN_MEMORY_GB,
+    BATCH_MAX_SIZE,
+)
+from src.llm.backends.base import GenerationChunk
+
+
+def _physical_memory_gb() -> Optional[float]:
+    """Installed RAM in GB, if the OS reports it."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class MLXBackend:
+    """
+    Inference backend using MLX-LM.
+
+    With a draft model loaded, decoding is speculative: caches hold the
+    main model's layers followed by the draft model's, as mlx_lm expects.
+    """
+
+    name = "mlx"
+    default_model_id = MODEL_ID
+    cache_file_suffix = ".safetensors"
+
+    def __init__(
+        self,
+        draft_model_id: Optional[str] = DRAFT_MODEL_ID,
+        num_draft_tokens: int = NUM_DRAFT_TOKENS,
+        draft_min_memory_gb: float = DRAFT_MIN_MEMORY_GB,
+        max_batch_size: int = BATCH_MAX_SIZE,
+    ):
+        """
+        Initialize the backend.
+
+        Args:
+            draft_model_id: Small model for speculative decoding, or None.
+            num_draft_tokens: Tokens the draft proposes per step.
+            draft_min_memory_gb: RAM required before the draft model is loaded.
+            max_batch_size: Sequences a batch decoder step advances together.
+        """
+        self.max_batch_size = max_batch_size
+        self.model = None
+        self.tokenizer = None
+        self.draft_model = None
+        self.draft_model_id = draft_model_id
+        self.num_draft_tokens = num_draft_tokens
+        self.draft_min_memory_gb = draft_min_memory_gb
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def draft_tokens(self) -> int:
+        """Tokens proposed per decode step (0 without a draft model)."""
+        return self.num_draft_tokens if self.draft_model is not None else 0
+
+    def load(self, model_id: str) -> None:
+        """Load the model and tokenizer (downloads on first run), plus the draft model if configured."""
+        self.model, self.tokenizer = mlx_lm.load(model_id)
+        if self.draft_model_id and self.num_draft_tokens > 0:
+            self._load_draft()
+
+    def load_tokenizer(self, model_id: str) -> None:
+        """Load just the tokenizer, fetching only its files on first run."""
+        if self.tokenizer is None:
+            self.tokenizer = mlx_lm.utils.load_tokenizer(model_id)
+
+    def _load_draft(self) -> None:
+        """Load the draft model if there is RAM to spare and its vocabulary matches."""
+        memory = _physical_memory_gb()
+        if memory is not None and memory < self.draft_min_memory_gb:
+            print(
+                f"Speculative decoding off: {memory:.0f} GB RAM is below "
+                f"the {self.draft_min_memory_gb} GB needed for the draft model"
+            )
+            return
+        draft_model, draft_tokenizer = mlx_lm.load(self.draft_model_id)
+        if draft_tokenizer.vocab_size != self.tokenizer.vocab_size:
+            print(f"Speculative decoding off: {self.draft_model_id} uses a different tokenizer")
+            return
+        self.draft_model = draft_model
+
+    def unload(self) -> None:
+        """Drop the models and return Metal buffers to the system."""
+        self.model = None
+        self.tokenizer = None
+        self.draft_model = None
+        self._fingerprint = None
+        gc.collect()
+        mx.clear_cache()
+
+    def is_loaded(self) -> bool:
+        """Check if the model is loaded."""
+        return self.model is not None
+
+    def tokenize(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        """Convert text to token IDs."""
+        return self.tokenizer.encode(text, add_special_tokens=add_special_tokens)
+
+    def make_cache(self) -> Any:
+        """Create an empty per-layer KV cache for the model (and the draft model)."""
+        cache = make_prompt_cache(self.model)
+        if self.draft_model is not None:
+            cache += make_prompt_cache(self.draft_model)
+        return cache
+
+    def trim_cache(self, cache: Any, num_tokens: int) -> bool:
+        """Trim tokens from the end of the cache in place."""
+        if not can_trim_prompt_cache(cache):
+            return False
+        trim_prompt_cache(cache[:len(self.model.layers)], num_tokens)
+        self._align_draft(cache)
+        return True
+
+    def _align_draft(self, cache: Any) -> None:
+        """
+        Trim the draft model's layers back to the main model's length.
+
+        A speculative step that is interrupted leaves unverified draft
+        tokens behind; the main model's cache is the source of truth.
+        """
+        layers = len(self.model.layers)
+        if len(cache) > layers:
+            excess = cache[layers].offset - cache[0].offset
+            if excess > 0:
+                trim_prompt_cache(cache[layers:], excess)
+
+    def _sync_draft(self, cache: Any, tokens: List[int]) -> None:
+        """
+        Feed the draft model the tokens the main model processed without it.
+
+        Batched decoding only runs the main model; ``tokens`` starts where
+        the draft layers stopped and covers everything written since.
+        """
+        layers = len(self.model.layers)
+        if len(cache) <= layers:
+            return
+        missing = cache[0].offset - cache[layers].offset
+        if missing > 0:
+            self.draft_model(mx.array(tokens[:missing])[None], cache=cache[layers:])
+            mx.eval([c.state for c in cache[layers:]])
+        else:
+            self._align_draft(cache)
+
+    def cache_length(self, cache: Any) -> Optional[int]:
+        """Return the number of tokens held in the cache."""
+        if not cache:
+            return 0
+        return getattr(cache[0], "offset", None)
+
+    def fingerprint(self) -> str:
+        """Hash of the tokenizer's vocabulary, computed once per load."""
+        if self._fingerprint is None:
+            vocab = json.dumps(self.tokenizer.get_vocab(), sort_keys=True)
+            self._fingerprint = hashlib.sha256(vocab.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    def save_cache(self, cache: Any, path: str) -> None:
+        """Write the per-layer cache to a safetensors file."""
+        save_prompt_cache(path, cache)
+
+    def load_cache(self, path: str) -> Any:
+        """Load a cache; safetensors arrays are read lazily from the file."""
+        cache = load_prompt_cache(path)
+        if len(cache) != len(self.make_cache()):
+            raise ValueError("snapshot does not match the model's layers")
+        return cache
+
+    def prefill(self, tokens: List[int], cache: Any) -> None:
+        """Run prompt tokens through the model(s) in chunks, filling the cache."""
+        layers = len(self.model.layers)
+        for start in range(0, len(tokens), PREFILL_STEP_SIZE):
+            chunk = mx.array(tokens[start:start + PREFILL_STEP_SIZE])
+            self.model(chunk[None], cache=cache[:layers])
+            if self.draft_model is not None:
+                self.draft_model(chunk[None], cache=cache[layers:])
+            mx.eval([c.state for c in cache])
+        mx.clear_cache()
+
+    def stream(
+        self,
+        tokens: List[int],
+        cache: Any,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+    ) -> Iterator[GenerationChunk]:
+        """Stream a completion using mlx_lm.stream_generate (speculatively with a draft model)."""
+        sampler = make_sampler(temp=temperature, top_p=top_p)
+        try:
+            for response in mlx_lm.stream_generate(
+                self.model,
+                self.tokenizer,
+                prompt=tokens,
+                max_tokens=max_tokens,
+                draft_model=self.draft_model,
+                num_draft_tokens=self.num_draft_tokens,
+                sampler=sampler,
+                prompt_cache=cache,
+                prefill_step_size=PREFILL_STEP_SIZE,
+            ):
+                yield GenerationChunk(
+                    text=response.text,
+                    token=response.token,
+                    finish_reason=response.finish_reason,
+                    from_draft=response.from_draft,
+                )
+        finally:
+            if self.draft_model is not None:
+                self._align_draft(cache)
+
+    def batch_decoder(self, temperature: float, top_p: float) -> "MLXBatchDecoder":
+        """Create a decoder running up to ``max_batch_size`` sequences per forward pass."""
+        return MLXBatchDecoder(self, temperature, top_p)
+
+
+@dataclass
+class _BatchSequence:
+    seq_id: int
+    cache: Any  # The caller's cache, written back when the sequence leaves
+    detokenizer: Any
+    tokens: List[int] = field(default_factory=list)  # Inserted and generated tokens
+
+
+class MLXBatchDecoder:
+    """
+    Batched decoding with mlx_lm's BatchGenerator.
+
+    Each step runs one forward pass for every active sequence, so decode
+    throughput grows with the batch while memory bandwidth is shared. A
+    sequence's keys and values live in the batch cache while it runs and
+    are copied back into its own cache when it finishes or is removed.
+    """
+
+    def __init__(self, backend: MLXBackend, temperature: float, top_p: float):
+        self.backend = backend
+        self._layers = len(backend.model.layers)
+        self._generator = BatchGenerator(
+            backend.model,
+            stop_tokens=set(backend.tokenizer.eos_token_ids),
+            sampler=make_sampler(temp=temperature, top_p=top_p),
+            completion_batch_size=backend.max_batch_size,
+            # Admit new sequences one at a time so they can join a running batch
+            prefill_batch_size=1,
+            prefill_step_size=PREFILL_STEP_SIZE,
+        )
+        self._sequences: Dict[int, _BatchSequence] = {}  # By BatchGenerator uid
+
+    def insert(self, seq_id: int, tokens: List[int], cache: Any, max_tokens: int) -> None:
+        """Queue a sequence; it joins the batch on the next step."""
+        (uid,) = self._generator.insert(
+            [list(tokens)], max_tokens=[max_tokens], caches=[cache[:self._layers]]
+        )
+        self._sequences[uid] = _BatchSequence(
+            seq_id, cache, self.backend.tokenizer.detokenizer, list(tokens)
+        )
+
+    def remove(self, seq_id: int) -> None:
+        """Drop a sequence, keeping what it has written so far in its cache."""
+        for uid, sequence in list(self._sequences.items()):
+            if sequence.seq_id != seq_id:
+                continue
+            batch = self._generator.active_batch
+            if batch is not None and uid in batch.uids:
+                self._finish(uid, batch.extract_cache(batch.uids.index(uid)))
+            else:
+                # Not started yet: the cache is as the caller left it
+                del self._sequences[uid]
+            self._generator.remove([uid])
+
+    def _finish(self, uid: int, layers: List[Any]) -> None:
+        sequence = self._sequences.pop(uid)
+        sequence.cache[:self._layers] = layers
+        self.backend._sync_draft(sequence.cache, sequence.tokens)
+
+    def step(self) -> List[Tuple[int, GenerationChunk]]:
+        """Run one forward pass for the batch (after prefilling any new sequences)."""
+        chunks = []
+        for response in self._generator.next():
+            sequence = self._sequences[response.uid]
+            detokenizer = sequence.detokenizer
+            sequence.tokens.append(response.token)
+            if response.finish_reason != "stop":
+                detokenizer.add_token(response.token)
+            if response.finish_reason is not None:
+                detokenizer.finalize()
+                self._finish(response.uid, response.prompt_cache)
+            chunks.append((
+                sequence.seq_id,
+                GenerationChunk(
+                    text=detokenizer.last_segment,
+                    token=response.token,
+                    finish_reason=response.finish_reason,
+                ),
+            ))
+        return chunks
+
+    def __len__(self) -> int:
+        return len(self._sequences)
+
+    def close(self) -> None:
+        """Remove every sequence and restore the Metal wired memory limit."""
+        for sequence in list(self._sequences.values()):
+            self.remove(sequence.seq_id)
+        self._generator.close()
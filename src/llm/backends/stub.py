@@ -0,0 +1,243 @@
+"""
+Stub Backend
+
+A deterministic, dependency-free engine with configurable speed. It lets
+the worker, search, caching and UI code be exercised and benchmarked on
+any machine without model weights.
+"""
+
+import json
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.llm.backends.base import GenerationChunk
+
+
+_TOKEN_PATTERN = re.compile(r"\s*\S+|\s+")
+
+# Starts with a space like a real model's answer after the "Pixie:" cue
+DEFAULT_RESPONSE = (
+    " Woof! I'm Pixie running on the stub engine. "
+    "This reply is canned so timings are repeatable from run to run."
+)
+
+
+class StubCache:
+    """Cache holding the token IDs the stub has 'processed'."""
+
+    def __init__(self):
+        self.tokens: List[int] = []
+
+
+class StubBackend:
+    """
+    Deterministic inference backend for tests and benchmarks.
+
+    Tokens are whitespace-delimited words. Prefill costs
+    ``prefill_overhead + n / prefill_tokens_per_sec`` seconds and each
+    decoded token costs ``1 / tokens_per_sec`` seconds (0 disables the
+    delay). Every prefill size is recorded in ``prefill_calls``.
+
+    With ``draft_tokens`` set, decoding mimics speculative decoding: each
+    step costs one token's time and emits ``draft_acceptance`` of the
+    drafted tokens (marked ``from_draft``) plus one verified token.
+
+    A batch decoder step advances up to ``max_batch_size`` sequences by one
+    token each and costs ``(1 + batch_step_cost * (n - 1)) / tokens_per_sec``
+    seconds for ``n`` sequences, like a memory-bound engine where extra
+    sequences in a batch are nearly free.
+    """
+
+    name = "stub"
+    default_model_id = "stub"
+    cache_file_suffix = ".json"
+
+    BOS = 0
+    EOS = 1
+
+    def __init__(
+        self,
+        tokens_per_sec: float = 0.0,
+        prefill_tokens_per_sec: float = 0.0,
+        prefill_overhead: float = 0.0,
+        load_seconds: float = 0.0,
+        response: str = DEFAULT_RESPONSE,
+        draft_tokens: int = 0,
+        draft_acceptance: float = 0.0,
+        max_batch_size: int = 8,
+        batch_step_cost: float = 0.1,
+    ):
+        self.tokens_per_sec = tokens_per_sec
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.prefill_overhead = prefill_overhead
+        self.load_seconds = load_seconds
+        self.response = response
+        self.draft_tokens = draft_tokens
+        self.draft_acceptance = draft_acceptance
+        self.max_batch_size = max_batch_size
+        self.batch_step_cost = batch_step_cost
+        self.prefill_calls: List[int] = []
+        self._loaded = False
+        self._vocab: Dict[str, int] = {"<bos>": self.BOS, "<eos>": self.EOS}
+        self._words: List[str] = ["<bos>", "<eos>"]
+
+    def load(self, model_id: str) -> None:
+        """Pretend to load weights."""
+        if self.load_seconds:
+            time.sleep(self.load_seconds)
+        self._loaded = True
+
+    def load_tokenizer(self, model_id: str) -> None:
+        """The stub tokenizes without loading anything."""
+
+    def unload(self) -> None:
+        """Pretend to release weights."""
+        self._loaded = False
+
+    def is_loaded(self) -> bool:
+        """Check if the model is loaded."""
+        return self._loaded
+
+    def tokenize(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        """Split text into word tokens, growing the vocabulary as needed."""
+        tokens = [self.BOS] if add_special_tokens else []
+        for piece in _TOKEN_PATTERN.findall(text):
+            token = self._vocab.get(piece)
+            if token is None:
+                token = len(self._words)
+                self._vocab[piece] = token
+                self._words.append(piece)
+            tokens.append(token)
+        return tokens
+
+    def make_cache(self) -> Any:
+        """Create an empty cache."""
+        return StubCache()
+
+    def trim_cache(self, cache: Any, num_tokens: int) -> bool:
+        """Forget the last tokens of the cache."""
+        if num_tokens > 0:
+            del cache.tokens[-num_tokens:]
+        return True
+
+    def cache_length(self, cache: Any) -> Optional[int]:
+        """Return the number of tokens held in the cache."""
+        return len(cache.tokens)
+
+    def fingerprint(self) -> str:
+        """The stub's vocabulary is built on the fly; token IDs alone tell caches apart."""
+        return "stub"
+
+    def save_cache(self, cache: Any, path: str) -> None:
+        """Write the cache's tokens as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"tokens": cache.tokens}, f)
+
+    def load_cache(self, path: str) -> Any:
+        """Read a cache written by save_cache()."""
+        with open(path, encoding="utf-8") as f:
+            tokens = json.load(f)["tokens"]
+        cache = StubCache()
+        cache.tokens = [int(t) for t in tokens]
+        return cache
+
+    def prefill(self, tokens: List[int], cache: Any) -> None:
+        """Record and 'process' prompt tokens."""
+        self.prefill_calls.append(len(tokens))
+        delay = self.prefill_overhead
+        if self.prefill_tokens_per_sec:
+            delay += len(tokens) / self.prefill_tokens_per_sec
+        if delay:
+            time.sleep(delay)
+        cache.tokens.extend(tokens)
+
+    def stream(
+        self,
+        tokens: List[int],
+        cache: Any,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+    ) -> Iterator[GenerationChunk]:
+        """Prefill the prompt, then emit the canned response word by word."""
+        self.prefill(tokens, cache)
+        reply = self.tokenize(self.response, add_special_tokens=False)
+        delay = 1.0 / self.tokens_per_sec if self.tokens_per_sec else 0.0
+        # Tokens emitted per model step: accepted drafts plus the verified token
+        accepted = round(self.draft_tokens * self.draft_acceptance)
+        for count, token in enumerate(reply[:max_tokens], 1):
+            from_draft = (count - 1) % (accepted + 1) < accepted
+            if delay and not from_draft:
+                time.sleep(delay)
+            cache.tokens.append(token)
+            finish = "length" if count == max_tokens else None
+            yield GenerationChunk(
+                text=self._words[token], token=token, finish_reason=finish, from_draft=from_draft
+            )
+            if finish:
+                return
+        cache.tokens.append(self.EOS)
+        yield GenerationChunk(text="", token=self.EOS, finish_reason="stop")
+
+    def batch_decoder(self, temperature: float, top_p: float) -> "StubBatchDecoder":
+        """Create a decoder that emits the canned response for several sequences at once."""
+        return StubBatchDecoder(self)
+
+
+class _StubSequence:
+    def __init__(self, cache: StubCache, pending: List[int], max_tokens: int):
+        self.cache = cache
+        self.pending = pending  # Prompt tokens processed on the next step
+        self.max_tokens = max_tokens
+        self.emitted = 0
+
+
+class StubBatchDecoder:
+    """Batched counterpart of StubBackend.stream() (without draft tokens)."""
+
+    def __init__(self, backend: StubBackend):
+        self.backend = backend
+        self._reply = backend.tokenize(backend.response, add_special_tokens=False)
+        self._sequences: Dict[int, _StubSequence] = {}
+
+    def insert(self, seq_id: int, tokens: List[int], cache: Any, max_tokens: int) -> None:
+        """Queue a sequence; its prompt tokens are processed on the next step."""
+        self._sequences[seq_id] = _StubSequence(cache, list(tokens), max_tokens)
+
+    def remove(self, seq_id: int) -> None:
+        """Drop a sequence; its cache already holds every token emitted."""
+        self._sequences.pop(seq_id, None)
+
+    def step(self) -> List[Tuple[int, GenerationChunk]]:
+        """Emit the next token of every sequence for the cost of one batched step."""
+        backend = self.backend
+        for sequence in self._sequences.values():
+            if sequence.pending:
+                backend.prefill(sequence.pending, sequence.cache)
+                sequence.pending = []
+        if backend.tokens_per_sec and self._sequences:
+            time.sleep((1 + backend.batch_step_cost * (len(self._sequences) - 1)) / backend.tokens_per_sec)
+
+        chunks = []
+        for seq_id, sequence in list(self._sequences.items()):
+            if sequence.emitted < min(sequence.max_tokens, len(self._reply)):
+                token = self._reply[sequence.emitted]
+                sequence.emitted += 1
+                finish = "length" if sequence.emitted == sequence.max_tokens else None
+                chunk = GenerationChunk(text=backend._words[token], token=token, finish_reason=finish)
+            else:
+                token = backend.EOS
+                chunk = GenerationChunk(text="", token=token, finish_reason="stop")
+            sequence.cache.tokens.append(token)
+            if chunk.finish_reason is not None:
+                del self._sequences[seq_id]
+            chunks.append((seq_id, chunk))
+        return chunks
+
+    def __len__(self) -> int:
+        return len(self._sequences)
+
+    def close(self) -> None:
+        """Drop every sequence."""
+        self._sequences.clear()
@@ -0,0 +1,112 @@
+"""
+Conversation Compaction
+
+Folds the oldest turns of a long conversation into a running summary, so
+the prompt stays small and stable while the conversation keeps its memory.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from src.config import (
+    COMPACTION_THRESHOLD_TOKENS,
+    COMPACTION_KEEP_TOKENS,
+    COMPACTION_SUMMARY_TOKENS,
+)
+from src.llm.history import HistoryManager, format_message
+
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below between a user (Human) and the assistant "
+    "Pixie so that Pixie can remember it later. Keep names, facts, numbers, "
+    "preferences and decisions. Write a few plain sentences."
+)
+
+
+class ConversationCompactor:
+    """
+    Running summary of the oldest part of a conversation.
+
+    Once the messages not yet summarized exceed ``threshold_tokens``, all
+    but the most recent ``keep_tokens`` of them are due to be folded in.
+    Each compaction summarizes only the newly folded messages and appends
+    the result as a new segment, so existing summary text is reused as-is
+    and never regenerated.
+    """
+
+    def __init__(
+        self,
+        threshold_tokens: int = COMPACTION_THRESHOLD_TOKENS,
+        keep_tokens: int = COMPACTION_KEEP_TOKENS,
+        summary_tokens: int = COMPACTION_SUMMARY_TOKENS,
+    ):
+        """
+        Initialize the compactor.
+
+        Args:
+            threshold_tokens: Unsummarized history tokens that trigger compaction.
+            keep_tokens: Most recent history tokens always kept verbatim.
+            summary_tokens: Maximum tokens generated per compaction.
+        """
+        self.threshold_tokens = threshold_tokens
+        self.keep_tokens = keep_tokens
+        self.summary_tokens = summary_tokens
+        self.segments: List[str] = []
+        # Number of leading history messages covered by the summary
+        self.summarized_count = 0
+        # Bumped on reset so a compaction started before it is discarded
+        self.epoch = 0
+
+    @property
+    def summary(self) -> str:
+        """The running summary, oldest part first."""
+        return "\n".join(self.segments)
+
+    def reset(self) -> None:
+        """Forget the summary (e.g. when the conversation is cleared)."""
+        self.segments = []
+        self.summarized_count = 0
+        self.epoch += 1
+
+    def pending(self, history: HistoryManager) -> Optional[Tuple[int, int]]:
+        """
+        Find the messages due to be folded into the summary.
+
+        Returns:
+            ``(start, end)`` indexes into the history, or None if the
+            unsummarized history is still under the threshold.
+        """
+        messages = history.messages
+        start = self.summarized_count
+        counts = [history.token_count(msg) for msg in messages[start:]]
+        if sum(counts) <= self.threshold_tokens:
+            return None
+
+        # Keep the most recent messages that fit keep_tokens
+        kept = 0
+        end = len(messages)
+        for i in range(len(messages) - 1, start - 1, -1):
+            if kept + counts[i - start] > self.keep_tokens:
+                break
+            kept += counts[i - start]
+            end = i
+        # Begin the verbatim part on a user turn so no answer loses its question
+        while end < len(messages) and messages[end]["role"] != "user":
+            end += 1
+        if end <= start:
+            return None
+        return start, end
+
+    def build_prompt(self, messages: List[Dict]) -> str:
+        """Build the prompt asking the model to summarize ``messages``."""
+        parts = [SUMMARY_INSTRUCTIONS + "\n"]
+        if self.segments:
+            parts.append(f"\nWhat you already remember:\n{self.summary}\n")
+        parts.append("\nConversation:")
+        parts.extend(format_message(msg["role"], msg["content"]) for msg in messages)
+        parts.append("\n\nSummary:")
+        return "".join(parts)
+
+    def apply(self, end: int, text: str) -> None:
+        """Append a summary of the messages up to ``end``."""
+        self.segments.append(text)
+        self.summarized_count = end
@@ -0,0 +1,148 @@
+"""
+Conversation History Module
+
+Stores chat messages together with their token counts so the prompt can be
+windowed to a token budget without retokenizing the whole history each turn.
+"""
+
+from typing import Callable, Dict, Iterator, List, Optional
+
+from src.config import HISTORY_TOKEN_BUDGET
+
+
+def format_message(role: str, content: str) -> str:
+    """
+    Render a single history message the way it appears in the prompt.
+
+    An answer generated in this process is rendered exactly as it was
+    decoded: the "Pixie:" cue followed by the raw text, which carries its
+    own leading space, so the next prompt still matches the tokens left in
+    the KV cache. Answers from anywhere else (restored sessions, API
+    clients) usually have no leading space and get the separator added.
+    """
+    if role == "user":
+        return f"\nHuman: {content}"
+    if content[:1].isspace():
+        return f"\nPixie:{content}"
+    return f"\nPixie: {content}"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate used before a tokenizer is available."""
+    return max(1, len(text) // 4)
+
+
+class HistoryManager:
+    """
+    Token-aware conversation history.
+
+    Each message is tokenized once, when it is added (or as soon as a
+    tokenizer becomes available), and the count is stored next to it.
+    Building a prompt then only needs to sum cached counts to find the
+    largest suffix of history that fits the token budget.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET):
+        """
+        Initialize the history manager.
+
+        Args:
+            token_budget: Upper bound on history tokens per prompt (default from config).
+        """
+        self.token_budget = token_budget
+        self.messages: List[Dict] = []
+        self._count_tokens: Optional[Callable[[str], int]] = None
+
+    def set_token_counter(self, count_tokens: Callable[[str], int]) -> None:
+        """
+        Set the function used to count tokens and count any pending messages.
+
+        Args:
+            count_tokens: Callable returning the token count of a string.
+        """
+        self._count_tokens = count_tokens
+        for msg in self.messages:
+            if msg["tokens"] is None:
+                msg["tokens"] = self._count(msg["role"], msg["content"])
+
+    def _count(self, role: str, content: str) -> Optional[int]:
+        if self._count_tokens is None:
+            return None
+        return self._count_tokens(format_message(role, content))
+
+    def add(
+        self,
+        role: str,
+        content: str,
+        tokens: Optional[int] = None,
+        message_id: Optional[int] = None,
+    ) -> None:
+        """
+        Add a message, tokenizing it once.
+
+        Args:
+            role: "user" or "assistant".
+            content: Message text.
+            tokens: Known token count (e.g. from the session store), skipping tokenization.
+            message_id: Id of the message in the session store, if saved.
+        """
+        self.messages.append({
+            "role": role,
+            "content": content,
+            "tokens": tokens if tokens is not None else self._count(role, content),
+            "id": message_id,
+        })
+
+    def clear(self) -> None:
+        """Remove all messages."""
+        self.messages = []
+
+    def token_count(self, msg: Dict) -> int:
+        """Return the cached token count of a message."""
+        if msg["tokens"] is None:
+            if self._count_tokens is None:
+                return estimate_tokens(format_message(msg["role"], msg["content"]))
+            msg["tokens"] = self._count(msg["role"], msg["content"])
+        return msg["tokens"]
+
+    def window(
+        self,
+        budget: Optional[int] = None,
+        end: Optional[int] = None,
+        start: int = 0,
+    ) -> List[Dict]:
+        """
+        Select the largest suffix of history that fits the token budget.
+
+        Args:
+            budget: Token budget for this prompt (default: the manager's budget).
+            end: Exclusive index of the last message to consider.
+            start: Index of the first message to consider (earlier ones
+                are summarized elsewhere).
+
+        Returns:
+            The selected messages, oldest first.
+        """
+        if budget is None:
+            budget = self.token_budget
+        budget = min(budget, self.token_budget)
+        messages = self.messages[start:end]
+
+        used = 0
+        first = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            tokens = self.token_count(messages[i])
+            if used + tokens > budget:
+                break
+            used += tokens
+            first = i
+        return messages[first:]
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
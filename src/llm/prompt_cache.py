@@ -0,0 +1,107 @@
+"""
+Prompt Cache Module
+
+Keeps the model's KV cache alive between chat turns so that only the tokens
+appended since the previous turn have to be prefilled.
+"""
+
+from typing import List, Optional, Any
+
+from src.llm.backends import InferenceBackend
+
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    """Return the number of leading tokens shared by two token sequences."""
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+class PromptCache:
+    """
+    Per-session KV cache reused across chat turns.
+
+    Tracks the exact token sequence whose keys/values are held in the cache.
+    On each turn the new prompt is compared against that sequence: the cache
+    is trimmed back to the longest common prefix and only the remaining
+    suffix is returned for prefilling. Any change earlier in the prompt
+    (history trimming, injected search context, a cleared conversation)
+    therefore invalidates exactly the part of the cache that no longer
+    matches.
+    """
+
+    def __init__(self):
+        self.cache: Optional[Any] = None
+        self.tokens: List[int] = []
+        self._backend: Optional[InferenceBackend] = None
+
+    def reset(self) -> None:
+        """Drop all cached keys/values."""
+        self.cache = None
+        self.tokens = []
+        self._backend = None
+
+    def reusable(self, backend: InferenceBackend, prompt_tokens: List[int]) -> int:
+        """Number of leading prompt tokens the cache already holds for ``backend``."""
+        if self.cache is None or backend is not self._backend:
+            return 0
+        return common_prefix_length(self.tokens, prompt_tokens)
+
+    def restore(self, backend: InferenceBackend, cache: Any, tokens: List[int]) -> None:
+        """Replace the cache with one loaded from a snapshot holding ``tokens``."""
+        self.cache = cache
+        self.tokens = list(tokens)
+        self._backend = backend
+
+    def fetch(self, backend: InferenceBackend, prompt_tokens: List[int]) -> List[int]:
+        """
+        Prepare the cache for a new prompt.
+
+        Args:
+            backend: The loaded inference backend that owns the cache.
+            prompt_tokens: The full tokenized prompt for this turn.
+
+        Returns:
+            The suffix of ``prompt_tokens`` that still needs to be prefilled.
+        """
+        if self.cache is None or backend is not self._backend:
+            self.cache = backend.make_cache()
+            self.tokens = []
+            self._backend = backend
+
+        prefix = common_prefix_length(self.tokens, prompt_tokens)
+        # Always feed at least one token so the model produces fresh logits
+        prefix = min(prefix, len(prompt_tokens) - 1)
+
+        stale = len(self.tokens) - prefix
+        if stale > 0 and not backend.trim_cache(self.cache, stale):
+            self.cache = backend.make_cache()
+            prefix = 0
+
+        self.tokens = list(prompt_tokens)
+        return prompt_tokens[prefix:]
+
+    def extend(self, tokens: List[int]) -> None:
+        """Record generated tokens that the model has written into the cache."""
+        self.tokens.extend(tokens)
+
+    def sync(self) -> None:
+        """
+        Reconcile the tracked tokens with the cache's actual length.
+
+        Generation may stop before the last sampled token is written (or after
+        an EOS token that is never yielded), so the cache offset is the
+        source of truth once a turn has finished.
+        """
+        if self.cache is None:
+            return
+        offset = self._backend.cache_length(self.cache)
+        if offset is None:
+            return
+        if offset > len(self.tokens):
+            if not self._backend.trim_cache(self.cache, offset - len(self.tokens)):
+                self.reset()
+        elif offset < len(self.tokens):
+            self.tokens = self.tokens[:offset]
@@ -0,0 +1,130 @@
+"""
+Model Residency
+
+Decides when the loaded model should give its memory back: after a quiet
+period, or sooner when the system is running out of memory. The next
+request reloads it (see LLMWrapper.unload()).
+"""
+
+import ctypes
+import ctypes.util
+import sys
+from typing import Callable, Optional
+
+from src.config import (
+    IDLE_UNLOAD_MINUTES,
+    MEMORY_PRESSURE_UNLOAD,
+    MEMORY_PRESSURE_STALL_PERCENT,
+    MEMORY_PRESSURE_GRACE_SECONDS,
+)
+
+
+# Unload reasons
+IDLE = "idle"
+MEMORY_PRESSURE = "memory pressure"
+
+# kern.memorystatus_vm_pressure_level values: 1 normal, 2 warning, 4 critical
+_DARWIN_PRESSURE_WARNING = 2
+
+_libc = None
+
+
+def _darwin_memory_pressure() -> Optional[bool]:
+    """Whether the kernel's VM pressure level is at warning or critical."""
+    global _libc
+    try:
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        level = ctypes.c_int()
+        size = ctypes.c_size_t(ctypes.sizeof(level))
+        if _libc.sysctlbyname(
+            b"kern.memorystatus_vm_pressure_level", ctypes.byref(level), ctypes.byref(size), None, 0
+        ):
+            return None
+    except (OSError, AttributeError, TypeError):
+        return None
+    return level.value >= _DARWIN_PRESSURE_WARNING
+
+
+def _linux_memory_pressure(
+    path: str = "/proc/pressure/memory",
+    stall_percent: float = MEMORY_PRESSURE_STALL_PERCENT,
+) -> Optional[bool]:
+    """Whether tasks stalled on memory for ``stall_percent`` of the last 10 s (PSI)."""
+    try:
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                kind, *fields = line.split()
+                if kind == "some":
+                    averages = dict(field.split("=", 1) for field in fields)
+                    return float(averages["avg10"]) >= stall_percent
+    except (OSError, KeyError, ValueError):
+        return None
+    return None
+
+
+def memory_pressure() -> Optional[bool]:
+    """
+    Whether the OS reports that memory is short.
+
+    Both signals come from the kernel reclaiming memory under contention
+    rather than from how much is in use, so a model filling most of RAM
+    on its own does not count as pressure.
+
+    Returns:
+        True or False, or None if the OS does not report it.
+    """
+    if sys.platform == "darwin":
+        return _darwin_memory_pressure()
+    if sys.platform.startswith("linux"):
+        return _linux_memory_pressure()
+    return None
+
+
+class IdlePolicy:
+    """
+    When to unload an idle model.
+
+    The model is unloaded once nothing has used it for ``idle_minutes``,
+    or once the OS reports memory pressure and the model has been idle for
+    at least ``pressure_grace_seconds`` (so it is never released between
+    the turns of an active conversation).
+    """
+
+    def __init__(
+        self,
+        idle_minutes: float = IDLE_UNLOAD_MINUTES,
+        unload_on_pressure: bool = MEMORY_PRESSURE_UNLOAD,
+        pressure_grace_seconds: float = MEMORY_PRESSURE_GRACE_SECONDS,
+        read_pressure: Callable[[], Optional[bool]] = memory_pressure,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            idle_minutes: Quiet period before unloading (0 to never unload when idle).
+            unload_on_pressure: Unload early when the OS reports memory pressure.
+            pressure_grace_seconds: Minimum idle time before a memory pressure unload.
+            read_pressure: Reads the OS memory pressure signal; swappable for testing.
+        """
+        self.idle_minutes = idle_minutes
+        self.unload_on_pressure = unload_on_pressure
+        self.pressure_grace_seconds = pressure_grace_seconds
+        self.read_pressure = read_pressure
+
+    def check(self, idle_seconds: float) -> Optional[str]:
+        """
+        Decide whether to unload now.
+
+        Args:
+            idle_seconds: Time since the model was last used (0 while it is busy).
+
+        Returns:
+            IDLE or MEMORY_PRESSURE, or None to keep the model loaded.
+        """
+        if self.idle_minutes and idle_seconds >= self.idle_minutes * 60:
+            return IDLE
+        if self.unload_on_pressure and idle_seconds >= self.pressure_grace_seconds:
+            if self.read_pressure():
+                return MEMORY_PRESSURE
+        return None
@@ -0,0 +1,161 @@
+"""
+Response Cache
+
+Remembers answers to exact prompts so asking the same question again (a
+canned prompt, or the first question after New Chat) replays the answer
+instead of prefilling and decoding it.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from src.config import RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES
+
+
+@dataclass
+class CachedResponse:
+    """A stored answer, as the pieces originally streamed to the callback."""
+
+    pieces: List[str] = field(default_factory=list)
+    finish_reason: Optional[str] = None
+    generated_tokens: int = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.pieces)
+
+
+class ResponseCache:
+    """
+    SQLite store of answers keyed by everything that determines them.
+
+    The key hashes the backend, model ID, fully rendered prompt (system
+    prompt, summary, history, question and search context), the search
+    context on its own, and the sampler settings, so any change to them is
+    a miss. The store is capped at ``max_entries`` rows, evicting the least
+    recently used. Whether a generation may use the cache at all (only
+    deterministic sampling, unless opted in) is the caller's decision.
+    """
+
+    def __init__(self, path: Optional[str] = RESPONSE_CACHE_PATH, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        """
+        Initialize the cache. The database is opened on first use.
+
+        Args:
+            path: SQLite file, or None/":memory:" for a non-persistent cache.
+            max_entries: Maximum number of answers kept.
+        """
+        self.path = path or ":memory:"
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is not None:
+            return self._db
+        try:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = self._open(self.path)
+        except (OSError, sqlite3.Error):
+            # An unusable cache directory must never break generation
+            self._db = self._open(":memory:")
+        return self._db
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, pieces TEXT NOT NULL, finish_reason TEXT, "
+            "generated_tokens INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS responses_by_access ON responses(accessed)")
+        db.commit()
+        return db
+
+    @staticmethod
+    def make_key(
+        backend: str,
+        model_id: str,
+        prompt: str,
+        temperature: float,
+        top_p: float,
+        max_tokens: int,
+        stop_sequences: List[str],
+        context: Optional[str] = None,
+    ) -> str:
+        """Hash everything that determines an answer."""
+        ident = json.dumps(
+            [backend, model_id, prompt, context, temperature, top_p, max_tokens, list(stop_sequences)],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Look up an answer, marking it recently used."""
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT pieces, finish_reason, generated_tokens FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            self.hits += 1
+            return CachedResponse(json.loads(row[0]), row[1], row[2])
+
+    def contains(self, key: str) -> bool:
+        """Whether an answer is stored, without counting a lookup."""
+        with self._lock:
+            row = self._connect().execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        """Store an answer, evicting the least recently used beyond ``max_entries``."""
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, pieces, finish_reason, generated_tokens, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(response.pieces), response.finish_reason, response.generated_tokens, now, now),
+            )
+            db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            db.commit()
+
+    def clear(self) -> None:
+        """Remove all answers and reset the counters."""
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM responses")
+            db.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of stored answers."""
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
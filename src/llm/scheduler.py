@@ -0,0 +1,431 @@
+"""
+Batch Scheduler
+
+Lets several conversations share one loaded model. A single engine thread
+owns the backend: it decodes every active sequence together through the
+backend's BatchDecoder, admits new requests between decode steps and
+prefills long prompts in chunks, so a new question starts without stalling
+the answers already streaming.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from src.config import BATCH_MAX_SIZE, BATCH_MAX_PER_SESSION, BATCH_PREFILL_CHUNK_TOKENS
+from src.llm.backends import GenerationChunk, InferenceBackend
+from src.llm.backends.base import BatchDecoder
+from src.tracing import get_tracer
+
+
+# Request kinds
+_STREAM = "stream"
+_PREFILL = "prefill"
+_CALL = "call"
+
+
+@dataclass(eq=False)
+class _Request:
+    kind: str
+    session: Hashable = None
+    tokens: List[int] = field(default_factory=list)
+    cache: Any = None
+    max_tokens: int = 0
+    sampling: Tuple[float, float] = (0.0, 1.0)  # (temperature, top_p)
+    fn: Optional[Callable[[], Any]] = None
+    seq_id: int = 0
+    prefilled: int = 0  # Leading tokens already written to the cache
+    result: Any = None
+    error: Optional[BaseException] = None
+    chunks: "queue.Queue" = field(default_factory=queue.Queue)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    done: threading.Event = field(default_factory=threading.Event)
+
+    def to_prefill(self) -> List[int]:
+        """Prompt tokens the scheduler prefills itself; a stream's last token goes to the decoder."""
+        return self.tokens[:-1] if self.kind == _STREAM else self.tokens
+
+
+class _Stream:
+    """Iterator over a scheduled generation; closing it cancels the request."""
+
+    def __init__(self, scheduler: "BatchScheduler", request: _Request):
+        self._scheduler = scheduler
+        self._request = request
+        self._finished = False
+
+    def __iter__(self) -> "_Stream":
+        return self
+
+    def __next__(self) -> GenerationChunk:
+        if self._finished:
+            raise StopIteration
+        item = self._request.chunks.get()
+        if isinstance(item, BaseException):
+            self._finished = True
+            self._request.done.wait()
+            raise item
+        if item.finish_reason is not None:
+            self._finished = True
+            self._request.done.wait()
+        return item
+
+    def close(self) -> None:
+        """Stop generating; returns once the request's cache is no longer being written."""
+        self._finished = True
+        self._scheduler._cancel(self._request)
+
+
+class BatchScheduler:
+    """
+    Continuous batching over one backend.
+
+    Sequences from all sessions are decoded together, up to the batch size,
+    with one decoder per sampling setting. Between steps the engine runs
+    queued calls, admits waiting requests round-robin across sessions (each
+    session holding at most ``max_per_session`` decode slots) and prefills
+    at most ``prefill_chunk_tokens`` prompt tokens. Finished and cancelled
+    sequences leave at once, so their slots are reused on the next step.
+
+    Each request works on the caller's own cache, which holds the prompt
+    and the tokens generated once the request is done, exactly as after
+    backend.stream(). Callers must not touch a cache while a request on it
+    is running.
+    """
+
+    def __init__(
+        self,
+        backend: InferenceBackend,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_per_session: int = BATCH_MAX_PER_SESSION,
+        prefill_chunk_tokens: int = BATCH_PREFILL_CHUNK_TOKENS,
+    ):
+        """
+        Initialize the scheduler. The engine thread starts on first use.
+
+        Args:
+            backend: Backend shared by every session (loaded through call()).
+            max_batch_size: Sequences decoded together, capped by the backend's own limit.
+            max_per_session: Decode slots one session may hold at once.
+            prefill_chunk_tokens: Prompt tokens prefilled between two decode steps.
+        """
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_per_session = max(1, max_per_session)
+        self.prefill_chunk_tokens = max(1, prefill_chunk_tokens)
+        self._cond = threading.Condition()
+        self._calls: Deque[_Request] = deque()
+        self._waiting: List[_Request] = []  # Streams and prefills not yet admitted, oldest first
+        self._prefilling: Deque[_Request] = deque()
+        self._decoding: Dict[int, _Request] = {}  # By seq_id
+        self._decoders: Dict[Tuple[float, float], BatchDecoder] = {}
+        self._seq_ids = itertools.count(1)
+        self._last_session: Hashable = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # Counters
+        self.steps = 0
+        self.decoded_tokens = 0
+        self.prefilled_tokens = 0
+        self.decode_seconds = 0.0
+
+    # ------------------------------------------------------------------
+    # Public API (any thread)
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the engine thread (done automatically on first use)."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Cancel everything outstanding and stop the engine thread."""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+
+    def stream(
+        self,
+        tokens: List[int],
+        cache: Any,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+        session: Hashable = None,
+    ) -> Iterator[GenerationChunk]:
+        """
+        Generate like backend.stream(), sharing decode steps with other sessions.
+
+        Args:
+            tokens: Prompt tokens not yet in ``cache`` (at least one).
+            cache: The session's cache.
+            max_tokens: Maximum tokens to generate.
+            temperature: Sampling temperature.
+            top_p: Top-p (nucleus) sampling parameter.
+            session: Key used for fair admission and the per-session slot limit.
+
+        Returns:
+            Iterator of chunks; the last carries a ``finish_reason``. Closing
+            it early cancels the request.
+        """
+        request = _Request(
+            _STREAM, session, list(tokens), cache, max_tokens, (temperature, top_p),
+            seq_id=next(self._seq_ids),
+        )
+        self._submit(request)
+        return _Stream(self, request)
+
+    def prefill(self, tokens: List[int], cache: Any, session: Hashable = None) -> None:
+        """Write prompt tokens into a cache, in chunks between other sessions' decode steps."""
+        if not tokens:
+            return
+        self._wait(self._submit(_Request(_PREFILL, session, list(tokens), cache)))
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """
+        Run ``fn`` on the engine thread between two decode steps.
+
+        Used for anything else that touches the engine (loading, cache
+        snapshots), so it never runs concurrently with a step.
+        """
+        if threading.current_thread() is self._thread:
+            return fn()
+        return self._wait(self._submit(_Request(_CALL, fn=fn)))
+
+    def stats(self) -> dict:
+        """Counters since the scheduler was created."""
+        with self._cond:
+            return {
+                "steps": self.steps,
+                "decoded_tokens": self.decoded_tokens,
+                "prefilled_tokens": self.prefilled_tokens,
+                "decode_seconds": round(self.decode_seconds, 4),
+                "mean_batch_size": round(self.decoded_tokens / self.steps, 3) if self.steps else 0.0,
+                "active": len(self._decoding) + len(self._prefilling),
+                "waiting": len(self._waiting),
+            }
+
+    # ------------------------------------------------------------------
+    # Request plumbing
+    # ------------------------------------------------------------------
+
+    def _submit(self, request: _Request) -> _Request:
+        self.start()
+        with self._cond:
+            if request.kind == _CALL:
+                self._calls.append(request)
+            else:
+                self._waiting.append(request)
+            self._cond.notify_all()
+        return request
+
+    @staticmethod
+    def _wait(request: _Request) -> Any:
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _cancel(self, request: _Request) -> None:
+        if request.done.is_set():
+            return
+        with self._cond:
+            request.cancelled.set()
+            self._cond.notify_all()
+        request.done.wait()
+
+    def _finish(self, request: _Request, error: Optional[BaseException] = None) -> None:
+        """Mark a request done (engine thread only)."""
+        if error is not None:
+            request.error = error
+            if request.kind == _STREAM:
+                request.chunks.put(error)
+        request.done.set()
+
+    # ------------------------------------------------------------------
+    # Engine thread
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and not (
+                    self._calls or self._waiting or self._prefilling or self._decoding
+                ):
+                    self._cond.wait()
+                if not self._running:
+                    break
+                calls = list(self._calls)
+                self._calls.clear()
+            for request in calls:
+                try:
+                    request.result = request.fn()
+                except BaseException as e:
+                    self._finish(request, e)
+                else:
+                    self._finish(request)
+            self._drop_cancelled()
+            self._admit()
+            self._prefill_chunk()
+            self._step()
+        self._shutdown()
+
+    def _drop_cancelled(self) -> None:
+        """Settle cancelled requests; their caches keep what was written so far."""
+        with self._cond:
+            waiting = [r for r in self._waiting if r.cancelled.is_set()]
+            self._waiting = [r for r in self._waiting if not r.cancelled.is_set()]
+        for request in waiting:
+            self._finish(request)
+        for request in [r for r in self._prefilling if r.cancelled.is_set()]:
+            self._prefilling.remove(request)
+            self._finish(request)
+        for request in [r for r in self._decoding.values() if r.cancelled.is_set()]:
+            del self._decoding[request.seq_id]
+            decoder = self._decoders.get(request.sampling)
+            try:
+                if decoder is not None:
+                    decoder.remove(request.seq_id)
+            except Exception as e:
+                self._fail_decoder(request.sampling, e)
+                self._finish(request, e)
+            else:
+                self._finish(request)
+
+    def _slots_used(self, session: Hashable) -> int:
+        active = itertools.chain(self._prefilling, self._decoding.values())
+        return sum(1 for r in active if r.kind == _STREAM and r.session == session)
+
+    def _admit(self) -> None:
+        """Move waiting requests into prefill, taking sessions in turn."""
+        with self._cond:
+            while self._waiting:
+                sessions = list(dict.fromkeys(r.session for r in self._waiting))
+                # Start with the session after the one admitted last
+                if self._last_session in sessions:
+                    i = sessions.index(self._last_session) + 1
+                    sessions = sessions[i:] + sessions[:i]
+                limit = min(self.max_batch_size, self.backend.max_batch_size)
+                busy = sum(1 for r in self._prefilling if r.kind == _STREAM) + len(self._decoding)
+                chosen = None
+                for session in sessions:
+                    request = next(r for r in self._waiting if r.session == session)
+                    if request.kind == _STREAM and (
+                        busy >= limit
+                        or self._slots_used(session) >= self.max_per_session
+                    ):
+                        continue
+                    chosen = request
+                    break
+                if chosen is None:
+                    return
+                self._waiting.remove(chosen)
+                self._prefilling.append(chosen)
+                self._last_session = chosen.session
+
+    def _prefill_chunk(self) -> None:
+        """Prefill up to ``prefill_chunk_tokens`` tokens, round-robin over admitted requests."""
+        budget = self.prefill_chunk_tokens
+        for _ in range(len(self._prefilling)):
+            request = self._prefilling.popleft()
+            tokens = request.to_prefill()
+            chunk = tokens[request.prefilled:request.prefilled + budget]
+            if chunk:
+                try:
+                    with get_tracer().span("prefill_chunk", tokens=len(chunk), session=str(request.session)):
+                        self.backend.prefill(chunk, request.cache)
+                except BaseException as e:
+                    self._finish(request, e)
+                    continue
+                request.prefilled += len(chunk)
+                budget -= len(chunk)
+                with self._cond:
+                    self.prefilled_tokens += len(chunk)
+            if request.prefilled < len(tokens):
+                self._prefilling.append(request)
+            elif request.kind == _PREFILL:
+                self._finish(request)
+            else:
+                self._start_decoding(request)
+            if budget <= 0:
+                break
+
+    def _start_decoding(self, request: _Request) -> None:
+        decoder = self._decoders.get(request.sampling)
+        try:
+            if decoder is None:
+                decoder = self.backend.batch_decoder(*request.sampling)
+                self._decoders[request.sampling] = decoder
+            decoder.insert(request.seq_id, request.tokens[-1:], request.cache, request.max_tokens)
+        except BaseException as e:
+            self._finish(request, e)
+            return
+        self._decoding[request.seq_id] = request
+
+    def _step(self) -> None:
+        """Advance every decoder by one step and route the chunks."""
+        for sampling, decoder in list(self._decoders.items()):
+            if not len(decoder):
+                decoder.close()
+                del self._decoders[sampling]
+                continue
+            start = time.perf_counter()
+            try:
+                chunks = decoder.step()
+            except BaseException as e:
+                self._fail_decoder(sampling, e)
+                continue
+            with self._cond:
+                self.decode_seconds += time.perf_counter() - start
+                if chunks:
+                    self.steps += 1
+                    self.decoded_tokens += len(chunks)
+            for seq_id, chunk in chunks:
+                request = self._decoding.get(seq_id)
+                if request is None:
+                    continue
+                request.chunks.put(chunk)
+                if chunk.finish_reason is not None:
+                    del self._decoding[seq_id]
+                    self._finish(request)
+
+    def _fail_decoder(self, sampling: Tuple[float, float], error: BaseException) -> None:
+        """An engine error leaves the batch unusable: fail its sequences and drop it."""
+        decoder = self._decoders.pop(sampling, None)
+        for request in [r for r in self._decoding.values() if r.sampling == sampling]:
+            del self._decoding[request.seq_id]
+            self._finish(request, error)
+        if decoder is not None:
+            try:
+                decoder.close()
+            except Exception:
+                pass
+
+    def _shutdown(self) -> None:
+        """Cancel everything left when the scheduler stops."""
+        error = RuntimeError("Batch scheduler stopped")
+        with self._cond:
+            pending = list(self._calls) + self._waiting
+            self._calls.clear()
+            self._waiting = []
+        for request in pending + list(self._prefilling) + list(self._decoding.values()):
+            self._finish(request, error)
+        self._prefilling.clear()
+        self._decoding.clear()
+        for decoder in self._decoders.values():
+            try:
+                decoder.close()
+            except Exception:
+                pass
+        self._decoders.clear()
@@ -0,0 +1,338 @@
+"""
+KV Cache Snapshots
+
+Saves prompt caches to disk so the system prompt and each conversation's
+latest state survive restarts: resuming only prefills the tokens after the
+snapshot instead of the whole prompt.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import SNAPSHOT_DIR, SNAPSHOT_MAX_BYTES, SNAPSHOT_MIN_TOKENS
+from src.llm.backends import InferenceBackend
+from src.llm.prompt_cache import common_prefix_length
+from src.tracing import get_tracer
+
+
+# Bumped whenever the file layout changes; older snapshots are discarded
+FORMAT_VERSION = 1
+
+# Sidecar holding a snapshot's metadata and tokens
+META_SUFFIX = ".meta.json"
+
+# Snapshot kinds
+SYSTEM = "system"
+SESSION = "session"
+
+
+def hash_tokens(tokens: List[int]) -> str:
+    """Stable hash of a token sequence."""
+    return hashlib.sha256(array("I", tokens).tobytes()).hexdigest()
+
+
+@dataclass
+class Snapshot:
+    """Index entry for a saved cache; ``tokens`` are the tokens it holds."""
+
+    key: str
+    backend: str
+    model_id: str
+    fingerprint: str
+    kind: str
+    tokens: List[int]
+    data_path: str
+    meta_path: str
+    size: int
+    used: float
+
+    def matches(self, backend: str, model_id: str, fingerprint: str) -> bool:
+        """Whether the snapshot was made by this backend, model and tokenizer."""
+        return (self.backend, self.model_id, self.fingerprint) == (backend, model_id, fingerprint)
+
+
+class SnapshotStore:
+    """
+    Directory of KV cache snapshots.
+
+    Each snapshot is the backend's cache file (safetensors for MLX) plus a
+    JSON sidecar naming the backend, model ID, tokenizer fingerprint and the
+    exact tokens held, and a hash of those tokens that also names the
+    files. A snapshot is only offered for a prompt that starts with (part
+    of) its tokens, and only to the same backend, model and tokenizer;
+    snapshots from an older format or another tokenizer for the same model
+    are deleted, as are files that fail to load. The directory is capped at
+    ``max_bytes``, evicting the least recently used snapshots.
+    """
+
+    def __init__(
+        self,
+        directory: str = SNAPSHOT_DIR,
+        max_bytes: int = SNAPSHOT_MAX_BYTES,
+        min_tokens: int = SNAPSHOT_MIN_TOKENS,
+    ):
+        """
+        Initialize the store. Nothing is read or created until first use.
+
+        Args:
+            directory: Where snapshots are kept.
+            max_bytes: Total size of the directory before eviction.
+            min_tokens: Tokens a snapshot must save over the live cache to be loaded.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_tokens = min_tokens
+        self.hits = 0
+        self.misses = 0
+        self._index: Optional[Dict[str, Snapshot]] = None
+        self._lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, Snapshot]:
+        """Read the sidecars once, dropping unreadable and orphaned files."""
+        if self._index is not None:
+            return self._index
+        self._index = {}
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return self._index
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if ".tmp" in name:
+                self._remove(path)
+                continue
+            if not name.endswith(META_SUFFIX):
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                data_path = os.path.join(self.directory, meta["file"])
+                snapshot = Snapshot(
+                    key=name[:-len(META_SUFFIX)],
+                    backend=meta["backend"],
+                    model_id=meta["model_id"],
+                    fingerprint=meta["fingerprint"],
+                    kind=meta["kind"],
+                    tokens=meta["tokens"],
+                    data_path=data_path,
+                    meta_path=path,
+                    size=os.path.getsize(data_path) + os.path.getsize(path),
+                    used=os.path.getmtime(data_path),
+                )
+                if meta["version"] != FORMAT_VERSION or hash_tokens(snapshot.tokens) != meta["tokens_hash"]:
+                    raise ValueError("stale snapshot")
+            except (OSError, ValueError, KeyError, TypeError):
+                self._remove(path)
+                continue
+            self._index[snapshot.key] = snapshot
+        # Data files without a sidecar cannot be used
+        known = {os.path.basename(s.data_path) for s in self._index.values()}
+        for name in names:
+            if not name.endswith(META_SUFFIX) and ".tmp" not in name and name not in known:
+                self._remove(os.path.join(self.directory, name))
+        return self._index
+
+    def _key(self, backend: str, model_id: str, fingerprint: str, tokens: List[int]) -> str:
+        ident = f"{FORMAT_VERSION}\0{backend}\0{model_id}\0{fingerprint}\0{hash_tokens(tokens)}"
+        return hashlib.sha256(ident.encode("utf-8")).hexdigest()[:32]
+
+    def _discard(self, snapshot: Snapshot) -> None:
+        self._index.pop(snapshot.key, None)
+        self._remove(snapshot.data_path)
+        self._remove(snapshot.meta_path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _drop_stale(self, backend: str, model_id: str, fingerprint: str) -> None:
+        """Delete this model's snapshots made with a different tokenizer."""
+        for snapshot in list(self._index.values()):
+            if (snapshot.backend, snapshot.model_id) == (backend, model_id) and snapshot.fingerprint != fingerprint:
+                self._discard(snapshot)
+
+    def load(
+        self,
+        backend: InferenceBackend,
+        model_id: str,
+        fingerprint: str,
+        prompt_tokens: List[int],
+        reusable: int = 0,
+    ) -> Optional[Tuple[Any, List[int]]]:
+        """
+        Load the snapshot sharing the longest prefix with a prompt.
+
+        Args:
+            backend: Loaded backend to create the cache with.
+            model_id: Model the backend has loaded.
+            fingerprint: The backend's tokenizer fingerprint.
+            prompt_tokens: The prompt about to be prefilled.
+            reusable: Prompt tokens the live cache already holds; a snapshot
+                must cover at least ``min_tokens`` more to be worth loading.
+
+        Returns:
+            ``(cache, tokens)`` for the snapshot, or None. The caller trims
+            the cache to the shared prefix.
+        """
+        with self._lock:
+            index = self._scan()
+            self._drop_stale(backend.name, model_id, fingerprint)
+            best, best_shared = None, reusable + self.min_tokens - 1
+            for snapshot in index.values():
+                if len(snapshot.tokens) <= best_shared or not snapshot.matches(backend.name, model_id, fingerprint):
+                    continue
+                shared = common_prefix_length(snapshot.tokens, prompt_tokens)
+                if shared > best_shared:
+                    best, best_shared = snapshot, shared
+            if best is None:
+                self.misses += 1
+                return None
+
+            with get_tracer().span("snapshot_load", tokens=len(best.tokens), bytes=best.size) as span:
+                try:
+                    cache = backend.load_cache(best.data_path)
+                    length = backend.cache_length(cache)
+                    if length is not None and length != len(best.tokens):
+                        raise ValueError("snapshot length does not match its tokens")
+                except Exception as e:
+                    # Truncated, corrupt or incompatible: never try it again
+                    span.set(error=type(e).__name__)
+                    self._discard(best)
+                    self.misses += 1
+                    return None
+            self.hits += 1
+            self._touch(best)
+            return cache, list(best.tokens)
+
+    def save(
+        self,
+        backend: InferenceBackend,
+        model_id: str,
+        fingerprint: str,
+        cache: Any,
+        tokens: List[int],
+        kind: str = SESSION,
+    ) -> bool:
+        """
+        Save a cache holding exactly ``tokens``.
+
+        Saving a session snapshot replaces older session snapshots whose
+        tokens it extends (earlier states of the same conversation).
+
+        Args:
+            backend: Backend that owns the cache.
+            model_id: Model the backend has loaded.
+            fingerprint: The backend's tokenizer fingerprint.
+            cache: The cache to write.
+            tokens: Tokens held in the cache.
+            kind: SYSTEM for the system prompt (never replaced) or SESSION.
+
+        Returns:
+            True if the snapshot is on disk afterwards.
+        """
+        with self._lock:
+            index = self._scan()
+            key = self._key(backend.name, model_id, fingerprint, tokens)
+            if key in index:
+                self._touch(index[key])
+                return True
+
+            os.makedirs(self.directory, exist_ok=True)
+            suffix = backend.cache_file_suffix
+            data_path = os.path.join(self.directory, key + suffix)
+            meta_path = os.path.join(self.directory, key + META_SUFFIX)
+            tmp_data = os.path.join(self.directory, key + ".tmp" + suffix)
+            tmp_meta = os.path.join(self.directory, key + ".tmp" + META_SUFFIX)
+            meta = {
+                "version": FORMAT_VERSION,
+                "backend": backend.name,
+                "model_id": model_id,
+                "fingerprint": fingerprint,
+                "kind": kind,
+                "file": key + suffix,
+                "tokens_hash": hash_tokens(tokens),
+                "tokens": tokens,
+                "created": time.time(),
+            }
+            with get_tracer().span("snapshot_save", tokens=len(tokens), kind=kind) as span:
+                try:
+                    backend.save_cache(cache, tmp_data)
+                    with open(tmp_meta, "w", encoding="utf-8") as f:
+                        json.dump(meta, f)
+                    # The data file goes first: a sidecar only ever names a complete file
+                    os.replace(tmp_data, data_path)
+                    os.replace(tmp_meta, meta_path)
+                except BaseException:
+                    self._remove(tmp_data)
+                    self._remove(tmp_meta)
+                    raise
+                size = os.path.getsize(data_path) + os.path.getsize(meta_path)
+                span.set(bytes=size)
+
+            snapshot = Snapshot(
+                key=key,
+                backend=backend.name,
+                model_id=model_id,
+                fingerprint=fingerprint,
+                kind=kind,
+                tokens=list(tokens),
+                data_path=data_path,
+                meta_path=meta_path,
+                size=size,
+                used=time.time(),
+            )
+            if kind == SESSION:
+                for other in list(index.values()):
+                    if (
+                        other.kind == SESSION
+                        and other.matches(backend.name, model_id, fingerprint)
+                        and len(other.tokens) < len(tokens)
+                        and tokens[:len(other.tokens)] == other.tokens
+                    ):
+                        self._discard(other)
+            index[key] = snapshot
+            self._evict()
+            return key in index
+
+    def _touch(self, snapshot: Snapshot) -> None:
+        """Mark a snapshot as recently used (the data file's mtime survives restarts)."""
+        snapshot.used = time.time()
+        try:
+            os.utime(snapshot.data_path, (snapshot.used, snapshot.used))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """Delete least recently used snapshots until the directory fits the cap."""
+        total = sum(s.size for s in self._index.values())
+        for snapshot in sorted(self._index.values(), key=lambda s: s.used):
+            if total <= self.max_bytes:
+                break
+            total -= snapshot.size
+            self._discard(snapshot)
+
+    def clear(self) -> None:
+        """Delete every snapshot."""
+        with self._lock:
+            for snapshot in list(self._scan().values()):
+                self._discard(snapshot)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the directory's size."""
+        with self._lock:
+            index = self._scan()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "snapshots": len(index),
+                "bytes": sum(s.size for s in index.values()),
+            }
@@ -0,0 +1,86 @@
+"""
+Stopping Module
+
+Stop-sequence matching and cancellation for streamed generation.
+"""
+
+import threading
+from typing import Iterable
+
+
+class CancelToken:
+    """
+    Thread-safe flag used to abort a generation in progress.
+
+    The UI thread calls cancel(); the decode loop checks ``cancelled``
+    after every step and stops as soon as it is set.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Request cancellation."""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancellation has been requested."""
+        return self._event.is_set()
+
+
+class StopSequenceMatcher:
+    """
+    Detects stop sequences in streamed text, across token boundaries.
+
+    Text that could be the start of a stop sequence is held back until the
+    next chunk shows whether it completes one, so a stop sequence is never
+    emitted, even partially.
+    """
+
+    def __init__(self, stop_sequences: Iterable[str]):
+        """
+        Initialize the matcher.
+
+        Args:
+            stop_sequences: Strings that end generation when they appear.
+        """
+        self.stop_sequences = [s for s in stop_sequences if s]
+        self._max_len = max((len(s) for s in self.stop_sequences), default=0)
+        self._pending = ""
+        self.stopped = False
+
+    def feed(self, text: str) -> str:
+        """
+        Add streamed text.
+
+        Returns:
+            The part of the text that is safe to emit. After a stop sequence
+            is found, ``stopped`` is set and everything from it on is dropped.
+        """
+        if self.stopped:
+            return ""
+        buffer = self._pending + text
+
+        hits = [i for i in (buffer.find(s) for s in self.stop_sequences) if i >= 0]
+        if hits:
+            self.stopped = True
+            self._pending = ""
+            return buffer[:min(hits)]
+
+        hold = self._partial_match_length(buffer)
+        self._pending = buffer[len(buffer) - hold:]
+        return buffer[:len(buffer) - hold]
+
+    def flush(self) -> str:
+        """Return text held back at the end of generation."""
+        text, self._pending = self._pending, ""
+        return text
+
+    def _partial_match_length(self, buffer: str) -> int:
+        """Length of the longest suffix of ``buffer`` that starts a stop sequence."""
+        for length in range(min(len(buffer), self._max_len - 1), 0, -1):
+            tail = buffer[-length:]
+            if any(s.startswith(tail) for s in self.stop_sequences):
+                return length
+        return 0
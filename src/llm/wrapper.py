@@ -1,14 +1,38 @@
 """
 LLM Wrapper Module
 
-Provides a wrapper class for the MLX-LM inference engine.
+Provides a wrapper class around a pluggable inference backend (MLX by default).
 """
 
-from typing import Optional, Callable, List, Dict
-import mlx_lm
-from mlx_lm.sample_utils import make_sampler
+import threading
+import time
+from contextlib import closing
+from typing import Any, Iterator, Optional, Callable, List, Dict, Union
 
-from src.config import MODEL_ID, MAX_TOKENS, TEMPERATURE, TOP_P
+from src.config import (
+    MAX_TOKENS,
+    TEMPERATURE,
+    TOP_P,
+    STOP_SEQUENCES,
+    CONTEXT_WINDOW,
+    INFERENCE_BACKEND,
+    SEARCH_CONTEXT_TOKENS,
+    WARMUP_TOKENS,
+    COMPACTION_ENABLED,
+    SNAPSHOT_ENABLED,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SAMPLED,
+    SPECULATIVE_PREFILL_CHUNK_TOKENS,
+)
+from src.llm.backends import GenerationChunk, InferenceBackend, get_backend
+from src.llm.compaction import ConversationCompactor
+from src.llm.history import HistoryManager, format_message
+from src.llm.prompt_cache import PromptCache
+from src.llm.response_cache import CachedResponse, ResponseCache
+from src.llm.scheduler import BatchScheduler
+from src.llm.snapshots import SnapshotStore, SYSTEM, SESSION
+from src.llm.stopping import CancelToken, StopSequenceMatcher
+from src.tracing import get_tracer
 
 
 SYSTEM_PROMPT = (
@@ -21,82 +45,753 @@ SYSTEM_PROMPT = (
 
 class LLMWrapper:
     """
-    Wrapper class for MLX-LM model inference.
+    Wrapper class for LLM inference.
     
     Handles model loading, prompt formatting, and text generation with conversation memory.
+    The KV cache is kept between turns so only newly appended tokens are prefilled,
+    and can be saved to disk as a snapshot so it also survives restarts.
+    Several wrappers can share one loaded model through a BatchScheduler,
+    each keeping its own conversation and cache. Deterministic answers are
+    kept in a response cache and replayed when the exact prompt recurs.
     """
     
-    def __init__(self, model_id: str = MODEL_ID):
+    def __init__(
+        self,
+        model_id: Optional[str] = None,
+        backend: Union[str, InferenceBackend, None] = None,
+        scheduler: Optional[BatchScheduler] = None,
+    ):
         """
         Initialize the LLM wrapper.
         
         Args:
-            model_id: Hugging Face model ID (default from config).
+            model_id: Model to load (default: the backend's configured model).
+            backend: Backend instance or name (default from config, or the scheduler's).
+            scheduler: Shares the backend with other wrappers; all engine
+                work then runs on the scheduler's thread, batched with theirs.
         """
-        self.model_id = model_id
-        self.model = None
-        self.tokenizer = None
+        self.scheduler = scheduler
+        if backend is None and scheduler is not None:
+            backend = scheduler.backend
+        # A backend named rather than given is created on first use, so its
+        # engine (e.g. mlx_lm) is not imported while the window opens
+        if backend is None or isinstance(backend, str):
+            self._backend_name = backend or INFERENCE_BACKEND
+            self._backend: Optional[InferenceBackend] = None
+        else:
+            self._backend_name = backend.name
+            self._backend = backend
+        self._backend_lock = threading.Lock()
+        self._model_id = model_id
         self._loaded = False
-        self.conversation_history: List[Dict[str, str]] = []
+        self._counting_tokens = False  # History is counted with the backend's tokenizer
+        self.history = HistoryManager()
+        self.compactor = ConversationCompactor()
+        self._summary_token_cache: tuple = ("", [])
+        self.prompt_cache = PromptCache()
+        # Saved KV caches; set to None to neither read nor write snapshots
+        self.snapshots: Optional[SnapshotStore] = SnapshotStore() if SNAPSHOT_ENABLED else None
+        self._snapshot_tokens: List[int] = []  # Tokens of the last snapshot saved or loaded
+        # Answers to exact prompts; set to None to always generate
+        self.response_cache: Optional[ResponseCache] = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+        self.cache_sampled_responses = RESPONSE_CACHE_SAMPLED  # Also cache temperature > 0 answers
+        self.last_response_cached = False  # Last answer was replayed from the response cache
+        self.last_prompt_tokens = 0
+        self.last_prefill_tokens = 0
+        self.last_generated_tokens = 0  # Answer tokens decoded, not counting a final EOS
+        # Speculative decoding: draft tokens proposed and accepted last turn
+        self.last_draft_proposed = 0
+        self.last_draft_accepted = 0
+        self.last_finish_reason: Optional[str] = None
+        # Model loads, reloads after an unload (e.g. when idle) and unloads
+        self.load_count = 0
+        self.reload_count = 0
+        self.unload_count = 0
+        self.last_load_seconds = 0.0  # Time the last load took
+        self._system_prompt = SYSTEM_PROMPT
+        self._system_prompt_tokens: Optional[List[int]] = None
+        # Serializes loading; a second caller waits for the in-flight load
+        self._load_lock = threading.Lock()
+        # Serializes use of the engine and the prompt cache
+        self._lock = threading.RLock()
+    
+    @property
+    def backend(self) -> InferenceBackend:
+        """The inference backend, created (and its engine imported) on first access."""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    with get_tracer().span("import_backend", backend=self._backend_name):
+                        self._backend = get_backend(self._backend_name)
+        return self._backend
+    
+    @property
+    def system_prompt(self) -> str:
+        """Text at the start of every prompt (Pixie's persona by default)."""
+        return self._system_prompt
+    
+    @system_prompt.setter
+    def system_prompt(self, text: Optional[str]) -> None:
+        text = text or SYSTEM_PROMPT
+        if text != self._system_prompt:
+            # The prompt cache keeps whatever prefix still matches
+            self._system_prompt = text
+            self._system_prompt_tokens = None
+    
+    @property
+    def model_id(self) -> str:
+        """Model to load (default: the backend's configured model)."""
+        return self._model_id or self.backend.default_model_id
+    
+    @model_id.setter
+    def model_id(self, model_id: Optional[str]) -> None:
+        self._model_id = model_id
     
     def load(self) -> None:
         """
         Load the model and tokenizer.
         
         This downloads the model on first run (~5-6GB for gemma-2-9b-it-4bit).
+        Safe to call from several threads: callers arriving while a load is
+        in progress join it instead of starting another. A backend shared
+        through the scheduler is only loaded by the first wrapper to need it.
         """
-        if self._loaded:
+        if self.is_loaded():
             return
         
-        print(f"Loading model: {self.model_id}")
-        print("This may take a few minutes on first run...")
+        with self._load_lock:
+            if self.is_loaded():
+                return
+            
+            def load_backend():
+                if self.backend.is_loaded():
+                    return
+                print(f"Loading model: {self.model_id}")
+                print("This may take a few minutes on first run...")
+                with get_tracer().span("load", backend=self.backend.name, model=self.model_id, reload=self.load_count > 0):
+                    self.backend.load(self.model_id)
+                print("Model loaded successfully!")
+            
+            start = time.perf_counter()
+            self._engine(load_backend)
+            self.last_load_seconds = time.perf_counter() - start
+            self.history.set_token_counter(self.count_tokens)
+            self._counting_tokens = True
+            if self.load_count:
+                self.reload_count += 1
+            self.load_count += 1
+            self._loaded = True
+    
+    def unload(self, reason: str = "requested") -> bool:
+        """
+        Release the model and any cached keys/values.
+        
+        The conversation is kept, and the prompt cache is saved as a snapshot
+        first, so the next load() resumes from disk instead of prefilling
+        the whole conversation again. A model shared through the scheduler
+        is released for every wrapper; each reloads it on its next request.
+        
+        Args:
+            reason: Why the model is released (recorded in the trace).
+        
+        Returns:
+            True if a loaded model was released.
+        """
+        with self._load_lock, self._lock:
+            if not self._loaded:
+                return False
+            with get_tracer().span("unload", reason=reason) as span:
+                span.set(snapshot=self.save_snapshot())
+                self.prompt_cache.reset()
+                self._engine(self.backend.unload)
+                self._loaded = False
+            self.unload_count += 1
+            return True
+    
+    def warmup(self, max_tokens: int = WARMUP_TOKENS) -> None:
+        """
+        Run a short throwaway generation, then prefill the system prompt.
+        
+        The first forward passes compile kernels and allocate buffers; doing
+        that ahead of time keeps the cost off the user's first message. The
+        warm-up uses a scratch cache so the session cache is left clean.
         
-        self.model, self.tokenizer = mlx_lm.load(self.model_id)
-        self._loaded = True
-        print("Model loaded successfully!")
+        Args:
+            max_tokens: Number of tokens to generate during warm-up.
+        """
+        if not self.is_loaded():
+            self.load()
+        
+        with self._lock:
+            scratch = self.backend.make_cache()
+            with closing(self._stream(
+                self.backend.tokenize("Hello!"),
+                scratch,
+                max_tokens=max_tokens,
+                temperature=0.0,
+                top_p=1.0,
+            )) as stream:
+                for _ in stream:
+                    pass
+            del scratch
+        
+        self.prefill_system_prompt()
+    
+    def prefill_system_prompt(self) -> int:
+        """
+        Prefill the fixed system prompt into the session's prompt cache.
+        
+        The system prompt is restored from its snapshot when there is one,
+        and snapshotted after the first prefill otherwise.
+        
+        Returns:
+            Number of tokens prefilled.
+        """
+        if not self.is_loaded():
+            self.load()
+        
+        with self._lock:
+            prefilled = self._prefill_tokens(self._system_tokens())
+            if self.prompt_cache.tokens == self._system_tokens():
+                self.save_snapshot(kind=SYSTEM)
+            return prefilled
     
     def is_loaded(self) -> bool:
-        """Check if the model is loaded."""
-        return self._loaded
+        """Check if the model is loaded (another wrapper may have unloaded a shared backend)."""
+        return self._loaded and self.backend.is_loaded()
+    
+    def _engine(self, fn: Callable[[], Any]) -> Any:
+        """Run engine work, on the scheduler's thread when the backend is shared."""
+        if self.scheduler is None:
+            return fn()
+        return self.scheduler.call(fn)
+    
+    def _stream(
+        self,
+        tokens: List[int],
+        cache: Any,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+    ) -> Iterator[GenerationChunk]:
+        """backend.stream(), batched with other wrappers' generations when scheduled."""
+        if self.scheduler is None:
+            return self.backend.stream(
+                tokens, cache, max_tokens=max_tokens, temperature=temperature, top_p=top_p
+            )
+        return self.scheduler.stream(
+            tokens, cache, max_tokens=max_tokens, temperature=temperature, top_p=top_p,
+            session=id(self),
+        )
+    
+    def _prefill(self, tokens: List[int], cache: Any) -> None:
+        """backend.prefill(), chunked between other wrappers' decode steps when scheduled."""
+        if self.scheduler is None:
+            self.backend.prefill(tokens, cache)
+        else:
+            self.scheduler.prefill(tokens, cache, session=id(self))
+    
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """Messages in the conversation, oldest first."""
+        return self.history.messages
+    
+    def _load_tokenizer(self) -> None:
+        """
+        Make prompts tokenizable without loading the weights.
+        
+        History is then windowed with real token counts whether or not the
+        model is loaded, so a prompt (and its response cache key) comes out
+        the same before and after load().
+        """
+        if not self.backend.is_loaded():
+            self._engine(lambda: self.backend.load_tokenizer(self.model_id))
+        if not self._counting_tokens:
+            self.history.set_token_counter(self.count_tokens)
+            self._counting_tokens = True
+    
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a piece of prompt text (without BOS)."""
+        return len(self.backend.tokenize(text, add_special_tokens=False))
+    
+    def clear_history(self, keep_cache: bool = False) -> None:
+        """
+        Clear the conversation history and its summary.
+        
+        Args:
+            keep_cache: Leave the prompt cache in place, e.g. for a snapshot
+                still queued; the next prefill trims it to the system prompt.
+        """
+        with self._lock:
+            self.history.clear()
+            self.compactor.reset()
+            if not keep_cache:
+                self.prompt_cache.reset()
     
-    def clear_history(self) -> None:
-        """Clear the conversation history."""
-        self.conversation_history = []
+    def restore_history(self, messages: List[Dict], summary_segments: List[str]) -> None:
+        """
+        Replace the conversation with a saved one.
+        
+        The prompt cache is kept: the next prefill reuses whatever prefix
+        (at least the system prompt) the saved conversation shares with it.
+        
+        Args:
+            messages: Saved messages after the summarized part, oldest first,
+                with 'role', 'content' and optionally 'tokens' and 'id'.
+            summary_segments: Saved summary of the earlier conversation.
+        """
+        with self._lock:
+            self.history.clear()
+            self.compactor.reset()
+            self.compactor.segments = list(summary_segments)
+            for msg in messages:
+                self.history.add(
+                    msg["role"], msg["content"], tokens=msg.get("tokens"), message_id=msg.get("id")
+                )
     
-    def _build_prompt(self, question: str, context: Optional[str] = None) -> str:
+    def complete(
+        self,
+        prompt: str,
+        max_tokens: int = MAX_TOKENS,
+        temperature: float = TEMPERATURE,
+        top_p: float = TOP_P,
+        stop_sequences: Optional[List[str]] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> str:
+        """
+        Run a one-off completion of raw prompt text.
+        
+        Uses a scratch cache, so the conversation's prompt cache is left
+        untouched.
+        
+        Args:
+            prompt: Full prompt text.
+            max_tokens: Maximum tokens to generate.
+            temperature: Sampling temperature.
+            top_p: Top-p (nucleus) sampling parameter.
+            stop_sequences: Strings that end generation (default from config).
+            cancel_token: Optional token that aborts generation when cancelled.
+        
+        Returns:
+            The generated text (partial if cancelled).
+        """
+        if not self.is_loaded():
+            self.load()
+        
+        matcher = StopSequenceMatcher(
+            STOP_SEQUENCES if stop_sequences is None else stop_sequences
+        )
+        parts = []
+        with self._lock:
+            scratch = self.backend.make_cache()
+            with closing(self._stream(
+                self.backend.tokenize(prompt),
+                scratch,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+            )) as stream:
+                for chunk in stream:
+                    parts.append(matcher.feed(chunk.text))
+                    if matcher.stopped or (cancel_token is not None and cancel_token.cancelled):
+                        break
+            del scratch
+        parts.append(matcher.flush())
+        return "".join(parts)
+    
+    def needs_compaction(self) -> bool:
+        """Whether enough old history has built up to be folded into the summary."""
+        return COMPACTION_ENABLED and self.compactor.pending(self.history) is not None
+    
+    def compact(self, cancel_token: Optional[CancelToken] = None) -> bool:
+        """
+        Fold the oldest pending turns into the running summary.
+        
+        Meant to run in the background while the engine is idle. Only the
+        newly folded turns are summarized; the result is appended to the
+        existing summary. Afterwards the system prompt and summary are
+        prefilled so the next turn starts from a warm cache.
+        
+        Args:
+            cancel_token: Optional token that abandons the compaction.
+        
+        Returns:
+            True if the summary was extended.
+        """
+        if not self.is_loaded():
+            self.load()
+        
+        with self._lock:
+            pending = self.compactor.pending(self.history)
+            if pending is None:
+                return False
+            start, end = pending
+            epoch = self.compactor.epoch
+            prompt = self.compactor.build_prompt(self.history.messages[start:end])
+            
+            with get_tracer().span("compact", messages=end - start) as span:
+                text = self.complete(
+                    prompt,
+                    max_tokens=self.compactor.summary_tokens,
+                    temperature=0.0,
+                    top_p=1.0,
+                    cancel_token=cancel_token,
+                ).strip()
+                span.set(chars=len(text))
+            
+            if not text or self.compactor.epoch != epoch:
+                return False
+            if cancel_token is not None and cancel_token.cancelled:
+                return False
+            self.compactor.apply(end, text)
+            self._prefill_tokens(self._system_tokens() + self._summary_tokens())
+        return True
+    
+    def _summary_part(self) -> str:
+        """Prompt text carrying the running summary (empty when there is none)."""
+        summary = self.compactor.summary
+        if not summary:
+            return ""
+        return f"Summary of the earlier conversation:\n{summary}\n"
+    
+    def _summary_tokens(self) -> List[int]:
+        """Tokens of the summary part, recomputed only when the summary changes."""
+        part = self._summary_part()
+        if self._summary_token_cache[0] != part:
+            tokens = self.backend.tokenize(part, add_special_tokens=False) if part else []
+            self._summary_token_cache = (part, tokens)
+        return self._summary_token_cache[1]
+    
+    def _build_prefix(self, question: str, max_tokens: int = MAX_TOKENS) -> str:
+        """
+        Build the cacheable part of the prompt: system prompt, summary, history and question.
+        
+        Messages already folded into the running summary are left out. The
+        rest of the history is windowed to the largest suffix that fits the
+        token budget left after the system prompt, summary, reserved search
+        context, question and output. The search reservation is applied on every turn so the
+        window (and therefore the cached prefix) does not depend on whether
+        search results arrive.
+        
+        Args:
+            question: User's question.
+            max_tokens: Tokens reserved for the response.
+        
+        Returns:
+            Prompt prefix ending with the current question.
+        """
+        self._load_tokenizer()
+        
+        # Build conversation with the running summary and recent history
+        prompt_parts = [self.system_prompt + "\n", self._summary_part()]
+        
+        question_part = format_message("user", question)
+        
+        # The current question may already be recorded as the latest user message
+        end = len(self.history)
+        if end and self.history[-1]["role"] == "user" and self.history[-1]["content"] == question:
+            end -= 1
+        
+        # Add as much conversation history as fits the remaining token budget
+        budget = CONTEXT_WINDOW - max_tokens - SEARCH_CONTEXT_TOKENS
+        budget -= len(self._system_tokens())
+        budget -= len(self._summary_tokens())
+        budget -= self.count_tokens(question_part)
+        start = min(self.compactor.summarized_count, end)
+        for msg in self.history.window(max(budget, 0), end=end, start=start):
+            prompt_parts.append(format_message(msg["role"], msg["content"]))
+        
+        # Add current question
+        prompt_parts.append(question_part)
+        
+        return "".join(prompt_parts)
+    
+    @staticmethod
+    def _build_suffix(context: Optional[str] = None) -> str:
+        """Build the per-turn tail of the prompt: search context and answer cue."""
+        if context:
+            return f"\n\nContext from web search:\n{context}\n\nPixie:"
+        return "\nPixie:"
+    
+    def _build_prompt(
+        self,
+        question: str,
+        context: Optional[str] = None,
+        max_tokens: int = MAX_TOKENS,
+    ) -> str:
         """
         Build the prompt for the model with conversation history.
         
+        Search context comes after the question so everything before it can
+        be prefilled while the search is still running.
+        
         Args:
             question: User's question.
             context: Optional search context to include.
+            max_tokens: Tokens reserved for the response.
         
         Returns:
             Formatted prompt string.
         """
-        # Build conversation with history
-        prompt_parts = [SYSTEM_PROMPT + "\n"]
+        return self._build_prefix(question, max_tokens) + self._build_suffix(context)
+    
+    def _prefix_tokens(self, question: str, max_tokens: int = MAX_TOKENS) -> List[int]:
+        """Tokenize the prompt prefix as system prompt + summary + conversation."""
+        return self._tokenize_prefix(self._build_prefix(question, max_tokens))
+    
+    def _tokenize_prefix(self, prefix: str) -> List[int]:
+        """Tokenize a prompt prefix built by _build_prefix() (possibly cut short)."""
+        conversation = prefix[len(self.system_prompt) + 1 + len(self._summary_part()):]
+        return self._system_tokens() + self._summary_tokens() + self.backend.tokenize(
+            conversation, add_special_tokens=False
+        )
+    
+    def _prompt_tokens(
+        self,
+        question: str,
+        context: Optional[str] = None,
+        max_tokens: int = MAX_TOKENS,
+    ) -> List[int]:
+        """
+        Tokenize the prompt segment by segment.
         
-        # Add search context if available
-        if context:
-            prompt_parts.append(f"\nContext from web search:\n{context}\n")
+        Tokenizing the system prompt, summary, conversation and per-turn suffix
+        separately keeps each segment's tokens identical to those produced
+        by the prefill methods, so the cache always matches them.
+        """
+        suffix = self.backend.tokenize(self._build_suffix(context), add_special_tokens=False)
+        return self._prefix_tokens(question, max_tokens) + suffix
+    
+    def save_snapshot(self, kind: str = SESSION) -> bool:
+        """
+        Save the prompt cache to disk so it can be resumed after a restart.
         
-        # Add conversation history (limit to last 10 exchanges to avoid token limits)
-        for msg in self.conversation_history[-20:]:  # Last 10 user + 10 assistant messages
-            if msg["role"] == "user":
-                prompt_parts.append(f"\nHuman: {msg['content']}")
-            else:
-                prompt_parts.append(f"\nPixie: {msg['content']}")
+        Called when leaving a conversation and on exit. Does nothing if the
+        cache is empty or unchanged since the last snapshot.
         
-        # Add current question
-        prompt_parts.append(f"\nHuman: {question}")
-        prompt_parts.append("\nPixie:")
+        Args:
+            kind: SYSTEM for the bare system prompt, SESSION for a conversation.
         
-        return "".join(prompt_parts)
+        Returns:
+            True if the cache is saved.
+        """
+        if self.snapshots is None or not self._loaded:
+            return False
+        with self._lock:
+            cache = self.prompt_cache
+            if cache.cache is None or len(cache.tokens) < self.snapshots.min_tokens:
+                return False
+            if cache.tokens == self._snapshot_tokens:
+                return True
+            length = self.backend.cache_length(cache.cache)
+            if length is not None and length != len(cache.tokens):
+                return False
+            try:
+                saved = self._engine(lambda: self.snapshots.save(
+                    self.backend, self.model_id, self.backend.fingerprint(),
+                    cache.cache, cache.tokens, kind=kind,
+                ))
+            except OSError as e:
+                # A full or unwritable disk only costs a prefill later
+                print(f"Could not save KV snapshot: {e}")
+                return False
+            if saved:
+                self._snapshot_tokens = list(cache.tokens)
+            return saved
+    
+    def _restore_snapshot(self, tokens: List[int]) -> None:
+        """Load a saved cache if it holds more of ``tokens`` than the live cache."""
+        if self.snapshots is None:
+            return
+        reusable = self.prompt_cache.reusable(self.backend, tokens)
+        found = self._engine(lambda: self.snapshots.load(
+            self.backend,
+            self.model_id,
+            self.backend.fingerprint(),
+            tokens,
+            reusable=reusable,
+        ))
+        if found is not None:
+            cache, cached_tokens = found
+            self.prompt_cache.restore(self.backend, cache, cached_tokens)
+            self._snapshot_tokens = list(cached_tokens)
+    
+    def _prefill_tokens(self, tokens: List[int]) -> int:
+        """Bring the prompt cache up to ``tokens``, prefilling what is missing."""
+        self._restore_snapshot(tokens)
+        suffix = self.prompt_cache.fetch(self.backend, tokens)
+        try:
+            with get_tracer().span("prefill", tokens=len(suffix), cached=len(tokens) - len(suffix)):
+                self._prefill(suffix, self.prompt_cache.cache)
+        except BaseException:
+            self.prompt_cache.reset()
+            raise
+        return len(suffix)
+    
+    def prefill(self, question: str, max_tokens: int = MAX_TOKENS) -> int:
+        """
+        Prefill the system prompt, history and question into the prompt cache.
+        
+        Lets the model work while web search results are still on their way;
+        generate_stream() then only has to process the context and answer cue.
+        
+        Args:
+            question: User's question.
+            max_tokens: Tokens reserved for the response.
+        
+        Returns:
+            Number of tokens prefilled.
+        """
+        if not self.is_loaded():
+            self.load()
+        
+        with self._lock:
+            with get_tracer().span("tokenize") as span:
+                tokens = self._prefix_tokens(question, max_tokens)
+                span.set(tokens=len(tokens))
+            return self._prefill_tokens(tokens)
     
-    def add_to_history(self, role: str, content: str) -> None:
+    def prefill_speculative(
+        self,
+        partial_question: str = "",
+        max_tokens: int = MAX_TOKENS,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> int:
+        """
+        Prefill the prompt for a question that is still being typed.
+        
+        Brings the prompt cache up to the system prompt, summary, history and
+        ``Human:`` cue, followed by ``partial_question`` up to its last space
+        (the last word may still change). When the question is sent, only
+        the tokens after the common prefix are prefilled; anything that
+        turned out different is trimmed from the cache.
+        
+        Meant to run while the engine is idle. The tokens are prefilled in
+        chunks of SPECULATIVE_PREFILL_CHUNK_TOKENS, stopping between chunks
+        once ``cancel_token`` is cancelled and keeping what was done. Does
+        nothing while the model is unloaded.
+        
+        Args:
+            partial_question: Text typed so far.
+            max_tokens: Tokens reserved for the response.
+            cancel_token: Optional token that stops the prefill.
+        
+        Returns:
+            Number of tokens prefilled.
+        """
+        if not self.is_loaded():
+            return 0
+        
+        stable = partial_question[:partial_question.rfind(" ") + 1].strip()
+        with self._lock:
+            tokens = self._tokenize_prefix(self._build_prefix(stable, max_tokens).rstrip(" "))
+            if self.prompt_cache.reusable(self.backend, tokens) == len(tokens):
+                return 0
+            self._restore_snapshot(tokens)
+            suffix = self.prompt_cache.fetch(self.backend, tokens)
+            cached = len(tokens) - len(suffix)
+            prefilled = 0
+            try:
+                with get_tracer().span("speculative_prefill", tokens=len(suffix), cached=cached) as span:
+                    for start in range(0, len(suffix), SPECULATIVE_PREFILL_CHUNK_TOKENS):
+                        if cancel_token is not None and cancel_token.cancelled:
+                            break
+                        chunk = suffix[start:start + SPECULATIVE_PREFILL_CHUNK_TOKENS]
+                        self._prefill(chunk, self.prompt_cache.cache)
+                        prefilled += len(chunk)
+                    span.set(prefilled=prefilled)
+            except BaseException:
+                self.prompt_cache.reset()
+                raise
+            # A cancelled prefill leaves only the chunks already processed in the cache
+            del self.prompt_cache.tokens[cached + prefilled:]
+            return prefilled
+    
+    def _system_tokens(self) -> List[int]:
+        """Tokens of the system prompt (including BOS), computed once."""
+        if self._system_prompt_tokens is None:
+            self._system_prompt_tokens = self.backend.tokenize(self.system_prompt + "\n")
+        return self._system_prompt_tokens
+    
+    def add_to_history(
+        self,
+        role: str,
+        content: str,
+        tokens: Optional[int] = None,
+        message_id: Optional[int] = None,
+    ) -> None:
         """Add a message to conversation history."""
-        self.conversation_history.append({"role": role, "content": content})
+        self.history.add(role, content, tokens=tokens, message_id=message_id)
+    
+    def _response_key(
+        self,
+        question: str,
+        context: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+        stop_sequences: Optional[List[str]],
+        use_response_cache: Optional[bool],
+    ) -> Optional[str]:
+        """Response cache key for a generation, or None if it must not use the cache."""
+        if self.response_cache is None or use_response_cache is False:
+            return None
+        if not use_response_cache and temperature > 0 and not self.cache_sampled_responses:
+            return None
+        with self._lock:
+            return self.response_cache.make_key(
+                self.backend.name,
+                self.model_id,
+                self._build_prompt(question, context, max_tokens),
+                temperature,
+                top_p,
+                max_tokens,
+                STOP_SEQUENCES if stop_sequences is None else stop_sequences,
+                context,
+            )
+    
+    def has_cached_response(
+        self,
+        question: str,
+        context: Optional[str] = None,
+        max_tokens: int = MAX_TOKENS,
+        temperature: float = TEMPERATURE,
+        top_p: float = TOP_P,
+        stop_sequences: Optional[List[str]] = None,
+        use_response_cache: Optional[bool] = None,
+    ) -> bool:
+        """
+        Whether generate_stream() with these arguments would replay a cached answer.
+        
+        Lets callers skip loading the model and prefilling for a repeated question.
+        """
+        key = self._response_key(
+            question, context, max_tokens, temperature, top_p, stop_sequences, use_response_cache
+        )
+        return key is not None and self.response_cache.contains(key)
+    
+    def _replay(
+        self,
+        cached: CachedResponse,
+        callback: Optional[Callable[[str], None]],
+        cancel_token: Optional[CancelToken],
+    ) -> str:
+        """Stream a cached answer through the callback as if it were being generated."""
+        emitted = []
+        self.last_finish_reason = cached.finish_reason
+        for piece in cached.pieces:
+            if cancel_token is not None and cancel_token.cancelled:
+                self.last_finish_reason = "cancelled"
+                break
+            emitted.append(piece)
+            if callback:
+                callback(piece)
+        self.last_response_cached = True
+        self.last_prompt_tokens = self.last_prefill_tokens = 0
+        self.last_generated_tokens = cached.generated_tokens
+        self.last_draft_proposed = self.last_draft_accepted = 0
+        get_tracer().instant("response_cache_hit", chars=len(cached.text), tokens=cached.generated_tokens)
+        return "".join(emitted)
     
     def generate(
         self,
@@ -105,6 +800,9 @@ class LLMWrapper:
         max_tokens: int = MAX_TOKENS,
         temperature: float = TEMPERATURE,
         top_p: float = TOP_P,
+        stop_sequences: Optional[List[str]] = None,
+        cancel_token: Optional[CancelToken] = None,
+        use_response_cache: Optional[bool] = None,
     ) -> str:
         """
         Generate a response to the user's question.
@@ -115,26 +813,23 @@ class LLMWrapper:
             max_tokens: Maximum tokens to generate.
             temperature: Sampling temperature.
             top_p: Top-p (nucleus) sampling parameter.
+            stop_sequences: Strings that end generation (default from config).
+            cancel_token: Optional token that aborts generation when cancelled.
+            use_response_cache: See generate_stream().
         
         Returns:
             Generated response text.
         """
-        if not self._loaded:
-            self.load()
-        
-        prompt = self._build_prompt(question, context)
-        
-        sampler = make_sampler(temp=temperature, top_p=top_p)
-        
-        response = mlx_lm.generate(
-            self.model,
-            self.tokenizer,
-            prompt=prompt,
+        return self.generate_stream(
+            question,
+            context=context,
             max_tokens=max_tokens,
-            sampler=sampler,
+            temperature=temperature,
+            top_p=top_p,
+            stop_sequences=stop_sequences,
+            cancel_token=cancel_token,
+            use_response_cache=use_response_cache,
         )
-        
-        return response
     
     def generate_stream(
         self,
@@ -144,10 +839,29 @@ class LLMWrapper:
         temperature: float = TEMPERATURE,
         top_p: float = TOP_P,
         callback: Optional[Callable[[str], None]] = None,
+        stop_sequences: Optional[List[str]] = None,
+        cancel_token: Optional[CancelToken] = None,
+        use_response_cache: Optional[bool] = None,
     ) -> str:
         """
         Generate a response with streaming (token-by-token) output.
         
+        Generation ends at EOS, after ``max_tokens``, as soon as a stop
+        sequence appears (matched across token boundaries and never
+        emitted), or within one decode step of ``cancel_token`` being
+        cancelled. The reason is recorded in ``last_finish_reason`` as
+        "stop", "length" or "cancelled". Tokens generated before stopping
+        stay in the prompt cache either way. With a draft model, the
+        number of draft tokens proposed and accepted is recorded in
+        ``last_draft_proposed`` and ``last_draft_accepted`` (batched
+        generations through the scheduler do not use the draft model).
+        
+        When the exact prompt, search context and sampler settings have been
+        answered before, the stored answer is replayed through ``callback``
+        without loading the model, and ``last_response_cached`` is set. Only
+        deterministic generations (temperature 0) use the response cache,
+        unless ``use_response_cache`` or ``cache_sampled_responses`` says so.
+        
         Args:
             question: User's question.
             context: Optional search context from web search.
@@ -155,32 +869,119 @@ class LLMWrapper:
             temperature: Sampling temperature.
             top_p: Top-p (nucleus) sampling parameter.
             callback: Optional callback function called with each token.
+            stop_sequences: Strings that end generation (default from config).
+            cancel_token: Optional token that aborts generation when cancelled.
+            use_response_cache: True to cache even a sampled answer, False to
+                bypass the cache, None for the default (deterministic only).
         
         Returns:
-            Complete generated response text.
+            Complete generated response text (partial if cancelled).
         """
-        if not self._loaded:
-            self.load()
-        
-        prompt = self._build_prompt(question, context)
-        
-        sampler = make_sampler(temp=temperature, top_p=top_p)
+        cache_key = self._response_key(
+            question, context, max_tokens, temperature, top_p, stop_sequences, use_response_cache
+        )
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                with self._lock:
+                    return self._replay(cached, callback, cancel_token)
         
-        full_response = []
+        if not self.is_loaded():
+            self.load()
         
-        for response in mlx_lm.stream_generate(
-            self.model,
-            self.tokenizer,
-            prompt=prompt,
-            max_tokens=max_tokens,
-            sampler=sampler,
-        ):
-            token = response.text
-            # Skip end-of-turn tokens
-            if "<end_of_turn>" in token or "<eos>" in token:
-                continue
-            full_response.append(token)
-            if callback:
-                callback(token)
+        with self._lock:
+            self.last_response_cached = False
+            if cancel_token is not None and cancel_token.cancelled:
+                self.last_finish_reason = "cancelled"
+                self.last_draft_proposed = self.last_draft_accepted = 0
+                return ""
+            
+            tracer = get_tracer()
+            with tracer.span("tokenize") as span:
+                prompt_tokens = self._prompt_tokens(question, context, max_tokens)
+                span.set(tokens=len(prompt_tokens))
+            
+            # Only the tokens not already held in the KV cache (or a snapshot) need prefilling
+            self._restore_snapshot(prompt_tokens)
+            suffix = self.prompt_cache.fetch(self.backend, prompt_tokens)
+            self.last_prompt_tokens = len(prompt_tokens)
+            self.last_prefill_tokens = len(suffix)
+            
+            full_response = []
+            generated_tokens = []
+            draft_accepted = 0
+            matcher = StopSequenceMatcher(
+                STOP_SEQUENCES if stop_sequences is None else stop_sequences
+            )
+            self.last_finish_reason = None
+            ended_on_eos = False
+            stream_start = time.perf_counter()
+            first_token_time = None
+            
+            try:
+                # Closing the stream on an early exit lets the backend settle its cache
+                with closing(self._stream(
+                    suffix,
+                    self.prompt_cache.cache,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    top_p=top_p,
+                )) as stream:
+                    for chunk in stream:
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter()
+                            tracer.complete(
+                                "first_token", stream_start, first_token_time,
+                                prefill_tokens=len(suffix),
+                            )
+                        generated_tokens.append(chunk.token)
+                        draft_accepted += chunk.from_draft
+                        self.last_finish_reason = chunk.finish_reason
+                        # Backends finish with "stop" only on the EOS token
+                        ended_on_eos = chunk.finish_reason == "stop"
+                        token = matcher.feed(chunk.text)
+                        if token:
+                            full_response.append(token)
+                            if callback:
+                                callback(token)
+                        if matcher.stopped:
+                            self.last_finish_reason = "stop"
+                            break
+                        if cancel_token is not None and cancel_token.cancelled:
+                            self.last_finish_reason = "cancelled"
+                            break
+                
+                # Text held back as a possible stop sequence turned out not to be one
+                token = matcher.flush()
+                if token:
+                    full_response.append(token)
+                    if callback:
+                        callback(token)
+            except BaseException:
+                # A partially written cache cannot be trusted
+                self.prompt_cache.reset()
+                raise
+            
+            # Each main-model step verifies draft_tokens proposals and emits one token of its own
+            verify_steps = len(generated_tokens) - draft_accepted
+            draft_tokens = 0 if self.scheduler is not None else self.backend.draft_tokens
+            self.last_draft_proposed = verify_steps * draft_tokens
+            self.last_draft_accepted = draft_accepted
+            if first_token_time is not None:
+                tracer.complete(
+                    "decode", first_token_time, time.perf_counter(),
+                    tokens=len(generated_tokens),
+                    draft_accepted=draft_accepted,
+                    draft_proposed=self.last_draft_proposed,
+                    finish_reason=self.last_finish_reason,
+                )
+            self.last_generated_tokens = len(generated_tokens) - ended_on_eos
+            self.prompt_cache.extend(generated_tokens)
+            self.prompt_cache.sync()
+            
+            if cache_key is not None and full_response and self.last_finish_reason in ("stop", "length"):
+                self.response_cache.put(cache_key, CachedResponse(
+                    full_response, self.last_finish_reason, self.last_generated_tokens
+                ))
         
         return "".join(full_response)
@@ -4,29 +4,125 @@ Web Search Module
 Provides internet search capabilities using DuckDuckGo.
 """
 
-from ddgs import DDGS
-from typing import Optional
+from typing import Any, Callable, Optional
 
-from src.config import MAX_SEARCH_RESULTS
+from src.config import (
+    MAX_SEARCH_RESULTS,
+    SEARCH_CACHE_ENABLED,
+    SEARCH_CONTEXT_TOKENS,
+    DEEP_SEARCH_ENABLED,
+)
+from src.search.cache import SearchCache, normalize_query
+from src.search.context import build_context
+from src.tracing import get_tracer
 
 
-def search_web(query: str, max_results: int = MAX_SEARCH_RESULTS) -> list[dict]:
+def default_search_provider() -> Any:
+    """Create a DuckDuckGo client, importing ddgs (and its HTTP stack) on first use."""
+    from ddgs import DDGS
+    
+    return DDGS()
+
+
+# Factory for the search client; tests can swap in a local fake DDGS
+search_provider: Callable[[], Any] = default_search_provider
+
+
+def preload() -> None:
+    """
+    Import the search stack ahead of the first search.
+    
+    Creating a throwaway client imports the search engines it uses, so
+    calling this from a background thread after startup takes that cost
+    off the first search.
+    """
+    search_provider()
+
+
+_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """Return the shared search cache, creating it on first use."""
+    global _cache
+    if _cache is None and SEARCH_CACHE_ENABLED:
+        try:
+            _cache = SearchCache()
+        except Exception:
+            # An unusable cache directory must never break searching
+            _cache = SearchCache(path=None)
+    return _cache
+
+
+def set_search_cache(cache: Optional[SearchCache]) -> None:
+    """Replace the shared search cache (None falls back to the default)."""
+    global _cache
+    _cache = cache
+
+
+def search_web(
+    query: str,
+    max_results: int = MAX_SEARCH_RESULTS,
+    use_cache: bool = True,
+) -> list[dict]:
     """
     Search the web using DuckDuckGo.
     
+    Results are served from the search cache when a fresh entry exists.
+    
     Args:
         query: The search query string.
         max_results: Maximum number of results to return (default from config).
+        use_cache: Whether to read from and write to the search cache.
     
     Returns:
         List of search result dictionaries with 'title', 'href', and 'body' keys.
     """
-    try:
-        ddgs = DDGS()
-        results = list(ddgs.text(query, max_results=max_results))
-        return results
-    except Exception:
-        return []
+    with get_tracer().span("search", max_results=max_results) as span:
+        cache = get_search_cache() if use_cache else None
+        if cache is not None:
+            cached = cache.get(query, max_results)
+            if cached is not None:
+                span.set(cached=True, results=len(cached))
+                return cached
+        
+        try:
+            ddgs = search_provider()
+            results = list(ddgs.text(query, max_results=max_results))
+        except Exception as e:
+            span.set(cached=False, error=type(e).__name__)
+            return []
+        span.set(cached=False, results=len(results))
+    
+    # Failed or empty searches are not cached so they are retried next time
+    if cache is not None and results:
+        cache.put(query, max_results, results)
+    return results
+
+
+def fetch_result_pages(results: list[dict]) -> list[dict]:
+    """
+    Fetch the pages behind search results (deep search).
+    
+    Args:
+        results: List of search result dictionaries.
+    
+    Returns:
+        Copies of the results, with a 'content' key holding the page text
+        for every page that was fetched before the deadline.
+    """
+    # Imported lazily: only deep search needs the HTTP client
+    from src.search.fetch import fetch_pages
+    
+    pages = fetch_pages(r.get("href", "") for r in results)
+    enriched = []
+    for result in results:
+        result = dict(result)
+        content = pages.get(result.get("href", ""))
+        if content:
+            result["content"] = content
+        enriched.append(result)
+    return enriched
 
 
 def format_search_results(results: list[dict]) -> str:
@@ -37,7 +133,7 @@ def format_search_results(results: list[dict]) -> str:
         results: List of search result dictionaries.
     
     Returns:
-        Formatted string with titles and snippets.
+        Formatted string with titles, snippets and any fetched page text.
     """
     if not results:
         return "No search results found."
@@ -48,27 +144,44 @@ def format_search_results(results: list[dict]) -> str:
         snippet = result.get("body", "No description")
         url = result.get("href", "")
         
-        formatted_parts.append(
+        part = (
             f"[{i}] Title: {title}\n"
             f"    Snippet: {snippet}\n"
             f"    URL: {url}"
         )
+        if result.get("content"):
+            part += f"\n    Content: {result['content']}"
+        formatted_parts.append(part)
     
     return "\n\n".join(formatted_parts)
 
 
-def search_and_format(query: str, max_results: int = MAX_SEARCH_RESULTS) -> Optional[str]:
+def search_and_format(
+    query: str,
+    max_results: int = MAX_SEARCH_RESULTS,
+    deep: bool = DEEP_SEARCH_ENABLED,
+    token_budget: int = SEARCH_CONTEXT_TOKENS,
+) -> Optional[str]:
     """
     Convenience function to search and format results in one call.
     
+    The results are deduplicated, ranked against the query and packed
+    into ``token_budget`` tokens (see src.search.context), so the prompt
+    stays about the same size however verbose the results are.
+    
     Args:
         query: The search query string.
         max_results: Maximum number of results to return.
+        deep: Also fetch the result pages and include their text.
+        token_budget: Maximum tokens of formatted context.
     
     Returns:
         Formatted search results string, or None if search failed.
     """
     results = search_web(query, max_results)
-    if results:
-        return format_search_results(results)
-    return None
+    if results and deep:
+        results = fetch_result_pages(results)
+    with get_tracer().span("build_context", results=len(results)) as span:
+        context = build_context(results, query, token_budget)
+        span.set(chars=len(context) if context else 0)
+    return context
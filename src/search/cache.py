@@ -0,0 +1,191 @@
+"""
+Search Result Cache
+
+An in-memory LRU in front of a SQLite store, so repeated and follow-up
+questions skip the DuckDuckGo round-trip.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from src.config import (
+    SEARCH_CACHE_PATH,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_MEMORY_ENTRIES,
+)
+
+
+# Memory hits whose SQLite access time is written in one go
+TOUCH_BATCH_SIZE = 32
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so trivially different phrasings share a cache entry.
+
+    Lowercases, collapses whitespace and strips surrounding punctuation.
+    """
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.strip(" ?!.,;:\"'")
+
+
+class SearchCache:
+    """
+    Two-level search result cache with TTL and LRU eviction.
+
+    Entries are keyed by normalized query plus ``max_results``. Lookups hit
+    the in-memory LRU first, then SQLite. Expired entries are treated as
+    misses and removed. The store is capped at ``max_entries`` rows, evicting
+    the least recently used. Memory hits refresh the row's access time too,
+    in batches written before any eviction and on close, so the entries in
+    use are the last to go.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = SEARCH_CACHE_PATH,
+        ttl: float = SEARCH_CACHE_TTL,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        memory_entries: int = SEARCH_CACHE_MEMORY_ENTRIES,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite file, or None/":memory:" for a non-persistent cache.
+            ttl: Seconds an entry stays fresh.
+            max_entries: Maximum number of entries kept on disk.
+            memory_entries: Maximum number of entries kept in memory.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+        self._touched: dict[str, float] = {}  # Memory hits not yet written to SQLite
+        self._lock = threading.Lock()
+
+        path = path or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, results TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(query: str, max_results: int) -> str:
+        """Build the cache key for a query."""
+        return f"{normalize_query(query)}|{max_results}"
+
+    def get(self, query: str, max_results: int) -> Optional[list[dict]]:
+        """
+        Look up cached results.
+
+        Returns:
+            The cached results, or None on a miss or expired entry.
+        """
+        key = self.make_key(query, max_results)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH_SIZE:
+                    self._write_touched()
+                    self._db.commit()
+                self.hits += 1
+                return entry[1]
+
+            row = self._db.execute(
+                "SELECT results, created FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] < self.ttl:
+                results = json.loads(row[0])
+                self._db.execute(
+                    "UPDATE search_cache SET accessed = ? WHERE key = ?", (now, key)
+                )
+                self._db.commit()
+                self._remember(key, row[1], results)
+                self.hits += 1
+                return results
+
+            if row is not None or entry is not None:
+                self._forget(key)
+            self.misses += 1
+            return None
+
+    def put(self, query: str, max_results: int, results: list[dict]) -> None:
+        """Store results for a query."""
+        key = self.make_key(query, max_results)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, results)
+            self._touched.pop(key, None)
+            self._write_touched()
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, results, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), now, now),
+            )
+            self._db.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                "SELECT key FROM search_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._db.execute("DELETE FROM search_cache")
+            self._db.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of stored entries."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        """Write pending access times and close the underlying database."""
+        with self._lock:
+            self._write_touched()
+            self._db.commit()
+            self._db.close()
+
+    def _remember(self, key: str, created: float, results: list[dict]) -> None:
+        self._memory[key] = (created, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_touched(self) -> None:
+        if self._touched:
+            self._db.executemany(
+                "UPDATE search_cache SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _forget(self, key: str) -> None:
+        self._memory.pop(key, None)
+        self._touched.pop(key, None)
+        self._db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+        self._db.commit()
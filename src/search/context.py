@@ -0,0 +1,202 @@
+"""
+Search Context Builder
+
+Turns search results (snippets and any fetched page text) into a compact
+prompt context: results are split into passages, near-duplicates are
+dropped, passages are ranked against the question with BM25 and the best
+are packed into a token budget with their source citations.
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+
+from src.config import SEARCH_CONTEXT_TOKENS, SEARCH_PASSAGE_WORDS, SEARCH_DEDUP_THRESHOLD
+from src.llm.history import estimate_tokens
+
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "of", "on", "or", "that", "the", "this",
+    "to", "was", "what", "when", "where", "which", "who", "why", "will", "with", "you",
+}
+
+
+def tokenize_words(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, for ranking."""
+    return [w for w in _WORD_PATTERN.findall(text.lower()) if w not in _STOPWORDS]
+
+
+@dataclass
+class Passage:
+    """A piece of one search result, cited by the result's number."""
+
+    source: int  # 1-based citation number of the result
+    text: str
+    order: int = 0  # Position among all passages, for stable ordering
+    terms: List[str] = field(default_factory=list, repr=False)
+    score: float = 0.0
+
+
+def _split_text(text: str, max_words: int) -> List[str]:
+    """Split text into passages of about ``max_words``, keeping paragraphs together."""
+    passages = []
+    current: List[str] = []
+    for paragraph in text.splitlines():
+        words = paragraph.split()
+        while words:
+            room = max_words - len(current)
+            # Start a new passage rather than split a short paragraph
+            if current and len(words) > room and len(words) <= max_words:
+                passages.append(" ".join(current))
+                current = []
+                room = max_words
+            current.extend(words[:room])
+            words = words[room:]
+            if len(current) >= max_words:
+                passages.append(" ".join(current))
+                current = []
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def split_passages(results: List[dict], max_words: int = SEARCH_PASSAGE_WORDS) -> List[Passage]:
+    """
+    Split search results into passages.
+
+    Each result contributes its snippet and, when deep search fetched the
+    page, its page text in chunks of about ``max_words`` words.
+    """
+    passages = []
+    for source, result in enumerate(results, 1):
+        texts = [result.get("body", "")]
+        if result.get("content"):
+            texts.extend(_split_text(result["content"], max_words))
+        for text in texts:
+            text = " ".join(text.split())
+            if text:
+                passages.append(Passage(source=source, text=text, order=len(passages)))
+    return passages
+
+
+def _shingles(terms: List[str], size: int = 3) -> Set[tuple]:
+    if len(terms) < size:
+        return {tuple(terms)} if terms else set()
+    return {tuple(terms[i:i + size]) for i in range(len(terms) - size + 1)}
+
+
+def deduplicate(passages: List[Passage], threshold: float = SEARCH_DEDUP_THRESHOLD) -> List[Passage]:
+    """
+    Drop passages whose word 3-shingles overlap an earlier passage's.
+
+    Args:
+        passages: Passages in priority order; the first copy is kept.
+        threshold: Jaccard similarity above which a passage is a duplicate.
+
+    Returns:
+        The passages that are not near-duplicates.
+    """
+    kept: List[Passage] = []
+    kept_shingles: List[Set[tuple]] = []
+    for passage in passages:
+        words = _WORD_PATTERN.findall(passage.text.lower())
+        shingles = _shingles(words)
+        if not shingles:
+            continue
+        duplicate = any(
+            len(shingles & other) / len(shingles | other) > threshold
+            for other in kept_shingles
+        )
+        if not duplicate:
+            kept.append(passage)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def rank_passages(passages: List[Passage], query: str, k1: float = 1.5, b: float = 0.75) -> List[Passage]:
+    """
+    Score passages against the query with BM25 and sort best first.
+
+    Ties keep the search engine's order.
+    """
+    query_terms = set(tokenize_words(query))
+    for passage in passages:
+        passage.terms = tokenize_words(passage.text)
+    if not passages:
+        return []
+
+    doc_freq: Counter = Counter()
+    for passage in passages:
+        doc_freq.update(set(passage.terms) & query_terms)
+    avg_len = sum(len(p.terms) for p in passages) / len(passages) or 1.0
+    n = len(passages)
+    idf: Dict[str, float] = {
+        term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+    }
+
+    for passage in passages:
+        counts = Counter(t for t in passage.terms if t in idf)
+        length_norm = k1 * (1 - b + b * len(passage.terms) / avg_len)
+        passage.score = sum(
+            idf[term] * tf * (k1 + 1) / (tf + length_norm) for term, tf in counts.items()
+        )
+    return sorted(passages, key=lambda p: (-p.score, p.source, p.order))
+
+
+def build_context(
+    results: List[dict],
+    query: str,
+    token_budget: int = SEARCH_CONTEXT_TOKENS,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> Optional[str]:
+    """
+    Build a search context that fits a token budget.
+
+    Passages are deduplicated, ranked against the query and added greedily
+    while they fit. The selected passages are then grouped under their
+    source's title and URL, in citation order, so the model can cite [n].
+
+    Args:
+        results: Search result dictionaries ('title', 'href', 'body' and
+            optionally 'content').
+        query: The user's question.
+        token_budget: Maximum tokens of context.
+        count_tokens: Token counter (default: a character-based estimate).
+
+    Returns:
+        The context string, or None if there are no results.
+    """
+    if not results:
+        return None
+    count_tokens = count_tokens or estimate_tokens
+
+    headers = {
+        source: f"[{source}] {result.get('title', 'No title')} ({result.get('href', '')})"
+        for source, result in enumerate(results, 1)
+    }
+    ranked = rank_passages(deduplicate(split_passages(results)), query)
+
+    selected: Dict[int, List[Passage]] = {}
+    used = 0
+    for passage in ranked:
+        cost = count_tokens("\n" + passage.text)
+        if passage.source not in selected:
+            cost += count_tokens("\n\n" + headers[passage.source])
+        if used + cost > token_budget:
+            continue
+        selected.setdefault(passage.source, []).append(passage)
+        used += cost
+
+    if not selected:
+        return None
+    sections = []
+    for source in sorted(selected):
+        lines = [headers[source]]
+        lines.extend(p.text for p in sorted(selected[source], key=lambda p: p.order))
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
@@ -0,0 +1,257 @@
+"""
+Page Fetching
+
+Fetches search result pages concurrently and extracts their readable text
+for deep search. One pooled HTTP client lives on a background event loop
+and is shared by every search.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from lxml import etree
+
+from src.config import (
+    FETCH_TIMEOUT,
+    FETCH_DEADLINE,
+    FETCH_MAX_CONNECTIONS,
+    FETCH_MAX_CONNECTIONS_PER_HOST,
+    FETCH_MAX_BYTES,
+    FETCH_MAX_CHARS,
+)
+from src.tracing import get_tracer
+from src.version import __app_name__, __version__
+
+
+# Elements whose text is never part of the readable page
+_SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "head",
+    "nav", "header", "footer", "aside", "form", "button", "select", "iframe",
+}
+
+# Elements that start a new line of text
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "tr",
+    "table", "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt",
+}
+
+
+class PageTextExtractor:
+    """
+    lxml parser target that collects the visible text of an HTML page.
+
+    Used with ``etree.HTMLParser(target=...)`` so pages are parsed
+    incrementally as chunks arrive instead of building a tree.
+    """
+
+    def __init__(self, max_chars: int = FETCH_MAX_CHARS):
+        self.max_chars = max_chars
+        self._parts: List[str] = []
+        self._length = 0
+        self._skip_depth = 0
+
+    @property
+    def full(self) -> bool:
+        """Whether enough text has been collected."""
+        return self._length >= self.max_chars
+
+    def start(self, tag, attrib) -> None:
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def end(self, tag) -> None:
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def data(self, text: str) -> None:
+        if self._skip_depth or self.full:
+            return
+        self._parts.append(text)
+        self._length += len(text)
+
+    def comment(self, text: str) -> None:
+        pass
+
+    def close(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self._parts).splitlines())
+        text = "\n".join(line for line in lines if line)
+        return text[:self.max_chars]
+
+
+def extract_text(html, max_chars: int = FETCH_MAX_CHARS) -> str:
+    """Extract readable text from an HTML document (str or bytes)."""
+    extractor = PageTextExtractor(max_chars)
+    parser = etree.HTMLParser(target=extractor)
+    parser.feed(html)
+    return parser.close()
+
+
+class PageFetcher:
+    """
+    Concurrent page fetcher with a pooled async HTTP client.
+
+    Connections are kept alive across searches. Each host gets at most
+    ``max_connections_per_host`` simultaneous requests, each request has
+    its own timeout, and fetch_all() returns whatever finished by its
+    deadline.
+    """
+
+    def __init__(
+        self,
+        timeout: float = FETCH_TIMEOUT,
+        max_connections: int = FETCH_MAX_CONNECTIONS,
+        max_connections_per_host: int = FETCH_MAX_CONNECTIONS_PER_HOST,
+        max_bytes: int = FETCH_MAX_BYTES,
+        max_chars: int = FETCH_MAX_CHARS,
+    ):
+        """
+        Initialize the fetcher. Must be used from a single event loop.
+
+        Args:
+            timeout: Seconds allowed per page.
+            max_connections: Pooled connections across all hosts.
+            max_connections_per_host: Simultaneous requests per host.
+            max_bytes: HTML bytes read per page.
+            max_chars: Extracted text kept per page.
+        """
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self._per_host = max_connections_per_host
+        self._host_slots: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self._per_host)
+        )
+        self._client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            headers={"User-Agent": f"Mozilla/5.0 (compatible; {__app_name__}/{__version__})"},
+        )
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """
+        Fetch one page and extract its text.
+
+        Returns:
+            The page text, or None if the page failed, timed out or is not HTML.
+        """
+        host = urlsplit(url).hostname or ""
+        try:
+            async with self._host_slots[host]:
+                async with asyncio.timeout(self.timeout):
+                    return await self._fetch_text(url)
+        except Exception:
+            # Any failure (network, bogus charset, parser error) only loses this page
+            return None
+
+    async def _fetch_text(self, url: str) -> Optional[str]:
+        async with self._client.stream("GET", url) as response:
+            content_type = response.headers.get("content-type", "")
+            if response.status_code != 200 or (content_type and "html" not in content_type):
+                return None
+
+            extractor = PageTextExtractor(self.max_chars)
+            parser = etree.HTMLParser(target=extractor, encoding=response.charset_encoding)
+            received = 0
+            async for chunk in response.aiter_bytes():
+                parser.feed(chunk)
+                received += len(chunk)
+                # Stop downloading once there is enough text or the page is huge
+                if extractor.full or received >= self.max_bytes:
+                    break
+            return parser.close() or None
+
+    async def fetch_all(self, urls: Iterable[str], deadline: float = FETCH_DEADLINE) -> Dict[str, str]:
+        """
+        Fetch pages concurrently.
+
+        Args:
+            urls: Pages to fetch.
+            deadline: Seconds after which unfinished fetches are abandoned.
+
+        Returns:
+            Mapping of URL to page text for the pages that succeeded in time.
+        """
+        urls = list(dict.fromkeys(u for u in urls if u.startswith(("http://", "https://"))))
+        if not urls:
+            return {}
+        tasks = {asyncio.create_task(self.fetch(url)): url for url in urls}
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        pages = {}
+        for task in done:
+            text = task.result()
+            if text:
+                pages[tasks[task]] = text
+        return pages
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        await self._client.aclose()
+
+
+class _FetchLoop:
+    """Background event loop thread that owns the shared PageFetcher."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="pixie-fetch", daemon=True)
+        self.thread.start()
+        self.fetcher = asyncio.run_coroutine_threadsafe(self._make_fetcher(), self.loop).result()
+
+    @staticmethod
+    async def _make_fetcher() -> PageFetcher:
+        return PageFetcher()
+
+
+_fetch_loop: Optional[_FetchLoop] = None
+_fetch_loop_lock = threading.Lock()
+
+
+def _get_fetch_loop() -> _FetchLoop:
+    global _fetch_loop
+    with _fetch_loop_lock:
+        if _fetch_loop is None:
+            _fetch_loop = _FetchLoop()
+        return _fetch_loop
+
+
+def fetch_pages(urls: Iterable[str], deadline: float = FETCH_DEADLINE) -> Dict[str, str]:
+    """
+    Fetch pages concurrently from any thread, waiting at most ``deadline`` seconds.
+
+    Args:
+        urls: Pages to fetch.
+        deadline: Seconds after which unfinished fetches are abandoned.
+
+    Returns:
+        Mapping of URL to extracted page text for the pages that succeeded.
+    """
+    urls = list(urls)
+    with get_tracer().span("fetch", urls=len(urls)) as span:
+        fetch_loop = _get_fetch_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            fetch_loop.fetcher.fetch_all(urls, deadline), fetch_loop.loop
+        )
+        try:
+            # fetch_all enforces the deadline itself; the margin covers scheduling
+            pages = future.result(timeout=deadline + 1.0)
+        except Exception:
+            future.cancel()
+            pages = {}
+        span.set(pages=len(pages))
+    return pages
@@ -0,0 +1,144 @@
+"""
+Search Prefetch
+
+Starts the web search for a question while it is still being typed, so the
+search round-trip overlaps composing the message instead of delaying the
+answer.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from src.config import SEARCH_PREFETCH_MIN_INTERVAL, SEARCH_PREFETCH_MAX_ENTRIES
+from src.search.cache import normalize_query
+
+
+class SearchPrefetcher:
+    """
+    Background searches keyed by normalized query.
+
+    Searches run one at a time on a dedicated thread and start at most once
+    per ``min_interval`` seconds, so a burst of typing pauses cannot get us
+    throttled by DuckDuckGo. A newer prefetch supersedes any older one that
+    has not reached the network yet; searches already under way finish and
+    are kept. take() hands a finished or in-flight search to the turn that
+    sends the question, and the counters in stats() show how often that
+    happened.
+    """
+
+    def __init__(
+        self,
+        search: Callable[[str], Any],
+        min_interval: float = SEARCH_PREFETCH_MIN_INTERVAL,
+        max_entries: int = SEARCH_PREFETCH_MAX_ENTRIES,
+    ):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            search: Called with the query on the prefetch thread; its return
+                value is the result of the future handed out by take().
+            min_interval: Minimum seconds between the starts of two searches.
+            max_entries: Searches kept for take(), oldest dropped first.
+        """
+        self.search = search
+        self.min_interval = min_interval
+        self.max_entries = max_entries
+        self.started = 0      # Searches that reached the network
+        self.used = 0         # Sends answered with a prefetched search
+        self.missed = 0       # Searched sends that had nothing usable prefetched
+        self.superseded = 0   # Prefetches dropped before they started
+        self.throttled = 0    # Prefetches that waited for the rate limit
+        self._futures: "OrderedDict[str, Future]" = OrderedDict()
+        self._last_start = float("-inf")
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pixie-prefetch")
+
+    def prefetch(self, query: str) -> None:
+        """Start searching for ``query`` in the background, unless it already is."""
+        key = normalize_query(query)
+        if not key:
+            return
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and not future.cancelled():
+                self._futures.move_to_end(key)
+                return
+            self._cancel_pending()
+            future = Future()
+            self._futures[key] = future
+            while len(self._futures) > self.max_entries:
+                self._futures.popitem(last=False)[1].cancel()
+        self._executor.submit(self._run, query, future)
+
+    def take(self, query: str) -> Optional[Future]:
+        """
+        Claim the prefetched search for a question being sent.
+
+        Returns:
+            The search's future if it has finished or is under way, else None
+            (a prefetch still waiting for the rate limit is dropped, since
+            the send searches immediately instead).
+        """
+        with self._lock:
+            future = self._futures.pop(normalize_query(query), None)
+            if future is not None and future.cancel():
+                self.superseded += 1
+                future = None
+            self._cancel_pending()
+            if future is None:
+                self.missed += 1
+                return None
+            self.used += 1
+            return future
+
+    def cancel(self) -> None:
+        """Drop every prefetch that has not started."""
+        with self._lock:
+            self._cancel_pending()
+
+    def stats(self) -> dict:
+        """Return the prefetch counters."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "used": self.used,
+                "missed": self.missed,
+                "superseded": self.superseded,
+                "throttled": self.throttled,
+            }
+
+    def close(self) -> None:
+        """Drop pending prefetches and stop the prefetch thread."""
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel_pending(self) -> None:
+        # Futures only cancel before set_running_or_notify_cancel(), i.e. before the search starts
+        for key, future in list(self._futures.items()):
+            if future.cancel():
+                del self._futures[key]
+                self.superseded += 1
+        self._changed.notify_all()
+
+    def _run(self, query: str, future: Future) -> None:
+        """Wait for the rate limit, then search unless superseded meanwhile."""
+        with self._lock:
+            wait = self._last_start + self.min_interval - time.monotonic()
+            if wait > 0 and not future.cancelled():
+                self.throttled += 1
+            while wait > 0 and not future.cancelled():
+                self._changed.wait(wait)
+                wait = self._last_start + self.min_interval - time.monotonic()
+            if not future.set_running_or_notify_cancel():
+                return
+            self._last_start = time.monotonic()
+            self.started += 1
+        try:
+            future.set_result(self.search(query))
+        except BaseException as e:
+            future.set_exception(e)
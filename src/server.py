@@ -0,0 +1,724 @@
+"""
+API Server
+
+Headless, OpenAI-compatible HTTP API over the same model the app uses, for
+scripts and editors. Requests share one loaded model through the batch
+scheduler. Qt is never imported.
+
+Run with: uv run main.py --serve [--host 127.0.0.1] [--port 8080]
+
+Endpoints:
+    POST /v1/chat/completions   Streaming (SSE) and non-streaming chat
+    GET  /v1/models             The loaded model
+    GET  /metrics               Load time, request counts and latency percentiles
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import statistics
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from src.config import (
+    INFERENCE_BACKEND,
+    MAX_TOKENS,
+    TEMPERATURE,
+    TOP_P,
+    STOP_SEQUENCES,
+    CONTEXT_WINDOW,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_MAX_ACTIVE,
+    SERVER_MAX_QUEUE,
+    SERVER_STREAM_BUFFER,
+    SERVER_WRITE_TIMEOUT,
+    SERVER_MAX_BODY_BYTES,
+)
+import src.search as search
+from src.llm import CancelToken, LLMWrapper
+from src.llm.backends import InferenceBackend, get_backend
+from src.llm.prompt_cache import common_prefix_length
+from src.llm.scheduler import BatchScheduler
+from src.version import __app_name__, __version__
+
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+# Latency samples kept for the percentiles in /metrics
+METRICS_WINDOW = 1000
+
+
+class HTTPError(Exception):
+    """An error answered with an OpenAI-style JSON error body."""
+
+    def __init__(self, status: int, message: str, kind: str = "invalid_request_error", param: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.kind = kind
+        self.param = param
+
+    def body(self) -> dict:
+        return {"error": {"message": self.message, "type": self.kind, "param": self.param, "code": None}}
+
+
+@dataclass
+class ChatRequest:
+    """A validated /v1/chat/completions request."""
+
+    question: str
+    history: List[Dict[str, str]] = field(default_factory=list)  # Earlier turns, oldest first
+    system: Optional[str] = None  # Replaces Pixie's system prompt when given
+    stream: bool = False
+    include_usage: bool = False
+    max_tokens: int = MAX_TOKENS
+    temperature: float = TEMPERATURE
+    top_p: float = TOP_P
+    stop: List[str] = field(default_factory=list)
+    web_search: bool = False  # Extension: answer with search_and_format() context
+
+    def transcript(self) -> List[Tuple[str, str]]:
+        """The conversation as (role, content) pairs, for matching requests to warm caches."""
+        turns = [("system", self.system or "")]
+        turns += [(m["role"], m["content"]) for m in self.history]
+        return turns + [("user", self.question)]
+
+
+def _message_text(message: Any, index: int) -> Tuple[str, str]:
+    """Role and text of one message, accepting string or text-part content."""
+    param = f"messages[{index}]"
+    if not isinstance(message, dict):
+        raise HTTPError(400, "Each message must be an object", param=param)
+    role = message.get("role")
+    content = message.get("content")
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if not isinstance(part, dict) or part.get("type") != "text":
+                raise HTTPError(400, "Only text content parts are supported", param=f"{param}.content")
+            parts.append(str(part.get("text", "")))
+        content = "".join(parts)
+    if content is None:
+        content = ""
+    if not isinstance(content, str):
+        raise HTTPError(400, "Message content must be a string or a list of text parts", param=f"{param}.content")
+    if role == "developer":
+        role = "system"
+    if role not in ("system", "user", "assistant"):
+        raise HTTPError(400, f"Unsupported message role: {role!r}", param=f"{param}.role")
+    return role, content
+
+
+def _number(body: dict, name: str, default: float, low: float, high: float) -> float:
+    value = body.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        raise HTTPError(400, f"{name} must be a number between {low} and {high}", param=name)
+    return float(value)
+
+
+def parse_chat_request(body: Any) -> ChatRequest:
+    """
+    Validate a chat completion request body.
+
+    System (and developer) messages replace Pixie's system prompt. The last
+    message must come from the user; earlier user and assistant messages
+    become the conversation history. Assistant messages are stored without
+    leading whitespace, as the API returns them. ``stop`` strings are added to the
+    configured stop sequences, which the prompt format relies on.
+
+    Raises:
+        HTTPError: 400 describing the first invalid field.
+    """
+    if not isinstance(body, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise HTTPError(400, "messages must be a non-empty list", param="messages")
+
+    system_parts, history = [], []
+    for index, message in enumerate(messages):
+        role, content = _message_text(message, index)
+        if role == "system":
+            system_parts.append(content)
+        elif role == "assistant":
+            history.append({"role": role, "content": content.lstrip()})
+        else:
+            history.append({"role": role, "content": content})
+    if not history or history[-1]["role"] != "user":
+        raise HTTPError(400, "The last message must have role 'user'", param="messages")
+
+    if body.get("n", 1) != 1:
+        raise HTTPError(400, "Only n=1 is supported", param="n")
+    max_tokens = body.get("max_completion_tokens", body.get("max_tokens"))
+    if max_tokens is None:
+        max_tokens = MAX_TOKENS
+    if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or not 1 <= max_tokens <= CONTEXT_WINDOW // 2:
+        raise HTTPError(400, f"max_tokens must be an integer between 1 and {CONTEXT_WINDOW // 2}", param="max_tokens")
+
+    stop = body.get("stop") or []
+    if isinstance(stop, str):
+        stop = [stop]
+    if not isinstance(stop, list) or not all(isinstance(s, str) for s in stop):
+        raise HTTPError(400, "stop must be a string or a list of strings", param="stop")
+
+    stream_options = body.get("stream_options") or {}
+    return ChatRequest(
+        question=history[-1]["content"],
+        history=history[:-1],
+        system="\n\n".join(system_parts) or None,
+        stream=bool(body.get("stream", False)),
+        include_usage=bool(isinstance(stream_options, dict) and stream_options.get("include_usage")),
+        max_tokens=max_tokens,
+        temperature=_number(body, "temperature", TEMPERATURE, 0.0, 2.0),
+        top_p=_number(body, "top_p", TOP_P, 0.0, 1.0),
+        stop=list(STOP_SEQUENCES) + stop,
+        web_search=bool(body.get("web_search", False)),
+    )
+
+
+class ServerMetrics:
+    """Request counters and a window of recent latencies."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.started = time.time()
+        self.requests = 0
+        self.completed = 0
+        self.rejected = 0  # Turned away with 429 because the queue was full
+        self.errors = 0
+        self.disconnected = 0  # Clients that went away (or stalled) mid-stream
+        self.samples: Dict[str, Deque[float]] = {
+            name: deque(maxlen=window)
+            for name in ("queue_ms", "ttft_ms", "total_ms", "decode_tok_per_sec", "prefill_tokens")
+        }
+
+    def record(self, **values: Optional[float]) -> None:
+        """Add one finished request's measurements (None values are skipped)."""
+        self.completed += 1
+        for name, value in values.items():
+            if value is not None:
+                self.samples[name].append(value)
+
+    def latency(self) -> Dict[str, Optional[Dict[str, float]]]:
+        """p50/p95/max of each measurement over the window."""
+        result = {}
+        for name, values in self.samples.items():
+            if not values:
+                result[name] = None
+                continue
+            ordered = sorted(values)
+            result[name] = {
+                "p50": round(statistics.median(ordered), 3),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                "max": round(ordered[-1], 3),
+            }
+        return result
+
+
+class ChatServer:
+    """
+    OpenAI-compatible HTTP server on asyncio streams.
+
+    Each generating request holds one of ``max_active`` LLMWrappers, which
+    share the backend through a BatchScheduler so their decode steps are
+    batched. A request arriving while every wrapper is busy waits in a queue
+    of at most ``max_queue`` requests; beyond that it is answered with 429.
+    A request is given the idle wrapper whose last conversation shares the
+    longest prefix with it, so follow-up turns reuse a warm KV cache.
+
+    Streams are flow-controlled: generation pauses once ``stream_buffer``
+    chunks are waiting for a slow client, and a client that accepts nothing
+    for ``write_timeout`` seconds is dropped and its generation cancelled.
+    """
+
+    def __init__(
+        self,
+        backend: Any = None,
+        model_id: Optional[str] = None,
+        max_active: int = SERVER_MAX_ACTIVE,
+        max_queue: int = SERVER_MAX_QUEUE,
+        stream_buffer: int = SERVER_STREAM_BUFFER,
+        write_timeout: float = SERVER_WRITE_TIMEOUT,
+        max_body_bytes: int = SERVER_MAX_BODY_BYTES,
+    ):
+        """
+        Initialize the server. Nothing is loaded until start().
+
+        Args:
+            backend: Backend instance or name (default from config).
+            model_id: Model to load (default: the backend's configured model).
+            max_active: Requests generating at once.
+            max_queue: Requests waiting for a free slot before new ones are rejected.
+            stream_buffer: Chunks buffered per stream before generation waits.
+            write_timeout: Seconds a client may stall a stream.
+            max_body_bytes: Largest accepted request body.
+        """
+        if backend is None or isinstance(backend, str):
+            backend = get_backend(backend or INFERENCE_BACKEND)
+        self.backend: InferenceBackend = backend
+        self.scheduler = BatchScheduler(backend, max_batch_size=max_active)
+        self.llms = [LLMWrapper(model_id, scheduler=self.scheduler) for _ in range(max(1, max_active))]
+        self.max_queue = max_queue
+        self.stream_buffer = stream_buffer
+        self.write_timeout = write_timeout
+        self.max_body_bytes = max_body_bytes
+        self.metrics = ServerMetrics()
+        self.load_seconds: Optional[float] = None
+        self._idle: List[LLMWrapper] = list(self.llms)
+        self._transcripts: Dict[int, List[Tuple[str, str]]] = {}  # Last conversation per wrapper
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._active = 0
+        self._llm_pool = concurrent.futures.ThreadPoolExecutor(len(self.llms), thread_name_prefix="pixie-serve")
+        self._search_pool = concurrent.futures.ThreadPoolExecutor(2, thread_name_prefix="pixie-search")
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def model_id(self) -> str:
+        return self.llms[0].model_id
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self, host: str = SERVER_HOST, port: int = SERVER_PORT, warmup: bool = True) -> None:
+        """
+        Load the model, then start listening.
+
+        Args:
+            host: Interface to bind.
+            port: Port to bind (0 picks a free one; see ``port``).
+            warmup: Compile kernels and prefill the system prompt before serving.
+        """
+        loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(len(self.llms))
+        start = time.perf_counter()
+        llm = self.llms[0]
+        await loop.run_in_executor(self._llm_pool, llm.warmup if warmup else llm.load)
+        self.load_seconds = time.perf_counter() - start
+        print(f"Model ready in {self.load_seconds:.2f}s (load {llm.last_load_seconds:.2f}s)")
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Serving {self.model_id} on http://{host}:{self.port}/v1")
+
+    @property
+    def port(self) -> Optional[int]:
+        """Port the server is listening on."""
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Serve until cancelled."""
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop listening and release the engine."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.scheduler.stop()
+        self._llm_pool.shutdown(wait=False, cancel_futures=True)
+        self._search_pool.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bool, bytes]]:
+        """Read one request; returns (method, path, keep_alive, body) or None at EOF."""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Chunked request bodies are not supported; send Content-Length")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > self.max_body_bytes:
+            raise HTTPError(413, f"Request body is larger than {self.max_body_bytes} bytes")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method.upper(), target.split("?", 1)[0], keep_alive, body
+
+    async def _write(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        """Write and wait for the client to take it (raises ConnectionError if it stalls)."""
+        writer.write(data)
+        try:
+            await asyncio.wait_for(writer.drain(), self.write_timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError("client stopped reading")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        await self._write(writer, head.encode("latin-1") + body)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        keep_alive = True
+        try:
+            while keep_alive:
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, keep_alive, body = request
+                    keep_alive = await self._route(writer, method, path, body, keep_alive)
+                except HTTPError as e:
+                    self.metrics.rejected += e.status == 429
+                    await self._send_json(writer, e.status, e.body(), keep_alive=False)
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _route(self, writer: asyncio.StreamWriter, method: str, path: str, body: bytes, keep_alive: bool) -> bool:
+        """Dispatch a request; returns whether the connection stays open."""
+        path = path.rstrip("/") or "/"
+        if path == "/v1/chat/completions":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise HTTPError(400, "Request body is not valid JSON")
+            return await self._chat(writer, parse_chat_request(payload), keep_alive)
+        if method != "GET":
+            raise HTTPError(405, "Use GET")
+        if path == "/v1/models":
+            await self._send_json(writer, 200, {"object": "list", "data": [self._model_card()]}, keep_alive)
+        elif path == f"/v1/models/{self.model_id}":
+            await self._send_json(writer, 200, self._model_card(), keep_alive)
+        elif path == "/metrics":
+            await self._send_json(writer, 200, self.stats(), keep_alive)
+        else:
+            raise HTTPError(404, f"No route for {path}", kind="not_found_error")
+        return keep_alive
+
+    def _model_card(self) -> dict:
+        return {"id": self.model_id, "object": "model", "created": int(self.metrics.started), "owned_by": __app_name__.lower()}
+
+    def stats(self) -> dict:
+        """Everything reported by /metrics."""
+        metrics = self.metrics
+        return {
+            "version": __version__,
+            "uptime_seconds": round(time.time() - metrics.started, 3),
+            "model": {
+                "id": self.model_id,
+                "backend": self.backend.name,
+                "loaded": self.backend.is_loaded(),
+                "ready_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+                "load_seconds": round(self.llms[0].last_load_seconds, 3),
+            },
+            "requests": {
+                "total": metrics.requests,
+                "completed": metrics.completed,
+                "active": self._active,
+                "queued": self._waiting,
+                "rejected": metrics.rejected,
+                "errors": metrics.errors,
+                "disconnected": metrics.disconnected,
+            },
+            "latency": metrics.latency(),
+            "scheduler": self.scheduler.stats(),
+        }
+
+    # ------------------------------------------------------------------
+    # Chat completions
+    # ------------------------------------------------------------------
+
+    async def _acquire(self, request: ChatRequest) -> LLMWrapper:
+        """Wait for a free wrapper, preferring the one with the warmest cache for this request."""
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            raise HTTPError(429, "Too many requests are waiting; retry shortly", kind="rate_limit_error")
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        transcript = request.transcript()
+        llm = max(
+            self._idle,
+            key=lambda llm: common_prefix_length(self._transcripts.get(id(llm), []), transcript),
+        )
+        self._idle.remove(llm)
+        self._active += 1
+        return llm
+
+    def _release(self, llm: LLMWrapper, transcript: List[Tuple[str, str]]) -> None:
+        self._transcripts[id(llm)] = transcript
+        self._idle.append(llm)
+        self._active -= 1
+        self._slots.release()
+
+    @staticmethod
+    def _prepare(llm: LLMWrapper, request: ChatRequest, prefill: bool) -> None:
+        """Load the request's conversation into a wrapper (and prefill it while search runs)."""
+        llm.system_prompt = request.system
+        llm.restore_history(request.history, [])
+        if prefill:
+            llm.prefill(request.question, request.max_tokens)
+
+    @staticmethod
+    def _generate(llm: LLMWrapper, request: ChatRequest, context: Optional[str], on_text, cancel_token: CancelToken) -> str:
+        return llm.generate_stream(
+            request.question,
+            context=context,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            top_p=request.top_p,
+            callback=on_text,
+            stop_sequences=request.stop,
+            cancel_token=cancel_token,
+        )
+
+    async def _chat(self, writer: asyncio.StreamWriter, request: ChatRequest, keep_alive: bool) -> bool:
+        loop = asyncio.get_running_loop()
+        self.metrics.requests += 1
+        received = time.perf_counter()
+        llm = await self._acquire(request)
+        acquired = time.perf_counter()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        cancel_token = CancelToken()
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=self.stream_buffer)
+        first_token: List[float] = []
+        started: List[bool] = []
+        text = ""
+        try:
+            context = None
+            if request.web_search:
+                # Search while the conversation is prefilled, as the app does
+                found, _ = await asyncio.gather(
+                    loop.run_in_executor(self._search_pool, search.search_and_format, request.question),
+                    loop.run_in_executor(self._llm_pool, self._prepare, llm, request, True),
+                )
+                context = found
+            else:
+                await loop.run_in_executor(self._llm_pool, self._prepare, llm, request, False)
+
+            def on_text(piece: str) -> None:
+                # Runs on the generating thread; blocks while the client is behind
+                if not first_token:
+                    first_token.append(time.perf_counter())
+                if not request.stream or cancel_token.cancelled:
+                    return
+                if not started:
+                    # The model's space after the "Pixie:" cue is not part of the answer
+                    piece = piece.lstrip()
+                    if not piece:
+                        return
+                    started.append(True)
+                future = asyncio.run_coroutine_threadsafe(chunks.put(piece), loop)
+                while True:
+                    try:
+                        future.result(timeout=0.1)
+                        return
+                    except concurrent.futures.TimeoutError:
+                        if cancel_token.cancelled:
+                            future.cancel()
+                            return
+
+            generation = loop.run_in_executor(
+                self._llm_pool, self._generate, llm, request, context, on_text, cancel_token
+            )
+            if request.stream:
+                try:
+                    await self._stream_response(writer, request, completion_id, created, chunks, generation, llm)
+                except ConnectionError:
+                    cancel_token.cancel()
+                    self.metrics.disconnected += 1
+                    await asyncio.wait({generation})
+                    return False
+                keep_alive = False
+                if generation.exception() is not None:
+                    # Reported to the client as an error event; the stream is over
+                    self.metrics.errors += 1
+                    error = generation.exception()
+                    print(f"Request failed: {type(error).__name__}: {error}")
+                    return False
+                text = generation.result().lstrip()
+            else:
+                text = (await generation).lstrip()
+                await self._send_json(writer, 200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": self.model_id,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": self._finish_reason(llm),
+                    }],
+                    "usage": self._usage(llm),
+                }, keep_alive)
+        except (HTTPError, ConnectionError):
+            raise
+        except Exception as e:
+            self.metrics.errors += 1
+            print(f"Request failed: {type(e).__name__}: {e}")
+            raise HTTPError(500, f"Generation failed: {e}", kind="server_error")
+        finally:
+            cancel_token.cancel()
+            self._release(llm, request.transcript() + [("assistant", text)])
+
+        end = time.perf_counter()
+        first = first_token[0] if first_token else end
+        decoded = llm.last_generated_tokens
+        self.metrics.record(
+            queue_ms=(acquired - received) * 1000,
+            ttft_ms=(first - received) * 1000,
+            total_ms=(end - received) * 1000,
+            decode_tok_per_sec=(decoded - 1) / (end - first) if decoded > 1 and end > first else None,
+            prefill_tokens=llm.last_prefill_tokens,
+        )
+        print(
+            f"chat {'stream' if request.stream else 'json'} • queue {(acquired - received) * 1000:.0f} ms"
+            f" • ttft {(first - received) * 1000:.0f} ms • {decoded} tokens in {end - received:.2f}s"
+            f" • prefill {llm.last_prefill_tokens}/{llm.last_prompt_tokens}"
+        )
+        return keep_alive
+
+    async def _stream_response(
+        self,
+        writer: asyncio.StreamWriter,
+        request: ChatRequest,
+        completion_id: str,
+        created: int,
+        chunks: asyncio.Queue,
+        generation: asyncio.Future,
+        llm: LLMWrapper,
+    ) -> None:
+        """Send the completion as server-sent events while it is generated."""
+        def event(delta: dict, finish_reason: Optional[str] = None, **extra) -> bytes:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": self.model_id,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        await self._write(writer, head.encode("latin-1") + event({"role": "assistant", "content": ""}))
+        while True:
+            get = asyncio.ensure_future(chunks.get())
+            done, _ = await asyncio.wait({get, generation}, return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                await self._write(writer, event({"content": get.result()}))
+                continue
+            get.cancel()
+            break
+        while not chunks.empty():
+            await self._write(writer, event({"content": chunks.get_nowait()}))
+
+        if generation.exception() is not None:
+            error = HTTPError(500, f"Generation failed: {generation.exception()}", kind="server_error")
+            await self._write(writer, f"data: {json.dumps(error.body())}\n\n".encode("utf-8"))
+            return
+        await self._write(writer, event({}, self._finish_reason(llm)))
+        if request.include_usage:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": self.model_id,
+                "choices": [],
+                "usage": self._usage(llm),
+            }
+            await self._write(writer, f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        await self._write(writer, b"data: [DONE]\n\n")
+
+    @staticmethod
+    def _finish_reason(llm: LLMWrapper) -> str:
+        return "length" if llm.last_finish_reason == "length" else "stop"
+
+    @staticmethod
+    def _usage(llm: LLMWrapper) -> dict:
+        prompt = llm.last_prompt_tokens
+        completion = llm.last_generated_tokens
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = ChatServer(
+        backend=args.backend,
+        model_id=args.model_id,
+        max_active=args.max_active,
+        max_queue=args.max_queue,
+    )
+    try:
+        await server.start(args.host, args.port, warmup=not args.no_warmup)
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    """Run the API server until interrupted."""
+    parser = argparse.ArgumentParser(description="PixieAI OpenAI-compatible API server")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--host", default=SERVER_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, help="Inference backend (mlx, cpu or stub)")
+    parser.add_argument("--model-id", default=None, help="Model to load (default: the backend's)")
+    parser.add_argument("--max-active", type=int, default=SERVER_MAX_ACTIVE, help="Requests generating at once")
+    parser.add_argument("--max-queue", type=int, default=SERVER_MAX_QUEUE, help="Requests waiting before 429")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the warm-up pass")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
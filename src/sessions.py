@@ -0,0 +1,247 @@
+"""
+Session Store
+
+Saves conversations to SQLite as they happen, so chats survive restarts
+and long sessions can be reopened page by page.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.config import SESSIONS_PATH, TRANSCRIPT_PAGE_SIZE, HISTORY_TOKEN_BUDGET
+from src.llm.history import estimate_tokens, format_message
+
+
+DEFAULT_TITLE = "New chat"
+TITLE_LENGTH = 48
+
+
+def make_title(text: str) -> str:
+    """Derive a session title from its first question."""
+    title = " ".join(text.split())
+    if len(title) > TITLE_LENGTH:
+        title = title[:TITLE_LENGTH - 1].rstrip() + "…"
+    return title or DEFAULT_TITLE
+
+
+class SessionStore:
+    """
+    SQLite store of chat sessions and their messages.
+
+    Messages are appended one at a time with their token counts and timing
+    metadata. Reads are paged by message id through an index, so opening a
+    session costs the same however long it is. The database runs in WAL
+    mode so appends never wait on readers.
+    """
+
+    def __init__(self, path: Optional[str] = SESSIONS_PATH):
+        """
+        Open (or create) the store.
+
+        Args:
+            path: SQLite file, or None/":memory:" for a non-persistent store.
+        """
+        self._lock = threading.Lock()
+        path = path or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id INTEGER PRIMARY KEY, title TEXT NOT NULL, "
+            "created REAL NOT NULL, updated REAL NOT NULL, "
+            "message_count INTEGER NOT NULL DEFAULT 0, "
+            "summary TEXT, summarized_through INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, tokens INTEGER, "
+            "created REAL NOT NULL, meta TEXT);"
+            "CREATE INDEX IF NOT EXISTS messages_by_session ON messages(session_id, id);"
+            "CREATE INDEX IF NOT EXISTS sessions_by_update ON sessions(updated);"
+        )
+        self._db.commit()
+
+    def create_session(self, title: str = DEFAULT_TITLE) -> int:
+        """Create an empty session and return its id."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO sessions (title, created, updated) VALUES (?, ?, ?)",
+                (title, now, now),
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def list_sessions(self, limit: int = 100) -> List[Dict]:
+        """Return the most recently updated sessions, newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, title, created, updated, message_count FROM sessions "
+                "ORDER BY updated DESC, id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def rename_session(self, session_id: int, title: str) -> None:
+        """Change a session's title."""
+        with self._lock:
+            self._db.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+            self._db.commit()
+
+    def delete_session(self, session_id: int) -> None:
+        """Delete a session and its messages."""
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+
+    def append_message(
+        self,
+        session_id: int,
+        role: str,
+        content: str,
+        tokens: Optional[int] = None,
+        meta: Optional[Dict] = None,
+    ) -> int:
+        """
+        Append a message to a session.
+
+        The first user message also becomes the session title.
+
+        Args:
+            session_id: Session to append to.
+            role: "user" or "assistant".
+            content: Message text.
+            tokens: Token count of the message as it appears in the prompt.
+            meta: Timing and other metadata (stored as JSON).
+
+        Returns:
+            The new message id.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO messages (session_id, role, content, tokens, created, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, role, content, tokens, now, json.dumps(meta) if meta else None),
+            )
+            self._db.execute(
+                "UPDATE sessions SET updated = ?, message_count = message_count + 1, "
+                "title = CASE WHEN title = ? AND ? = 'user' THEN ? ELSE title END "
+                "WHERE id = ?",
+                (now, DEFAULT_TITLE, role, make_title(content), session_id),
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def set_message_tokens(self, message_id: int, tokens: int) -> None:
+        """Record a message's token count once it is known."""
+        with self._lock:
+            self._db.execute("UPDATE messages SET tokens = ? WHERE id = ?", (tokens, message_id))
+            self._db.commit()
+
+    def load_page(
+        self,
+        session_id: int,
+        before_id: Optional[int] = None,
+        limit: int = TRANSCRIPT_PAGE_SIZE,
+    ) -> List[Dict]:
+        """
+        Load a page of messages, oldest first.
+
+        Args:
+            session_id: Session to read.
+            before_id: Only messages older than this id (default: the newest page).
+            limit: Maximum number of messages.
+
+        Returns:
+            Message dicts with id, role, content, tokens, created and meta.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, role, content, tokens, created, meta FROM messages "
+                "WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before_id if before_id is not None else 2 ** 63 - 1, limit),
+            ).fetchall()
+        messages = []
+        for row in reversed(rows):
+            message = dict(row)
+            message["meta"] = json.loads(message["meta"]) if message["meta"] else None
+            messages.append(message)
+        return messages
+
+    def load_context(
+        self,
+        session_id: int,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+    ) -> Tuple[List[str], List[Dict]]:
+        """
+        Load what the model needs to continue a session.
+
+        Returns:
+            The saved summary segments and the most recent messages after
+            the summarized part that fit ``token_budget``, oldest first.
+        """
+        with self._lock:
+            session = self._db.execute(
+                "SELECT summary, summarized_through FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if session is None:
+            return [], []
+        segments = json.loads(session["summary"]) if session["summary"] else []
+
+        messages: List[Dict] = []
+        used = 0
+        before_id = None
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, role, content, tokens FROM messages "
+                    "WHERE session_id = ? AND id > ? AND id < ? ORDER BY id DESC LIMIT ?",
+                    (
+                        session_id,
+                        session["summarized_through"],
+                        before_id if before_id is not None else 2 ** 63 - 1,
+                        TRANSCRIPT_PAGE_SIZE,
+                    ),
+                ).fetchall()
+            for row in rows:
+                tokens = row["tokens"]
+                if tokens is None:
+                    tokens = estimate_tokens(format_message(row["role"], row["content"]))
+                if used + tokens > token_budget:
+                    return segments, messages[::-1]
+                used += tokens
+                messages.append(dict(row))
+            if len(rows) < TRANSCRIPT_PAGE_SIZE:
+                return segments, messages[::-1]
+            before_id = rows[-1]["id"]
+
+    def save_summary(self, session_id: int, segments: List[str], summarized_through: int) -> None:
+        """
+        Save a session's running summary.
+
+        Args:
+            session_id: Session the summary belongs to.
+            segments: Summary segments, oldest first.
+            summarized_through: Id of the last message covered by the summary.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE sessions SET summary = ?, summarized_through = ? WHERE id = ?",
+                (json.dumps(segments), summarized_through, session_id),
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,257 @@
+"""
+Tracing Module
+
+Lightweight timed spans for each stage of a chat turn, written to a
+rotating log in Chrome trace event format (viewable in ui.perfetto.dev or
+chrome://tracing). When tracing is disabled, spans are a shared no-op
+object, so instrumented code pays only a function call.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from src.config import TRACE_ENABLED, TRACE_PATH, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT
+
+
+class _TraceFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating handler that starts every file as a JSON array.
+
+    The trace event format allows the closing bracket to be omitted, so
+    each file stays loadable while it is still being written.
+    """
+
+    on_rollover = None
+
+    def doRollover(self):
+        super().doRollover()
+        if self.on_rollover is not None:
+            self.on_rollover()
+
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() == 0:
+            stream.write("[\n")
+        return stream
+
+
+class Span:
+    """A timed region; extra args (e.g. token counts) can be added before it ends."""
+
+    __slots__ = ("_tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict):
+        self._tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def set(self, **args) -> None:
+        """Attach arguments to the span."""
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self._tracer.complete(self.name, self.start, time.perf_counter(), **self.args)
+
+
+class _NullSpan:
+    """Span used while tracing is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **args) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Records spans as Chrome trace events.
+
+    Events carry the OS thread id, so the search pool, inference service
+    and GUI thread appear as separate tracks.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = TRACE_ENABLED,
+        path: str = TRACE_PATH,
+        max_bytes: int = TRACE_MAX_BYTES,
+        backup_count: int = TRACE_BACKUP_COUNT,
+    ):
+        """
+        Initialize the tracer.
+
+        Args:
+            enabled: Whether to record anything.
+            path: Trace file; rotated copies get .1, .2, ... suffixes.
+            max_bytes: Size at which the file is rotated.
+            backup_count: Number of rotated files kept.
+        """
+        self.enabled = enabled
+        self.path = path
+        self._pid = os.getpid()
+        # Maps perf_counter readings onto wall-clock microseconds
+        self._origin = time.time() - time.perf_counter()
+        self._named_threads = set()
+        self._logger = logging.getLogger(f"pixie.trace.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = _TraceFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            # Each file names its threads again so it can be opened on its own
+            handler.on_rollover = self._named_threads.clear
+            self._logger.addHandler(handler)
+
+    def span(self, name: str, **args):
+        """
+        Time a block of code.
+
+        Usage:
+            with tracer.span("prefill", tokens=n) as span:
+                ...
+                span.set(cached=True)
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, args)
+
+    def complete(self, name: str, start: float, end: float, **args) -> None:
+        """Record a span from two ``time.perf_counter()`` readings."""
+        if not self.enabled:
+            return
+        self._write({
+            "name": name,
+            "ph": "X",
+            "ts": round((self._origin + start) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "args": args,
+        })
+
+    def instant(self, name: str, **args) -> None:
+        """Record a point in time (e.g. the first token)."""
+        if not self.enabled:
+            return
+        self._write({
+            "name": name,
+            "ph": "i",
+            "s": "t",
+            "ts": round((self._origin + time.perf_counter()) * 1e6, 1),
+            "args": args,
+        })
+
+    def close(self) -> None:
+        """Flush and close the trace file."""
+        for handler in list(self._logger.handlers):
+            handler.close()
+            self._logger.removeHandler(handler)
+        self.enabled = False
+
+    def _write(self, event: dict) -> None:
+        thread = threading.current_thread()
+        tid = threading.get_native_id()
+        event["pid"] = self._pid
+        event["tid"] = tid
+        if tid not in self._named_threads:
+            self._named_threads.add(tid)
+            self._logger.info(json.dumps({
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {"name": thread.name},
+            }) + ",")
+        self._logger.info(json.dumps(event, default=str) + ",")
+
+
+@dataclass
+class TurnStats:
+    """Per-turn performance summary shown in the status bar."""
+
+    ttft: float               # Seconds from send to the first token
+    decode_seconds: float     # Seconds from the first token to the last
+    generated_tokens: int
+    prefill_tokens: int       # Prompt tokens processed this turn
+    context_tokens: int       # Tokens held in the KV cache after the turn
+    search_seconds: Optional[float] = None
+    draft_proposed: int = 0   # Speculative decoding: tokens proposed by the draft model
+    draft_accepted: int = 0   # ... and accepted by the main model
+    load_seconds: Optional[float] = None  # Model (re)load time, if the turn had to load it
+    cached: bool = False      # Answer replayed from the response cache
+
+    @property
+    def tokens_per_sec(self) -> float:
+        """Decode speed, excluding time to the first token."""
+        if self.generated_tokens < 2 or self.decode_seconds <= 0:
+            return 0.0
+        return (self.generated_tokens - 1) / self.decode_seconds
+
+    @property
+    def draft_acceptance(self) -> Optional[float]:
+        """Share of draft tokens accepted, or None without speculative decoding."""
+        if not self.draft_proposed:
+            return None
+        return self.draft_accepted / self.draft_proposed
+
+    def summary(self) -> str:
+        """Short human-readable form, e.g. '0.42s to first token • 38 tok/s • 1,234 ctx'."""
+        if self.cached:
+            return f"{self.ttft:.2f}s to first token • cached answer • {self.context_tokens:,} ctx"
+        text = (
+            f"{self.ttft:.2f}s to first token • "
+            f"{self.tokens_per_sec:.0f} tok/s • "
+            f"{self.context_tokens:,} ctx"
+        )
+        if self.draft_acceptance is not None:
+            text += f" • {self.draft_acceptance:.0%} drafted"
+        if self.load_seconds is not None:
+            text += f" • loaded in {self.load_seconds:.1f}s"
+        return text
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the shared tracer, creating it on first use."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                try:
+                    _tracer = Tracer()
+                except OSError:
+                    # An unwritable log directory must never break chatting
+                    _tracer = Tracer(enabled=False)
+    return _tracer
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    """Replace the shared tracer (None falls back to the default)."""
+    global _tracer
+    _tracer = tracer
@@ -0,0 +1,107 @@
+"""Folding old turns of a long conversation into a running summary."""
+
+import pytest
+
+from src.llm.backends.stub import StubBackend
+from src.llm.compaction import ConversationCompactor
+from src.llm.history import HistoryManager
+from src.llm.wrapper import LLMWrapper
+
+
+def history_of(turns, tokens=10):
+    history = HistoryManager()
+    for i in range(turns):
+        history.add("user", f"question {i}", tokens=tokens)
+        history.add("assistant", f"answer {i}", tokens=tokens)
+    return history
+
+
+def test_nothing_is_pending_under_the_threshold():
+    compactor = ConversationCompactor(threshold_tokens=100, keep_tokens=40)
+    assert compactor.pending(history_of(5)) is None
+
+
+def test_all_but_the_recent_turns_are_pending_over_the_threshold():
+    compactor = ConversationCompactor(threshold_tokens=100, keep_tokens=40)
+    assert compactor.pending(history_of(6)) == (0, 8)
+
+
+def test_kept_part_starts_on_a_question():
+    compactor = ConversationCompactor(threshold_tokens=100, keep_tokens=30)
+    history = history_of(6)
+    # 30 tokens would keep answer 4 without its question, so the kept part starts later
+    start, end = compactor.pending(history)
+    assert (start, end) == (0, 10)
+    assert history.messages[end]["role"] == "user"
+
+
+def test_summary_segments_are_appended_and_not_regenerated():
+    compactor = ConversationCompactor(threshold_tokens=100, keep_tokens=40)
+    history = history_of(6)
+    start, end = compactor.pending(history)
+    compactor.apply(end, "They asked about terriers.")
+    assert compactor.pending(history) is None
+
+    for i in range(6, 10):
+        history.add("user", f"question {i}", tokens=10)
+        history.add("assistant", f"answer {i}", tokens=10)
+    start, end = compactor.pending(history)
+    assert (start, end) == (8, 16)
+    prompt = compactor.build_prompt(history.messages[start:end])
+    assert "What you already remember:\nThey asked about terriers.\n" in prompt
+    assert "\nHuman: question 4" in prompt and "question 3" not in prompt
+
+    compactor.apply(end, "Then about grooming.")
+    assert compactor.segments == ["They asked about terriers.", "Then about grooming."]
+    assert compactor.summary == "They asked about terriers.\nThen about grooming."
+    assert compactor.summarized_count == 16
+
+
+def test_reset_forgets_the_summary():
+    compactor = ConversationCompactor(threshold_tokens=100, keep_tokens=40)
+    compactor.apply(8, "They asked about terriers.")
+    epoch = compactor.epoch
+    compactor.reset()
+    assert (compactor.segments, compactor.summarized_count) == ([], 0)
+    assert compactor.epoch == epoch + 1
+
+
+@pytest.fixture
+def llm():
+    backend = StubBackend(response=" They asked about Yorkshire Terriers.")
+    llm = LLMWrapper(backend=backend)
+    llm.snapshots = None
+    llm.response_cache = None
+    llm.compactor = ConversationCompactor(threshold_tokens=40, keep_tokens=20)
+    llm.load()
+    return llm
+
+
+def test_summary_replaces_the_folded_turns_in_the_prompt(llm):
+    for i in range(6):
+        llm.add_to_history("user", f"Tell me fact number {i} about terriers")
+        llm.add_to_history("assistant", f" Fact {i} is about terriers")
+    assert llm.needs_compaction()
+    pending = llm.compactor.pending(llm.history)
+
+    assert llm.compact()
+    assert llm.compactor.segments == ["They asked about Yorkshire Terriers."]
+    assert llm.compactor.summarized_count == pending[1]
+    assert not llm.needs_compaction()
+
+    prompt = llm._build_prompt("What about their coat?")
+    assert "Summary of the earlier conversation:\nThey asked about Yorkshire Terriers.\n" in prompt
+    assert "fact number 0" not in prompt
+    assert "fact number 5" in prompt
+    # The next turn starts from the system prompt and summary already in the cache
+    assert llm.prompt_cache.tokens == llm._system_tokens() + llm._summary_tokens()
+
+
+def test_clearing_the_conversation_drops_the_summary(llm):
+    for i in range(6):
+        llm.add_to_history("user", f"Tell me fact number {i} about terriers")
+        llm.add_to_history("assistant", f" Fact {i} is about terriers")
+    llm.compact()
+    llm.clear_history()
+    assert llm.compactor.segments == []
+    assert "Summary of the earlier conversation" not in llm._build_prompt("Hi")
@@ -0,0 +1,84 @@
+"""Deep search page fetching against a local HTTP stand-in server."""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.search.fetch import PageFetcher, fetch_pages
+
+FAST_HTML = b"<html><head><title>x</title></head><body><p>Yorkshire Terriers are small dogs.</p></body></html>"
+SLOW_SECONDS = 3.0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(SLOW_SECONDS)
+            self._send(FAST_HTML, "text/html")
+        elif self.path == "/fast":
+            self._send(FAST_HTML, "text/html; charset=utf-8")
+        elif self.path == "/bad-charset":
+            self._send(FAST_HTML, "text/html; charset=bogus-xyz")
+        elif self.path == "/binary":
+            self._send(b"\x00\x01", "application/octet-stream")
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up on a slow page
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+async def _fetch_all(urls, deadline, **kwargs):
+    fetcher = PageFetcher(**kwargs)
+    try:
+        return await fetcher.fetch_all(urls, deadline=deadline)
+    finally:
+        await fetcher.aclose()
+
+
+def test_fast_page_text_is_extracted(server):
+    pages = asyncio.run(_fetch_all([f"{server}/fast"], deadline=2.0))
+    assert pages == {f"{server}/fast": "Yorkshire Terriers are small dogs."}
+
+
+def test_slow_host_is_dropped_within_the_deadline(server):
+    start = time.perf_counter()
+    pages = asyncio.run(_fetch_all([f"{server}/fast", f"{server}/slow"], deadline=1.0, timeout=5.0))
+    elapsed = time.perf_counter() - start
+    assert list(pages) == [f"{server}/fast"]
+    assert elapsed < SLOW_SECONDS - 1.0
+
+
+def test_slow_page_past_its_timeout_is_dropped(server):
+    pages = asyncio.run(_fetch_all([f"{server}/fast", f"{server}/slow"], deadline=5.0, timeout=0.5))
+    assert list(pages) == [f"{server}/fast"]
+
+
+def test_one_bad_page_does_not_discard_the_others(server):
+    urls = [f"{server}/bad-charset", f"{server}/fast", f"{server}/binary", f"{server}/missing"]
+    pages = fetch_pages(urls, deadline=2.0)
+    assert pages == {f"{server}/fast": "Yorkshire Terriers are small dogs."}
@@ -0,0 +1,157 @@
+"""Search prefetch while typing: debounce, rate limit and hand-over to the send."""
+
+import threading
+import time
+import types
+
+import pytest
+
+import src.search.prefetch as prefetch_module
+from src.search.prefetch import SearchPrefetcher
+
+
+class FakeClock:
+    """Monotonic clock for the prefetcher that only moves when told to."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.prefetcher = None
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        # Wake a prefetch waiting for the rate limit so it reads the new time
+        with self.prefetcher._changed:
+            self.prefetcher._changed.notify_all()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(prefetch_module, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def searched():
+    return []
+
+
+@pytest.fixture
+def prefetcher(clock, searched):
+    def search(query):
+        searched.append(query)
+        return [{"title": query}]
+
+    prefetcher = SearchPrefetcher(search, min_interval=2.0)
+    clock.prefetcher = prefetcher
+    yield prefetcher
+    prefetcher.close()
+
+
+def test_prefetched_search_is_handed_to_the_send(prefetcher, searched):
+    prefetcher.prefetch("What is a Yorkshire Terrier")
+    future = prefetcher.take("what is a yorkshire terrier?")
+    assert future.result(5) == [{"title": "What is a Yorkshire Terrier"}]
+    assert searched == ["What is a Yorkshire Terrier"]
+    assert prefetcher.take("What is a Yorkshire Terrier") is None
+    assert prefetcher.stats()["used"] == 1
+    assert prefetcher.stats()["missed"] == 1
+
+
+def test_searches_start_at_most_once_per_interval(prefetcher, clock, searched):
+    prefetcher.prefetch("weather in Leeds")
+    wait_for(lambda: searched == ["weather in Leeds"])
+
+    prefetcher.prefetch("weather in Leeds today")
+    wait_for(lambda: prefetcher.stats()["throttled"] == 1)
+    clock.advance(1.5)
+    time.sleep(0.05)
+    assert searched == ["weather in Leeds"]
+
+    clock.advance(0.5)
+    wait_for(lambda: len(searched) == 2)
+    assert searched[1] == "weather in Leeds today"
+    assert prefetcher.stats()["started"] == 2
+
+
+def test_newer_prefetch_supersedes_one_waiting_for_the_rate_limit(prefetcher, clock, searched):
+    prefetcher.prefetch("weather in Leeds")
+    wait_for(lambda: len(searched) == 1)
+    prefetcher.prefetch("weather in Leeds tod")
+    wait_for(lambda: prefetcher.stats()["throttled"] == 1)
+    prefetcher.prefetch("weather in Leeds today")
+    clock.advance(2.0)
+    wait_for(lambda: len(searched) == 2)
+
+    assert searched == ["weather in Leeds", "weather in Leeds today"]
+    assert prefetcher.stats()["superseded"] == 1
+    assert prefetcher.take("weather in Leeds tod") is None
+
+
+def test_send_does_not_wait_for_a_throttled_prefetch(prefetcher, clock, searched):
+    prefetcher.prefetch("weather in Leeds")
+    wait_for(lambda: len(searched) == 1)
+    prefetcher.prefetch("weather in Leeds today")
+    wait_for(lambda: prefetcher.stats()["throttled"] == 1)
+
+    # The send searches itself rather than wait out the interval
+    assert prefetcher.take("weather in Leeds today") is None
+    clock.advance(2.0)
+    time.sleep(0.05)
+    assert searched == ["weather in Leeds"]
+
+
+def test_typing_is_debounced_before_prefetching(tmp_path, monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from src.config import SEARCH_PREFETCH_DEBOUNCE_MS
+    from src.gui import MainWindow
+    from src.llm.backends.stub import StubBackend
+    from src.llm.wrapper import LLMWrapper
+    from src.sessions import SessionStore
+
+    app = QApplication.instance() or QApplication([])
+    llm = LLMWrapper(backend=StubBackend())
+    llm.snapshots = None
+    llm.response_cache = None
+    window = MainWindow(llm=llm, store=SessionStore(path=None))
+    prefetched, cancels = [], threading.Event()
+    monkeypatch.setattr(window.service, "prefetch_search", prefetched.append)
+    monkeypatch.setattr(window.service, "cancel_prefetch", cancels.set)
+    timer = window.prefetch_timer
+
+    try:
+        window.search_checkbox.setChecked(True)
+        question = "What is a Yorkshire Terrier?"
+        for end in range(1, len(question) + 1):
+            window.input_field.setText(question[:end])
+        # Every keystroke restarts the wait; nothing is searched until typing pauses
+        assert timer.isSingleShot() and timer.interval() == SEARCH_PREFETCH_DEBOUNCE_MS
+        assert timer.isActive()
+        assert prefetched == []
+        timer.stop()
+        timer.timeout.emit()
+        assert prefetched == [question]
+
+        # Text too short to search stops the timer and drops pending prefetches
+        window.input_field.setText("What")
+        assert not timer.isActive()
+        assert cancels.is_set()
+
+        window.input_field.setText(question)
+        window.search_checkbox.setChecked(False)
+        assert not timer.isActive()
+        app.processEvents()
+    finally:
+        window.close()
@@ -0,0 +1,107 @@
+"""KV prompt cache reuse across chat turns, measured on the stub engine."""
+
+import pytest
+
+from src.llm.backends.stub import StubBackend
+from src.llm.wrapper import SYSTEM_PROMPT, LLMWrapper
+
+
+class RecordingBackend(StubBackend):
+    """Stub engine that also records the full prompt length of every turn."""
+
+    def __init__(self):
+        super().__init__()
+        self.prompt_lengths = []
+
+    def prefill(self, tokens, cache):
+        super().prefill(tokens, cache)
+        self.prompt_lengths.append(self.cache_length(cache))
+
+
+@pytest.fixture
+def backend():
+    return RecordingBackend()
+
+
+@pytest.fixture
+def llm(backend):
+    llm = LLMWrapper(backend=backend)
+    llm.load()
+    return llm
+
+
+def chat(llm, backend, question, context=None):
+    """Run one turn like the GUI does and return the prompt tokens sent to prefill."""
+    llm.add_to_history("user", question)
+    backend.prefill_calls.clear()
+    answer = llm.generate_stream(question, context=context, max_tokens=256)
+    llm.add_to_history("assistant", answer)
+    assert backend.prefill_calls == [llm.last_prefill_tokens]
+    return llm.last_prefill_tokens
+
+
+def count(backend, text):
+    return len(backend.tokenize(text, add_special_tokens=False))
+
+
+def test_first_turn_prefills_the_whole_prompt(llm, backend):
+    prefilled = chat(llm, backend, "What is a Yorkshire Terrier?")
+    assert prefilled == backend.prompt_lengths[-1]
+
+
+def test_later_turns_prefill_only_the_new_message(llm, backend):
+    chat(llm, backend, "What is a Yorkshire Terrier?")
+    for question in ["How big do they get?", "Are they good with children?", "What should I feed one?"]:
+        prefilled = chat(llm, backend, question)
+        assert prefilled == count(backend, f"\nHuman: {question}\nPixie:")
+
+
+def test_clear_history_invalidates_the_cache(llm, backend):
+    chat(llm, backend, "What is a Yorkshire Terrier?")
+    chat(llm, backend, "How big do they get?")
+    llm.clear_history()
+    prefilled = chat(llm, backend, "How big do they get?")
+    assert prefilled == backend.prompt_lengths[-1]
+
+
+def test_trimmed_history_window_reprefills_after_the_system_prompt(llm, backend):
+    chat(llm, backend, "What is a Yorkshire Terrier?")
+    chat(llm, backend, "How big do they get?")
+
+    # Shrink the budget so the first exchange no longer fits on the next turn
+    history = llm.history
+    history.token_budget = sum(history.token_count(m) for m in history.messages[2:])
+    question = "Are they good with children?"
+    prefilled = chat(llm, backend, question)
+
+    # The prompt now only matches the cache up to the first cue after the system prompt
+    assert prefilled > count(backend, f"\nHuman: {question}\nPixie:")
+    cached = len(backend.tokenize(SYSTEM_PROMPT + "\n")) + count(backend, "\nHuman:")
+    assert backend.prompt_lengths[-1] - prefilled == cached
+
+
+def test_search_context_is_prefilled_and_then_invalidated(llm, backend):
+    chat(llm, backend, "What is a Yorkshire Terrier?")
+    context = "[1] Title: Yorkshire Terrier\n    Snippet: A small terrier breed."
+    question = "What is the weather like in Leeds today?"
+    prefilled = chat(llm, backend, question, context=context)
+    suffix = f"\n\nContext from web search:\n{context}\n\nPixie:"
+    assert prefilled == count(backend, f"\nHuman: {question}") + count(backend, suffix)
+
+    # History keeps the answer but not the context, so the cache diverges where the context began
+    answer = llm.history[-1]["content"]
+    followup = "And tomorrow?"
+    prefilled = chat(llm, backend, followup)
+    assert prefilled == count(backend, f"\nPixie:{answer}\nHuman: {followup}\nPixie:")
+
+
+def test_answers_without_a_leading_space_get_the_separator(llm, backend):
+    llm.add_to_history("user", "Hi Pixie!")
+    llm.add_to_history("assistant", "Hello!")
+    prefilled = chat(llm, backend, "How are you?")
+    assert prefilled == backend.prompt_lengths[-1]
+    assert "\nPixie: Hello!\nHuman: How are you?" in llm._build_prompt("How are you?")
+
+    # The answer generated here keeps its raw form, so the next turn reuses the cache
+    prefilled = chat(llm, backend, "What is a Yorkshire Terrier?")
+    assert prefilled == count(backend, "\nHuman: What is a Yorkshire Terrier?\nPixie:")
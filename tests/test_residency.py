@@ -0,0 +1,44 @@
+"""When an idle model gives its memory back."""
+
+from src.llm.residency import IDLE, MEMORY_PRESSURE, IdlePolicy, _linux_memory_pressure
+
+
+def policy(pressure):
+    return IdlePolicy(idle_minutes=30, pressure_grace_seconds=60, read_pressure=lambda: pressure)
+
+
+def test_idle_model_is_unloaded_after_the_quiet_period():
+    assert policy(False).check(29 * 60) is None
+    assert policy(False).check(30 * 60) == IDLE
+
+
+def test_memory_pressure_unloads_only_after_the_grace_period():
+    assert policy(True).check(0) is None
+    assert policy(True).check(59) is None
+    assert policy(True).check(60) == MEMORY_PRESSURE
+
+
+def test_no_pressure_signal_keeps_the_model():
+    assert policy(None).check(60) is None
+    assert IdlePolicy(unload_on_pressure=False, read_pressure=lambda: True).check(600) is None
+
+
+def write_psi(tmp_path, some_avg10):
+    path = tmp_path / "memory"
+    path.write_text(
+        f"some avg10={some_avg10:.2f} avg60=0.50 avg300=0.10 total=123456\n"
+        "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+    )
+    return str(path)
+
+
+def test_linux_pressure_is_read_from_memory_stalls(tmp_path):
+    # A model filling RAM without anything stalling on memory is not pressure
+    assert _linux_memory_pressure(write_psi(tmp_path, 0.0), stall_percent=10.0) is False
+    assert _linux_memory_pressure(write_psi(tmp_path, 12.5), stall_percent=10.0) is True
+
+
+def test_linux_pressure_is_unknown_without_psi(tmp_path):
+    assert _linux_memory_pressure(str(tmp_path / "missing")) is None
+    (tmp_path / "garbled").write_text("some nonsense\n")
+    assert _linux_memory_pressure(str(tmp_path / "garbled")) is None
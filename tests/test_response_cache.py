@@ -0,0 +1,131 @@
+"""Replaying answers to exact repeated prompts."""
+
+import itertools
+import types
+
+import pytest
+
+import src.llm.response_cache as response_cache_module
+import src.llm.wrapper as wrapper_module
+from src.config import MAX_TOKENS, SEARCH_CONTEXT_TOKENS
+from src.llm.backends.stub import DEFAULT_RESPONSE, StubBackend
+from src.llm.response_cache import CachedResponse, ResponseCache
+from src.llm.wrapper import SYSTEM_PROMPT, LLMWrapper
+
+KEY_ARGS = {
+    "backend": "stub",
+    "model_id": "stub",
+    "prompt": "<bos>You are Pixie.\n\nHuman: Hi\nPixie:",
+    "temperature": 0.0,
+    "top_p": 1.0,
+    "max_tokens": 256,
+    "stop_sequences": ["\nHuman:"],
+    "context": None,
+}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize("field, value", [
+    ("backend", "mlx"),
+    ("model_id", "other-model"),
+    ("prompt", "<bos>You are Pixie.\n\nHuman: Hello\nPixie:"),
+    ("temperature", 0.7),
+    ("top_p", 0.9),
+    ("max_tokens", 512),
+    ("stop_sequences", ["\nHuman:", "<eos>"]),
+    ("context", "[1] Weather (https://example.com)"),
+])
+def test_key_changes_with_everything_that_shapes_the_answer(field, value):
+    assert ResponseCache.make_key(**KEY_ARGS) == ResponseCache.make_key(**dict(KEY_ARGS))
+    assert ResponseCache.make_key(**{**KEY_ARGS, field: value}) != ResponseCache.make_key(**KEY_ARGS)
+
+
+def test_answer_round_trips(cache):
+    key = ResponseCache.make_key(**KEY_ARGS)
+    assert cache.get(key) is None
+    cache.put(key, CachedResponse([" Woof", "!"], "stop", 2))
+    cached = cache.get(key)
+    assert (cached.text, cached.finish_reason, cached.generated_tokens) == (" Woof!", "stop", 2)
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_least_recently_used_answer_is_evicted_at_the_cap(cache, monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(response_cache_module, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+    cache.max_entries = 2
+    cache.put("a", CachedResponse(["A"], "stop", 1))
+    cache.put("b", CachedResponse(["B"], "stop", 1))
+    assert cache.get("a") is not None
+    cache.put("c", CachedResponse(["C"], "stop", 1))
+
+    assert [cache.contains(key) for key in "abc"] == [True, False, True]
+    assert cache.stats()["entries"] == 2
+
+
+@pytest.fixture
+def llm(cache):
+    llm = LLMWrapper(backend=StubBackend())
+    llm.snapshots = None
+    llm.response_cache = cache
+    return llm
+
+
+def test_repeated_question_after_new_chat_is_replayed(llm):
+    backend = llm.backend
+    llm.add_to_history("user", "What is a Yorkshire Terrier?")
+    first = llm.generate_stream("What is a Yorkshire Terrier?", temperature=0.0)
+    assert first == DEFAULT_RESPONSE and not llm.last_response_cached
+
+    llm.clear_history()
+    llm.add_to_history("user", "What is a Yorkshire Terrier?")
+    backend.prefill_calls.clear()
+    pieces = []
+    assert llm.generate_stream("What is a Yorkshire Terrier?", temperature=0.0, callback=pieces.append) == first
+    assert llm.last_response_cached
+    assert "".join(pieces) == first
+    assert backend.prefill_calls == []
+    assert llm.last_generated_tokens == len(backend.tokenize(DEFAULT_RESPONSE, add_special_tokens=False))
+
+
+def test_sampled_answers_are_not_cached_unless_asked(llm):
+    llm.add_to_history("user", "Tell me a joke")
+    llm.generate_stream("Tell me a joke", temperature=0.7)
+    assert llm.response_cache.stats()["entries"] == 0
+    assert not llm.has_cached_response("Tell me a joke", temperature=0.7)
+
+    llm.generate_stream("Tell me a joke", temperature=0.7, use_response_cache=True)
+    assert llm.has_cached_response("Tell me a joke", temperature=0.7, use_response_cache=True)
+    # Other sampler settings are a different answer
+    assert not llm.has_cached_response("Tell me a joke", temperature=0.7, top_p=0.5, use_response_cache=True)
+
+
+def test_key_is_the_same_before_and_after_loading(cache, monkeypatch):
+    def resumed_chat():
+        llm = LLMWrapper(backend=StubBackend())
+        llm.snapshots = None
+        llm.response_cache = cache
+        for i in range(20):
+            llm.add_to_history("user", f"Tell me fact number {i} about Yorkshire Terriers")
+            llm.add_to_history("assistant", f" Fact {i}: they were bred in Yorkshire")
+        llm.add_to_history("user", "What about their coat?")
+        return llm
+
+    # Leave room for only part of the history, so the window depends on how tokens are counted
+    system = len(StubBackend().tokenize(SYSTEM_PROMPT + "\n"))
+    monkeypatch.setattr(wrapper_module, "CONTEXT_WINDOW", MAX_TOKENS + SEARCH_CONTEXT_TOKENS + system + 80)
+
+    answered = resumed_chat()
+    answered.load()
+    answered.generate_stream("What about their coat?", temperature=0.0)
+    assert "fact number 0 " not in answered._build_prompt("What about their coat?")
+
+    # After a restart, the same conversation finds the answer without loading the model
+    resumed = resumed_chat()
+    assert resumed.has_cached_response("What about their coat?", temperature=0.0)
+    assert not resumed.is_loaded()
@@ -0,0 +1,154 @@
+"""Continuous batching across sessions, on the stub engine."""
+
+import threading
+
+import pytest
+
+from src.llm.backends.stub import StubBackend, StubBatchDecoder
+from src.llm.scheduler import BatchScheduler
+
+RESPONSE = " " + " ".join(f"word{i}" for i in range(30))
+
+
+class RecordingDecoder(StubBatchDecoder):
+    def step(self):
+        self.backend.log.append(("step", sorted(s.cache.label for s in self._sequences.values())))
+        return super().step()
+
+
+class RecordingBackend(StubBackend):
+    """Stub engine that logs prefills and decode steps by cache label."""
+
+    def __init__(self, **kwargs):
+        super().__init__(response=RESPONSE, **kwargs)
+        self.log = []
+
+    def prefill(self, tokens, cache):
+        self.log.append(("prefill", cache.label, len(tokens)))
+        super().prefill(tokens, cache)
+
+    def batch_decoder(self, temperature, top_p):
+        return RecordingDecoder(self)
+
+    def labelled_cache(self, label):
+        cache = self.make_cache()
+        cache.label = label
+        return cache
+
+    def steps(self):
+        """Labels of the sequences in each decode step."""
+        return [entry[1] for entry in self.log if entry[0] == "step"]
+
+    def prefills(self, label):
+        """(log position, size) of each prefill into the labelled cache."""
+        return [(i, entry[2]) for i, entry in enumerate(self.log) if entry[:2] == ("prefill", label)]
+
+
+@pytest.fixture
+def scheduler_for():
+    schedulers = []
+
+    def make(backend, **kwargs):
+        scheduler = BatchScheduler(backend, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def hold(scheduler):
+    """Keep the engine thread busy until the returned event is set, so requests queue up."""
+    started, release = threading.Event(), threading.Event()
+
+    def wait():
+        started.set()
+        release.wait(10)
+
+    threading.Thread(target=scheduler.call, args=(wait,), daemon=True).start()
+    assert started.wait(10)
+    return release
+
+
+def text(stream, timeout=10.0):
+    """Collect a stream's text, failing instead of hanging if it never finishes."""
+    pieces = []
+    reader = threading.Thread(target=lambda: pieces.extend(chunk.text for chunk in stream), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    assert not reader.is_alive(), "stream did not finish"
+    return "".join(pieces)
+
+
+def test_a_session_holds_at_most_its_share_of_decode_slots(scheduler_for):
+    backend = RecordingBackend()
+    scheduler = scheduler_for(backend, max_per_session=1)
+    prompt = backend.tokenize("Hi")
+
+    release = hold(scheduler)
+    streams = {
+        label: scheduler.stream(prompt, backend.labelled_cache(label), 64, 0.0, 1.0, session=label[0])
+        for label in ["A1", "A2", "B1"]
+    }
+    release.set()
+    assert all(text(stream) == RESPONSE for stream in streams.values())
+
+    steps = backend.steps()
+    # B1 is decoded alongside A1, A2 only once A1 has finished
+    assert steps[0] == ["A1", "B1"]
+    assert all(not {"A1", "A2"} <= set(labels) for labels in steps)
+    first_a2 = next(i for i, labels in enumerate(steps) if "A2" in labels)
+    assert all("A1" not in labels for labels in steps[first_a2:])
+    assert "A1" in steps[first_a2 - 1]
+
+
+def test_long_prompt_is_prefilled_in_chunks_between_decode_steps(scheduler_for):
+    backend = RecordingBackend()
+    scheduler = scheduler_for(backend, prefill_chunk_tokens=4)
+    short = backend.tokenize("Hi")
+    long = backend.tokenize(" ".join(f"context{i}" for i in range(20)))
+
+    release = hold(scheduler)
+    chatting = scheduler.stream(short, backend.labelled_cache("A"), 64, 0.0, 1.0, session="A")
+    reading = scheduler.stream(long, backend.labelled_cache("B"), 64, 0.0, 1.0, session="B")
+    release.set()
+    assert text(chatting) == RESPONSE
+    assert text(reading) == RESPONSE
+
+    prefills = backend.prefills("B")
+    assert max(n for _, n in prefills) <= 4
+    assert sum(n for _, n in prefills) == len(long)
+
+    # A is decoded between every two of B's prompt chunks
+    positions = [i for i, _ in prefills]
+    for before, after in zip(positions, positions[1:]):
+        assert any(e[0] == "step" and "A" in e[1] for e in backend.log[before:after])
+
+
+def test_cancelling_one_sequence_leaves_the_others_running(scheduler_for):
+    backend = RecordingBackend(tokens_per_sec=200)
+    scheduler = scheduler_for(backend)
+    prompt = backend.tokenize("Hi")
+    reply = backend.tokenize(RESPONSE, add_special_tokens=False)
+    caches = {label: backend.labelled_cache(label) for label in "AB"}
+
+    release = hold(scheduler)
+    cancelled = scheduler.stream(prompt, caches["A"], 64, 0.0, 1.0, session="A")
+    kept = scheduler.stream(prompt, caches["B"], 64, 0.0, 1.0, session="B")
+    release.set()
+    pieces = [next(cancelled).text for _ in range(3)]
+    cancelled.close()
+    closed_at = len(backend.log)
+
+    assert "".join(pieces) == "".join(backend._words[t] for t in reply[:3])
+    assert list(cancelled) == []
+    # A's cache holds its prompt and the tokens decoded before it left the batch
+    emitted = len(caches["A"].tokens) - len(prompt)
+    assert 3 <= emitted < len(reply)
+    assert caches["A"].tokens == prompt + reply[:emitted]
+    assert all("A" not in e[1] for e in backend.log[closed_at:] if e[0] == "step")
+
+    assert text(kept) == RESPONSE
+    assert caches["B"].tokens == prompt + reply + [backend.EOS]
+    assert scheduler.stats()["active"] == 0
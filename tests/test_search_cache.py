@@ -0,0 +1,131 @@
+"""Search result cache, in front of a fake DuckDuckGo client."""
+
+import types
+
+import pytest
+
+import src.search as search
+import src.search.cache as cache_module
+from src.search.cache import SearchCache
+
+
+class FakeDDGS:
+    """Stands in for ddgs.DDGS and counts the searches that reach it."""
+
+    def __init__(self):
+        self.queries = []
+
+    def text(self, query, max_results=5):
+        self.queries.append(query)
+        return [{"title": f"{query} {i}", "href": f"https://example.com/{i}", "body": query}
+                for i in range(max_results)]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def ddgs(monkeypatch):
+    ddgs = FakeDDGS()
+    monkeypatch.setattr(search, "search_provider", lambda: ddgs)
+    return ddgs
+
+
+@pytest.fixture
+def make_cache(tmp_path, monkeypatch):
+    caches = []
+
+    def make(**kwargs):
+        cache = SearchCache(path=str(tmp_path / "search_cache.sqlite3"), **kwargs)
+        caches.append(cache)
+        monkeypatch.setattr(search, "_cache", cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        try:
+            cache.close()
+        except Exception:
+            pass
+
+
+def test_repeated_query_is_served_from_the_cache(make_cache, ddgs, clock):
+    cache = make_cache()
+    first = search.search_web("Yorkshire Terrier", max_results=3)
+    assert search.search_web("  yorkshire terrier? ", max_results=3) == first
+    assert ddgs.queries == ["Yorkshire Terrier"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_expired_entry_is_searched_again(make_cache, ddgs, clock):
+    cache = make_cache(ttl=60)
+    search.search_web("leeds weather", max_results=3)
+    clock.now += 59
+    search.search_web("leeds weather", max_results=3)
+    assert len(ddgs.queries) == 1
+
+    clock.now += 2
+    search.search_web("leeds weather", max_results=3)
+    assert len(ddgs.queries) == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_entry_evicted_from_memory_is_still_served_from_disk(make_cache, ddgs, clock):
+    cache = make_cache(memory_entries=2)
+    for query in ["alpha", "beta", "gamma"]:
+        search.search_web(query, max_results=3)
+    assert list(cache._memory) == [cache.make_key(q, 3) for q in ["beta", "gamma"]]
+
+    assert search.search_web("alpha", max_results=3)[0]["title"] == "alpha 0"
+    assert ddgs.queries == ["alpha", "beta", "gamma"]
+    # Reading it back from SQLite moves it into memory, evicting the least recently used
+    assert list(cache._memory) == [cache.make_key(q, 3) for q in ["gamma", "alpha"]]
+
+
+def test_entries_persist_across_restarts(make_cache, ddgs, clock):
+    make_cache().put("pixie", 3, [{"title": "Pixie", "href": "https://example.com", "body": ""}])
+    restarted = make_cache()
+    assert search.search_web("Pixie", max_results=3) == [
+        {"title": "Pixie", "href": "https://example.com", "body": ""}
+    ]
+    assert ddgs.queries == []
+    assert restarted.stats()["hits"] == 1
+
+
+def test_memory_hits_keep_entries_from_disk_eviction(make_cache, ddgs, clock):
+    cache = make_cache(max_entries=2)
+    search.search_web("alpha", max_results=3)
+    clock.now += 1
+    search.search_web("beta", max_results=3)
+    clock.now += 1
+    # A memory hit, which must still count as a use of the stored row
+    search.search_web("alpha", max_results=3)
+    clock.now += 1
+    search.search_web("gamma", max_results=3)
+
+    stored = {key for (key,) in cache._db.execute("SELECT key FROM search_cache")}
+    assert stored == {cache.make_key(q, 3) for q in ["alpha", "gamma"]}
+
+
+def test_access_times_of_memory_hits_are_written_on_close(make_cache, ddgs, clock):
+    cache = make_cache()
+    search.search_web("alpha", max_results=3)
+    clock.now += 10
+    search.search_web("alpha", max_results=3)
+    cache.close()
+
+    reopened = make_cache()
+    [(accessed,)] = reopened._db.execute("SELECT accessed FROM search_cache").fetchall()
+    assert accessed == clock.now
@@ -0,0 +1,76 @@
+"""Search context: passage dedup, ranking and the token budget."""
+
+from src.search.context import build_context, deduplicate, split_passages
+
+
+def words(text):
+    return len(text.split())
+
+
+def result(title, body, content=None):
+    result = {"title": title, "href": f"https://example.com/{title.lower().replace(' ', '-')}", "body": body}
+    if content:
+        result["content"] = content
+    return result
+
+
+def test_near_duplicate_snippets_are_dropped_keeping_the_first():
+    results = [
+        result("Kennel Club", "The Yorkshire Terrier is a small dog breed of terrier type, developed in Yorkshire."),
+        result("Mirror", "the yorkshire terrier is a small dog breed of terrier type developed in yorkshire, England"),
+        result("Vet", "Yorkies need daily grooming and regular dental care."),
+    ]
+    kept = deduplicate(split_passages(results))
+    assert [p.source for p in kept] == [1, 3]
+
+
+def test_passages_that_only_share_words_are_kept():
+    results = [
+        result("A", "Terriers were bred to hunt rats in mills."),
+        result("B", "In mills, rats were hunted by bred terriers."),
+    ]
+    assert len(deduplicate(split_passages(results))) == 2
+
+
+def test_duplicate_source_is_not_cited():
+    body = "Yorkshire Terriers weigh about three kilograms when fully grown."
+    context = build_context([result("One", body), result("Two", body)], "How heavy is a Yorkshire Terrier?")
+    assert context.startswith("[1] One")
+    assert "[2]" not in context
+
+
+def test_context_fits_the_token_budget_with_the_best_passages():
+    results = [
+        result("Weather", "Leeds will be cloudy with light rain in the afternoon."),
+        result("Size", "A Yorkshire Terrier weighs about three kilograms and stands twenty centimetres tall."),
+        result("History", "Yorkshire Terriers were bred in Yorkshire during the nineteenth century."),
+    ]
+    query = "How much does a Yorkshire Terrier weigh?"
+    header = words("\n\n[2] Size (https://example.com/size)")
+    budget = header + words(results[1]["body"])
+    context = build_context(results, query, token_budget=budget, count_tokens=words)
+    assert context == f"[2] Size (https://example.com/size)\n{results[1]['body']}"
+
+    full = build_context(results, query, token_budget=10_000, count_tokens=words)
+    assert sum(words(section) for section in full.split("\n\n")) > budget
+    # Selected passages are listed in citation order whatever their rank
+    assert [line[:3] for line in full.splitlines() if line.startswith("[")] == ["[1]", "[2]", "[3]"]
+
+
+def test_long_pages_are_split_and_only_the_relevant_part_is_kept():
+    filler = " ".join(f"filler{i}" for i in range(80))
+    content = f"{filler}\nA Yorkshire Terrier weighs about three kilograms."
+    context = build_context(
+        [result("Page", "A page about dogs.", content=content)],
+        "Yorkshire Terrier weight kilograms",
+        token_budget=40,
+        count_tokens=words,
+    )
+    assert "three kilograms" in context
+    assert "filler0" not in context
+
+
+def test_nothing_fits_or_no_results_gives_no_context():
+    assert build_context([], "anything") is None
+    results = [result("Size", "A Yorkshire Terrier weighs about three kilograms.")]
+    assert build_context(results, "weight", token_budget=3, count_tokens=words) is None
@@ -0,0 +1,93 @@
+"""OpenAI-compatible API server over the stub engine."""
+
+import asyncio
+import json
+import urllib.request
+
+from src.llm.backends.stub import DEFAULT_RESPONSE, StubBackend
+from src.server import ChatServer, parse_chat_request
+
+
+def _post(port, body):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/v1/chat/completions",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.read().decode("utf-8")
+
+
+def _run(bodies):
+    """Start a one-slot server, send the request bodies in turn, and return (server, raw replies)."""
+    async def main():
+        server = ChatServer(backend=StubBackend(), max_active=1)
+        for llm in server.llms:
+            llm.snapshots = None
+            llm.response_cache = None
+        await server.start("127.0.0.1", 0, warmup=False)
+        loop = asyncio.get_running_loop()
+        try:
+            replies = []
+            for body in bodies:
+                replies.append(await loop.run_in_executor(None, _post, server.port, body))
+            return server, replies
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def _stream_text(raw):
+    text = []
+    for line in raw.splitlines():
+        if line.startswith("data: {"):
+            delta = json.loads(line[len("data: "):])["choices"]
+            if delta:
+                text.append(delta[0]["delta"].get("content", ""))
+    return text
+
+
+def test_assistant_history_is_stored_without_leading_space():
+    request = parse_chat_request({"messages": [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": " Hello!"},
+        {"role": "user", "content": "How are you?"},
+    ]})
+    assert request.history[1] == {"role": "assistant", "content": "Hello!"}
+
+
+def test_completion_has_no_leading_space_and_usage_excludes_eos():
+    _, [raw] = _run([{"messages": [{"role": "user", "content": "Hi Pixie!"}]}])
+    reply = json.loads(raw)
+    assert reply["choices"][0]["message"]["content"] == DEFAULT_RESPONSE.lstrip()
+    answer_tokens = len(StubBackend().tokenize(DEFAULT_RESPONSE, add_special_tokens=False))
+    assert reply["usage"]["completion_tokens"] == answer_tokens
+
+
+def test_streamed_content_has_no_leading_space():
+    _, [raw] = _run([{"messages": [{"role": "user", "content": "Hi Pixie!"}], "stream": True}])
+    pieces = [piece for piece in _stream_text(raw) if piece]
+    assert not pieces[0][:1].isspace()
+    assert "".join(pieces) == DEFAULT_RESPONSE.lstrip()
+
+
+def test_returned_answer_reuses_the_cache_on_the_next_turn():
+    first = [{"role": "user", "content": "Hi Pixie!"}]
+    _, [raw] = _run([{"messages": first}])
+    answer = json.loads(raw)["choices"][0]["message"]["content"]
+    second = first + [{"role": "assistant", "content": answer}, {"role": "user", "content": "How are you?"}]
+    server, _ = _run([{"messages": first}, {"messages": second}])
+    llm = server.llms[0]
+    new_message = llm.backend.tokenize("\nHuman: How are you?\nPixie:", add_special_tokens=False)
+    assert llm.last_prefill_tokens == len(new_message)
+
+
+def test_answer_from_another_client_gets_the_separator():
+    messages = [
+        {"role": "user", "content": "Hi Pixie!"},
+        {"role": "assistant", "content": "Hello!"},
+        {"role": "user", "content": "How are you?"},
+    ]
+    server, _ = _run([{"messages": messages}])
+    assert "\nPixie: Hello!\nHuman: How are you?\nPixie:" in server.llms[0]._build_prompt("How are you?")
@@ -0,0 +1,96 @@
+"""Conversations saved to SQLite and read back page by page."""
+
+import itertools
+import types
+
+import pytest
+
+import src.sessions as sessions_module
+from src.sessions import DEFAULT_TITLE, SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    yield store
+    store.close()
+
+
+def fill(store, session_id, count, prefix="message"):
+    return [
+        store.append_message(session_id, "user" if i % 2 == 0 else "assistant", f"{prefix} {i}")
+        for i in range(count)
+    ]
+
+
+def test_pages_walk_back_from_the_newest_oldest_first(store):
+    session = store.create_session()
+    other = store.create_session()
+    ids = []
+    # Interleave two sessions so their message ids are not contiguous
+    for i in range(12):
+        ids.append(store.append_message(session, "user", f"message {i}"))
+        store.append_message(other, "user", f"other {i}")
+
+    pages = []
+    before_id = None
+    while True:
+        page = store.load_page(session, before_id=before_id, limit=5)
+        if not page:
+            break
+        pages.append([m["id"] for m in page])
+        before_id = page[0]["id"]
+
+    assert pages == [ids[7:], ids[2:7], ids[:2]]
+    assert [m["content"] for m in store.load_page(session, limit=3)] == ["message 9", "message 10", "message 11"]
+
+
+def test_messages_keep_their_tokens_and_metadata(store):
+    session = store.create_session()
+    first = store.append_message(session, "user", "Hi", meta={"typed_seconds": 1.5})
+    second = store.append_message(session, "assistant", " Hello!")
+    store.set_message_tokens(second, 4)
+
+    [question, answer] = store.load_page(session)
+    assert (question["id"], question["meta"], question["tokens"]) == (first, {"typed_seconds": 1.5}, None)
+    assert (answer["content"], answer["meta"], answer["tokens"]) == (" Hello!", None, 4)
+
+
+def test_sessions_are_listed_by_last_update(store, monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(sessions_module, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+    older = store.create_session()
+    newer = store.create_session()
+    assert [s["id"] for s in store.list_sessions()] == [newer, older]
+
+    store.append_message(older, "user", "What is a Yorkshire Terrier?")
+    sessions = store.list_sessions()
+    assert [s["id"] for s in sessions] == [older, newer]
+    assert sessions[0]["title"] == "What is a Yorkshire Terrier?"
+    assert sessions[0]["message_count"] == 1
+    assert sessions[1]["title"] == DEFAULT_TITLE
+    assert [s["id"] for s in store.list_sessions(limit=1)] == [older]
+
+
+def test_deleting_a_session_removes_its_messages(store):
+    session = store.create_session()
+    fill(store, session, 4)
+    store.delete_session(session)
+    assert store.list_sessions() == []
+    assert store.load_page(session) == []
+
+
+def test_context_starts_after_the_summary_and_fits_the_budget(store):
+    session = store.create_session()
+    ids = fill(store, session, 10)
+    for message_id in ids:
+        store.set_message_tokens(message_id, 10)
+    store.save_summary(session, ["They talked about terriers."], summarized_through=ids[3])
+
+    segments, messages = store.load_context(session, token_budget=1000)
+    assert segments == ["They talked about terriers."]
+    assert [m["id"] for m in messages] == ids[4:]
+
+    # Only the most recent messages that fit, still oldest first
+    _, messages = store.load_context(session, token_budget=35)
+    assert [m["id"] for m in messages] == ids[7:]
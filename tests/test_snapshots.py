@@ -0,0 +1,146 @@
+"""KV cache snapshots on disk, with the stub engine's JSON caches."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from src.llm.backends.stub import StubBackend
+from src.llm.snapshots import SESSION, SnapshotStore
+from src.llm.wrapper import LLMWrapper
+from src.sessions import SessionStore
+
+WORDS = "one two three four five six seven eight nine ten eleven twelve"
+
+
+@pytest.fixture
+def backend():
+    return StubBackend()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path), min_tokens=4)
+
+
+def save(store, backend, text, fingerprint="stub"):
+    tokens = backend.tokenize(text)
+    cache = backend.make_cache()
+    backend.prefill(tokens, cache)
+    assert store.save(backend, "stub", fingerprint, cache, tokens)
+    return tokens
+
+
+def test_snapshot_is_loaded_for_a_prompt_it_starts(store, backend):
+    tokens = save(store, backend, WORDS)
+    found = store.load(backend, "stub", "stub", tokens + backend.tokenize(" thirteen", add_special_tokens=False))
+    assert found is not None
+    cache, cached_tokens = found
+    assert cached_tokens == tokens
+    assert cache.tokens == tokens
+
+
+def test_snapshot_is_not_offered_once_the_prompt_diverges(store, backend):
+    save(store, backend, WORDS)
+    # Only BOS and "one" are shared, less than min_tokens
+    assert store.load(backend, "stub", "stub", backend.tokenize("one zwei drei vier fünf sechs")) is None
+    assert store.misses == 1
+
+
+def test_snapshot_from_another_tokenizer_is_deleted(store, backend):
+    tokens = save(store, backend, WORDS, fingerprint="old-tokenizer")
+    assert store.load(backend, "stub", "stub", tokens) is None
+    assert store.stats()["snapshots"] == 0
+    assert os.listdir(store.directory) == []
+
+
+def test_corrupt_snapshot_is_discarded(store, backend):
+    tokens = save(store, backend, WORDS)
+    [snapshot] = store._scan().values()
+    with open(snapshot.data_path, "w") as f:
+        f.write("{not json")
+    assert store.load(backend, "stub", "stub", tokens) is None
+    assert store.stats()["snapshots"] == 0
+
+
+def test_longer_session_state_replaces_the_earlier_one(store, backend):
+    save(store, backend, WORDS)
+    tokens = save(store, backend, WORDS + " thirteen fourteen")
+    assert [s.tokens for s in store._scan().values()] == [tokens]
+
+
+def test_least_recently_used_snapshots_are_evicted_at_the_cap(store, backend):
+    first = save(store, backend, "alpha " + WORDS)
+    size = store.stats()["bytes"]
+    store.max_bytes = int(size * 2.5)
+    save(store, backend, "beta " + WORDS)
+    time.sleep(0.01)
+    # Loading the first snapshot makes the second one the least recently used
+    assert store.load(backend, "stub", "stub", first) is not None
+    time.sleep(0.01)
+    third = save(store, backend, "gamma " + WORDS)
+
+    kept = sorted(s.tokens for s in store._scan().values())
+    assert kept == sorted([first, third])
+    assert store.stats()["bytes"] <= store.max_bytes
+
+
+def test_resumed_conversation_only_prefills_the_new_message(tmp_path, backend):
+    def wrapper():
+        llm = LLMWrapper(backend=backend)
+        llm.snapshots = SnapshotStore(str(tmp_path))
+        llm.response_cache = None
+        return llm
+
+    llm = wrapper()
+    for question in ["What is a Yorkshire Terrier?", "How big do they get?"]:
+        llm.add_to_history("user", question)
+        llm.add_to_history("assistant", llm.generate_stream(question))
+    assert llm.save_snapshot(SESSION)
+    saved = [{"role": m["role"], "content": m["content"]} for m in llm.conversation_history]
+
+    # A new wrapper with an empty cache, as after a restart
+    resumed = wrapper()
+    resumed.restore_history(saved, [])
+    resumed.add_to_history("user", "Are they good with children?")
+    resumed.generate_stream("Are they good with children?")
+    new_message = backend.tokenize("\nHuman: Are they good with children?\nPixie:", add_special_tokens=False)
+    assert resumed.last_prefill_tokens == len(new_message)
+
+
+def test_new_chat_saves_the_snapshot_of_the_conversation_left(tmp_path, backend, monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from src.gui import MainWindow
+    from src.gui.worker import PRIORITY_WARMUP
+
+    app = QApplication.instance() or QApplication([])
+    llm = LLMWrapper(backend=backend)
+    llm.snapshots = SnapshotStore(str(tmp_path))
+    llm.response_cache = None
+    window = MainWindow(llm=llm, store=SessionStore(path=None))
+
+    def wait(done, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not done():
+            assert time.monotonic() < deadline
+            app.processEvents()
+            time.sleep(0.01)
+
+    try:
+        window.input_field.setText("What is a Yorkshire Terrier?")
+        window._on_send()
+        wait(lambda: not window.is_generating)
+        conversation = list(llm.prompt_cache.tokens)
+
+        # Keep the engine busy so the snapshot is still queued when the chat is cleared
+        gate = threading.Event()
+        window.service.submit_task(lambda llm, cancel_token: gate.wait(10), PRIORITY_WARMUP)
+        window._on_new_chat()
+        gate.set()
+        wait(lambda: not window.service.is_busy() and not window.service.queue_depth())
+        assert [s.tokens for s in llm.snapshots._scan().values()] == [conversation]
+    finally:
+        window.close()
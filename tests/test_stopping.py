@@ -0,0 +1,92 @@
+"""Stop sequences and cancellation of streamed generation."""
+
+from src.llm import CancelToken, LLMWrapper
+from src.llm.backends.stub import StubBackend
+from src.llm.stopping import StopSequenceMatcher
+
+
+def make_llm(response):
+    backend = StubBackend(response=response)
+    llm = LLMWrapper(backend=backend)
+    llm.snapshots = None
+    llm.response_cache = None
+    return llm, backend
+
+
+def test_stop_sequence_split_across_chunks_is_never_emitted():
+    matcher = StopSequenceMatcher(["\nHuman:"])
+    assert matcher.feed(" Sure thing.\nHu") == " Sure thing."
+    assert not matcher.stopped
+    assert matcher.feed("man: and") == ""
+    assert matcher.stopped
+    assert matcher.feed(" more") == ""
+    assert matcher.flush() == ""
+
+
+def test_held_back_prefix_is_released_when_it_is_not_a_stop_sequence():
+    matcher = StopSequenceMatcher(["\nHuman:"])
+    assert matcher.feed("One\n") == "One"
+    assert matcher.feed("Two") == "\nTwo"
+    assert not matcher.stopped
+
+
+def test_held_back_prefix_is_flushed_at_the_end():
+    matcher = StopSequenceMatcher(["\nHuman:", "<eos>"])
+    assert matcher.feed("Bye!\nHum") == "Bye!"
+    assert matcher.flush() == "\nHum"
+    assert not matcher.stopped
+
+
+def test_earliest_of_several_stop_sequences_wins():
+    matcher = StopSequenceMatcher(["<eos>", "\nPixie:"])
+    assert matcher.feed("Done.\nPixie: again<eos>") == "Done."
+
+
+def test_generation_stops_on_a_sequence_spanning_tokens():
+    llm, _ = make_llm(" Fine, stop here please and more")
+    pieces = []
+    answer = llm.generate_stream("Hi", stop_sequences=["stop here"], callback=pieces.append)
+    assert answer == " Fine, "
+    assert "".join(pieces) == answer
+    assert llm.last_finish_reason == "stop"
+    # Decoding ended at " here", without producing the rest of the reply
+    assert llm.last_generated_tokens == 3
+
+
+def test_partial_stop_sequence_at_the_end_is_emitted():
+    llm, _ = make_llm(" Wait for it: sto")
+    answer = llm.generate_stream("Hi", stop_sequences=["stop"])
+    assert answer == " Wait for it: sto"
+
+
+def test_cancel_token_stops_mid_stream_and_frees_the_engine():
+    llm, backend = make_llm(" one two three four five six")
+    cancel_token = CancelToken()
+    pieces = []
+
+    def on_text(piece):
+        pieces.append(piece)
+        if len(pieces) == 2:
+            cancel_token.cancel()
+
+    llm.add_to_history("user", "Count for me")
+    answer = llm.generate_stream("Count for me", callback=on_text, cancel_token=cancel_token)
+    assert answer == " one two"
+    assert llm.last_finish_reason == "cancelled"
+    assert llm.last_generated_tokens == 2
+
+    # The partial answer stays usable: the next turn only prefills the new message
+    llm.add_to_history("assistant", answer)
+    llm.add_to_history("user", "Again")
+    backend.prefill_calls.clear()
+    assert llm.generate_stream("Again") == " one two three four five six"
+    assert backend.prefill_calls == [len(backend.tokenize("\nHuman: Again\nPixie:", add_special_tokens=False))]
+
+
+def test_cancelled_before_start_generates_nothing():
+    llm, backend = make_llm(" one two three")
+    cancel_token = CancelToken()
+    cancel_token.cancel()
+    assert llm.generate_stream("Hi", cancel_token=cancel_token) == ""
+    assert llm.last_finish_reason == "cancelled"
+    assert backend.prefill_calls == []
@@ -0,0 +1,78 @@
+"""Transcript model and bubble delegate while an answer streams in."""
+
+import pytest
+
+pytest.importorskip("PyQt6")
+
+
+@pytest.fixture
+def view(monkeypatch):
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from src.gui.transcript import TranscriptView
+
+    app = QApplication.instance() or QApplication([])
+    view = TranscriptView()
+    view.resize(480, 600)
+    view.show()
+    app.processEvents()
+    yield view
+    view.close()
+
+
+def size_hint(view, row):
+    from PyQt6.QtCore import QRect
+    from PyQt6.QtWidgets import QStyleOptionViewItem
+
+    option = QStyleOptionViewItem()
+    option.rect = QRect(0, 0, view.viewport().width(), 0)
+    option.widget = view
+    return view.bubble_delegate.sizeHint(option, view.transcript_model.index(row))
+
+
+CHUNKS = [" Yorkshire", " Terriers", " are", " small.\n", "\n", "They", " weigh about", " three\nkilograms", " and", " love", " a walk."]
+
+
+def test_streamed_text_is_joined_once_per_change(view):
+    model = view.transcript_model
+    row = model.append_message("", is_user=False)
+    for chunk in CHUNKS:
+        model.append_text(row, chunk)
+    text = model.text(row)
+    assert text == "".join(CHUNKS)
+    assert model.text(row) is text
+    assert model.last_line(row) == "kilograms and love a walk."
+
+
+def test_streamed_message_measures_like_the_whole_text(view):
+    model = view.transcript_model
+    streamed = model.append_message("", is_user=False)
+    for chunk in CHUNKS:
+        model.append_text(streamed, chunk)
+        size_hint(view, streamed)
+    whole = model.append_message("".join(CHUNKS), is_user=False)
+    assert size_hint(view, streamed) == size_hint(view, whole)
+    assert not view.viewport().grab().isNull()
+
+    # A narrower view measures every line again
+    view.resize(300, 600)
+    assert size_hint(view, streamed) == size_hint(view, whole)
+
+
+def test_only_the_last_line_is_measured_again(view, monkeypatch):
+    model = view.transcript_model
+    row = model.append_message("\n".join(f"Line {i} of a long answer" for i in range(50)), is_user=False)
+    size_hint(view, row)
+
+    delegate = view.bubble_delegate
+    measured = []
+    original = delegate._text_rect
+    monkeypatch.setattr(delegate, "_text_rect", lambda text, *args: measured.append(text) or original(text, *args))
+    model.append_text(row, " and more")
+    size_hint(view, row)
+    assert measured == ["Line 49 of a long answer and more"]
+
+    measured.clear()
+    model.append_text(row, "\nA new line")
+    size_hint(view, row)
+    assert measured == ["Line 49 of a long answer and more", "A new line"]